@@ -0,0 +1,374 @@
+"""End-to-end benchmark of the data path from the RedPitaya to the client.
+
+A server with an emulated RedPitaya (see `linien/server/emulator`) is started
+in a separate process and a `LinienClient` connects to it like the GUI does,
+i.e. with parameter cache and by calling `call_listeners` as soon as the server
+pushes changes.
+
+For every configuration, the benchmark reports how many frames per second
+arrive at `Parameters.to_plot` on the server, at the `to_plot` listener of the
+client and at the plot, the latency between reading a frame from the FPGA and
+its arrival at these stages and the CPU time spent in every stage per frame
+that reached `Parameters.to_plot`. Additionally, the per-stage latencies of
+the plotted frames are shown (see `linien.common.FrameTracer`).
+
+The plot is a stand-in for `PlotWidget.replot` that applies the same rate
+limit and decodes the data, but doesn't render anything as this requires Qt.
+Note that the CPU time of the acquisition process includes the emulation of
+the FPGA.
+
+Usage: python benchmarks/bench_acquisition.py --ramp-speed 0 --ramp-speed 8
+                                              --state sweep --state lock
+"""
+import os
+import sys
+import threading
+import zlib
+from multiprocessing import Pipe, Process, active_children
+from time import monotonic, process_time, thread_time, time
+
+import click
+import numpy as np
+
+from linien.client.config import DEFAULT_PLOT_RATE_LIMIT
+from linien.client.connection import LinienClient
+from linien.common import check_plot_data
+from linien.frame_format import decode_frame
+
+SERVER_DIRECTORY = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "linien", "server"
+)
+# how long the data path may settle after changing the configuration
+WARM_UP_TIME = 2
+
+
+class StageTimer:
+    """Accumulates the CPU time spent in calls of a function."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.cpu_time = 0
+
+    def wrap(self, function):
+        def wrapped(*args, **kwargs):
+            start = thread_time()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.cpu_time += thread_time() - start
+                self.count += 1
+
+        return wrapped
+
+    def get_stats(self):
+        return self.count, self.cpu_time
+
+
+def get_process_cpu_time(pid):
+    """Returns the CPU time (in seconds) a process has used so far. Only works
+    on Linux, returns 0 otherwise."""
+    try:
+        with open("/proc/%d/stat" % pid) as f:
+            # the fields after the process name, starting with the state
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return 0
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def authenticate(sock):
+    # the client sends a hash of username and password before rpyc takes over
+    sock.recv(64)
+    return sock, None
+
+
+def run_server(port, pipe):
+    """Runs an instrumented server with an emulated RedPitaya. The benchmark
+    controls it through `pipe`."""
+    sys.path.insert(0, SERVER_DIRECTORY)
+    from rpyc.utils.server import ThreadedServer
+    from server import RedPitayaControlService
+
+    control = RedPitayaControlService(emulate=True)
+    control.run_acquiry_loop()
+    control.exposed_write_data()
+
+    acquisition = control.registers.acquisition
+    (acquisition_process,) = active_children()
+
+    stages = {
+        "data_received": StageTimer(),
+        "get_listener_queue": StageTimer(),
+    }
+    # maps the checksum of every value of `to_plot` to the time its frame was
+    # read from the FPGA and the time it was set
+    to_plot_times = {}
+    current_frame = {}
+    start = {}
+
+    def reset():
+        for stage in stages.values():
+            stage.reset()
+        to_plot_times.clear()
+        start.update(
+            time=monotonic(),
+            server_cpu_time=process_time(),
+            acquisition_cpu_time=get_process_cpu_time(acquisition_process.pid),
+        )
+
+    def get_stats():
+        return {
+            "duration": monotonic() - start["time"],
+            "server_cpu_time": process_time() - start["server_cpu_time"],
+            "acquisition_cpu_time": get_process_cpu_time(acquisition_process.pid)
+            - start["acquisition_cpu_time"],
+            "stages": {name: stage.get_stats() for name, stage in stages.items()},
+            "to_plot_times": dict(to_plot_times),
+        }
+
+    data_received = stages["data_received"].wrap(acquisition.on_acquisition)
+
+    def on_acquisition(frame):
+        current_frame["timestamp"] = frame.timestamp
+        data_received(frame)
+
+    def to_plot_changed(value):
+        if value is not None and "timestamp" in current_frame:
+            to_plot_times[zlib.crc32(value)] = (
+                current_frame["timestamp"],
+                monotonic(),
+            )
+
+    acquisition.on_acquisition = on_acquisition
+    control.parameters.to_plot.on_change(to_plot_changed)
+    control.parameters.get_listener_queue = stages["get_listener_queue"].wrap(
+        control.parameters.get_listener_queue
+    )
+
+    def answer_requests():
+        while True:
+            command = pipe.recv()
+            if command == "reset":
+                reset()
+                pipe.send(True)
+            elif command == "stats":
+                pipe.send(get_stats())
+            elif command == "shutdown":
+                acquisition_process.terminate()
+                acquisition.frame_ring.close()
+                os._exit(0)
+
+    reset()
+    server = ThreadedServer(control, port=port, authenticator=authenticate)
+
+    t = threading.Thread(target=answer_requests)
+    t.daemon = True
+    t.start()
+
+    pipe.send(True)
+    server.start()
+
+
+class Plot:
+    """Stands in for `PlotWidget.replot`: drops frames according to the plot
+    rate limit and decodes the remaining ones."""
+
+    def __init__(self, parameters, rate_limit):
+        self.parameters = parameters
+        self.rate_limit = rate_limit
+        self.last_plot_time = 0
+        self.plotted = {}
+
+    def replot(self, to_plot):
+        time_beginning = time()
+        if time_beginning - self.last_plot_time <= self.rate_limit:
+            return
+        self.last_plot_time = time_beginning
+
+        if to_plot is None:
+            return
+        data = decode_frame(to_plot)
+        if check_plot_data(self.parameters.lock.value, data):
+            self.plotted[zlib.crc32(to_plot)] = monotonic()
+            self.parameters.trace_frame(data["trace"])
+
+
+def configure(client, ramp_speed, fetch_quadratures, lock):
+    parameters, control = client.parameters, client.control
+    if parameters.lock.value:
+        control.exposed_start_ramp()
+
+    parameters.ramp_speed.value = ramp_speed
+    parameters.fetch_quadratures.value = fetch_quadratures
+    control.exposed_write_data()
+
+    if lock:
+        control.exposed_start_lock()
+
+
+def poll(parameters, duration):
+    stop = monotonic() + duration
+    while monotonic() < stop:
+        parameters.call_listeners(timeout=min(stop - monotonic(), 0.1))
+
+
+def get_latencies(arrival_times, to_plot_times):
+    """Returns the latencies between reading a frame from the FPGA and its
+    arrival at a stage in ms."""
+    return [
+        1000 * (arrival_time - to_plot_times[checksum][0])
+        for checksum, arrival_time in arrival_times.items()
+        if checksum in to_plot_times
+    ]
+
+
+def print_trace(histograms):
+    print(
+        "%25s %10s %16s %16s"
+        % ("frame trace", "frames", "p50 stage/ms", "p99 stage/ms")
+    )
+    for stage, stats in histograms.items():
+        print(
+            "%25s %10d %16.2f %16.2f"
+            % (stage, stats["count"], 1000 * stats["p50"], 1000 * stats["p99"])
+        )
+
+
+def print_results(server_stats, client_stages, received, plotted):
+    duration = server_stats["duration"]
+    to_plot_times = server_stats["to_plot_times"]
+
+    print("%25s %10s %16s %16s" % ("", "frames/s", "p50 latency/ms", "p99 latency/ms"))
+    for name, arrival_times in [
+        ("Parameters.to_plot", {k: v[1] for k, v in to_plot_times.items()}),
+        ("LinienClient", received),
+        ("replot", plotted),
+    ]:
+        latencies = get_latencies(arrival_times, to_plot_times)
+        if latencies:
+            p50, p99 = np.percentile(latencies, [50, 99])
+        else:
+            p50 = p99 = np.nan
+        print(
+            "%25s %10.1f %16.1f %16.1f"
+            % (name, len(arrival_times) / duration, p50, p99)
+        )
+
+    n_frames = max(len(to_plot_times), 1)
+    print("%25s %10s %16s" % ("CPU time", "calls/s", "ms per frame"))
+    print(
+        "%25s %10s %16.3f"
+        % (
+            "acquisition process",
+            "",
+            1000 * server_stats["acquisition_cpu_time"] / n_frames,
+        )
+    )
+    print(
+        "%25s %10s %16.3f"
+        % ("server process", "", 1000 * server_stats["server_cpu_time"] / n_frames)
+    )
+    stages = dict(server_stats["stages"])
+    stages.update({name: stage.get_stats() for name, stage in client_stages.items()})
+    for name, (count, cpu_time) in stages.items():
+        print(
+            "%25s %10.1f %16.3f" % (name, count / duration, 1000 * cpu_time / n_frames)
+        )
+
+
+@click.command()
+@click.option(
+    "--ramp-speed",
+    type=int,
+    multiple=True,
+    default=(0, 4, 8),
+    help="Ramp speeds to benchmark (can be given multiple times)",
+)
+@click.option(
+    "--state",
+    type=click.Choice(["sweep", "lock"]),
+    multiple=True,
+    default=("sweep",),
+    help="Whether to sweep or to lock (can be given multiple times)",
+)
+@click.option("--fetch-quadratures/--no-fetch-quadratures", default=True)
+@click.option("--duration", default=10.0, help="Duration of every run in s")
+@click.option("--plot-rate-limit", default=DEFAULT_PLOT_RATE_LIMIT)
+@click.option("--port", default=18870)
+def main(
+    ramp_speed,
+    state,
+    fetch_quadratures,
+    duration,
+    plot_rate_limit,
+    port,
+):
+    pipe, child_pipe = Pipe()
+    server = Process(target=run_server, args=(port, child_pipe))
+    server.start()
+    pipe.recv()
+
+    try:
+        client = LinienClient(
+            {
+                "host": "127.0.0.1",
+                "port": port,
+                "username": "benchmark",
+                "password": "benchmark",
+            },
+            autostart_server=False,
+            use_parameter_cache=True,
+        )
+        parameters = client.parameters
+
+        client_stages = {"call_listeners": StageTimer(), "replot": StageTimer()}
+        parameters.call_listeners = client_stages["call_listeners"].wrap(
+            parameters.call_listeners
+        )
+        received = {}
+
+        def to_plot_received(value):
+            if value is not None:
+                received[zlib.crc32(value)] = monotonic()
+
+        plot = Plot(parameters, plot_rate_limit)
+        parameters.to_plot.on_change(to_plot_received)
+        parameters.to_plot.on_change(client_stages["replot"].wrap(plot.replot))
+
+        for current_state in state:
+            for current_ramp_speed in ramp_speed:
+                print(
+                    "\nramp_speed=%d, fetch_quadratures=%s, %s"
+                    % (current_ramp_speed, fetch_quadratures, current_state)
+                )
+                configure(
+                    client,
+                    current_ramp_speed,
+                    fetch_quadratures,
+                    current_state == "lock",
+                )
+                poll(parameters, WARM_UP_TIME)
+
+                pipe.send("reset")
+                pipe.recv()
+                for stage in client_stages.values():
+                    stage.reset()
+                received.clear()
+                plot.plotted.clear()
+                parameters.frame_tracer.reset()
+
+                poll(parameters, duration)
+
+                pipe.send("stats")
+                print_results(pipe.recv(), client_stages, received, plot.plotted)
+                print_trace(parameters.frame_tracer.get_histograms())
+    finally:
+        pipe.send("shutdown")
+        server.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Micro-benchmark of the software decimation that is performed by the
+acquisition process for slow sweeps.
+
+Usage: python benchmarks/bench_decimation.py
+"""
+from timeit import repeat
+
+import numpy as np
+
+from linien.common import DECIMATION_MODE_MEAN, DECIMATION_MODE_ENVELOPE
+from linien.server.decimation import decimate
+
+# length of a scope buffer
+N_SAMPLES = 16384
+FACTORS = (2, 8, 32)
+N_RUNS = 200
+
+
+def decimate_float(array, factor):
+    # the previous implementation, for reference
+    dtype = array.dtype
+    return np.round(array.reshape(-1, factor).mean(axis=1)).astype(dtype)
+
+
+def benchmark(function, *args):
+    times = repeat(lambda: function(*args), number=N_RUNS, repeat=5)
+    return min(times) / N_RUNS
+
+
+def main():
+    # the scope reader returns strided views of interleaved signals
+    interleaved = np.random.randint(-8192, 8192, 2 * N_SAMPLES).astype(np.int16)
+    data = interleaved[0::2]
+
+    print("decimation of %d samples, time per call in us" % N_SAMPLES)
+    print("%8s %12s %12s %12s" % ("factor", "float mean", "int mean", "envelope"))
+    for factor in FACTORS:
+        times = [
+            benchmark(decimate_float, data, factor),
+            benchmark(decimate, data, factor, DECIMATION_MODE_MEAN),
+            benchmark(decimate, data, factor, DECIMATION_MODE_ENVELOPE),
+        ]
+        print("%8d %12.1f %12.1f %12.1f" % ((factor,) + tuple(t * 1e6 for t in times)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Benchmark of the server's CPU time per frame with several connected clients.
+
+A server with an emulated RedPitaya (see `bench_acquisition.py`) is started in
+a separate process. Then, clients connect to it one after another, each in its
+own process and listening to `to_plot` like the GUI does. For every number of
+clients, the benchmark reports how many frames per second arrive at
+`Parameters.to_plot` on the server and at every client and how much CPU time
+the server process spends per frame. Ideally, the latter doesn't depend on the
+number of clients. With `--max-rate` and `--decimation`, the clients request
+fewer or smaller frames, like a logger would do.
+
+Usage: python benchmarks/bench_fanout.py --clients 1 --clients 5 --clients 10
+"""
+import os
+import sys
+from multiprocessing import Pipe, Process
+from time import sleep
+
+import click
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_acquisition import WARM_UP_TIME, run_server
+
+from linien.client.connection import LinienClient
+
+
+def connect(port):
+    return LinienClient(
+        {
+            "host": "127.0.0.1",
+            "port": port,
+            "username": "benchmark",
+            "password": "benchmark",
+        },
+        autostart_server=False,
+        use_parameter_cache=True,
+    )
+
+
+def run_client(port, pipe, max_rate, decimation):
+    """Runs a client that counts the frames it receives. The benchmark controls
+    it through `pipe`."""
+    client = connect(port)
+    received = {"frames": 0}
+
+    def to_plot_received(value):
+        if value is not None:
+            received["frames"] += 1
+
+    client.parameters.to_plot.on_change(
+        to_plot_received, max_rate=max_rate, decimation=decimation
+    )
+    pipe.send(True)
+
+    while True:
+        client.parameters.call_listeners(timeout=0.1)
+
+        if pipe.poll():
+            command = pipe.recv()
+            if command == "reset":
+                received["frames"] = 0
+                pipe.send(True)
+            elif command == "stats":
+                pipe.send(received["frames"])
+            elif command == "stop":
+                client.disconnect()
+                return
+
+
+def start_client(port, max_rate, decimation):
+    pipe, child_pipe = Pipe()
+    process = Process(target=run_client, args=(port, child_pipe, max_rate, decimation))
+    process.start()
+    pipe.recv()
+    return process, pipe
+
+
+def request(pipes, command):
+    for pipe in pipes:
+        pipe.send(command)
+    return [pipe.recv() for pipe in pipes]
+
+
+@click.command()
+@click.option(
+    "--clients",
+    type=int,
+    multiple=True,
+    default=(1, 2, 5, 10),
+    help="Numbers of connected clients to benchmark (can be given multiple times)",
+)
+@click.option("--ramp-speed", default=4)
+@click.option(
+    "--max-rate", type=float, help="Maximum rate (in Hz) of frames sent to a client"
+)
+@click.option("--decimation", default=1, help="Decimation of the frames")
+@click.option("--duration", default=10.0, help="Duration of every run in s")
+@click.option("--port", default=18870)
+def main(clients, ramp_speed, max_rate, decimation, duration, port):
+    server_pipe, child_pipe = Pipe()
+    server = Process(target=run_server, args=(port, child_pipe))
+    server.start()
+    server_pipe.recv()
+
+    client_processes = []
+    try:
+        # doesn't listen to `to_plot`, just controls the server
+        control_client = connect(port)
+        control_client.parameters.ramp_speed.value = ramp_speed
+        control_client.control.exposed_write_data()
+
+        print(
+            "%10s %16s %16s %16s %20s"
+            % (
+                "clients",
+                "to_plot frames/s",
+                "client frames/s",
+                "server ms/frame",
+                "listener ms/frame",
+            )
+        )
+        for n_clients in sorted(clients):
+            while len(client_processes) < n_clients:
+                client_processes.append(start_client(port, max_rate, decimation))
+            client_pipes = [pipe for _, pipe in client_processes]
+            sleep(WARM_UP_TIME)
+
+            server_pipe.send("reset")
+            server_pipe.recv()
+            request(client_pipes, "reset")
+
+            sleep(duration)
+
+            received = request(client_pipes, "stats")
+            server_pipe.send("stats")
+            stats = server_pipe.recv()
+
+            n_frames = max(len(stats["to_plot_times"]), 1)
+            _, listener_cpu_time = stats["stages"]["get_listener_queue"]
+            print(
+                "%10d %16.1f %16.1f %16.3f %20.3f"
+                % (
+                    n_clients,
+                    len(stats["to_plot_times"]) / stats["duration"],
+                    np.mean(received) / stats["duration"],
+                    1000 * stats["server_cpu_time"] / n_frames,
+                    1000 * listener_cpu_time / n_frames,
+                )
+            )
+    finally:
+        for process, pipe in client_processes:
+            pipe.send("stop")
+            process.join()
+        server_pipe.send("shutdown")
+        server.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Benchmark of the NumPy models of the gateware, compared to the migen
+simulation they are cross-checked against (see `tests/test_models.py`).
+
+Usage: python benchmarks/bench_models.py
+"""
+from time import perf_counter
+
+import numpy as np
+
+from gateware.models.iir import IirModel
+from gateware.models.modulate import DemodulateModel, ModulateModel
+from gateware.models.pid import PIDModel
+from gateware.models.sweep import SweepCSRModel
+
+N_SAMPLES = 1 << 22
+N_SAMPLES_MIGEN = 1 << 12
+
+
+def run_pid(x):
+    model = PIDModel()
+    model.kp, model.ki, model.running = 2000, 1000, 1
+    return model.process(x)
+
+
+def run_iir(x):
+    model = IirModel(order=1)
+    model.coefficients.update(b0=1 << 10, a1=(1 << 16) - (1 << 10))
+    return model.process(x << 11)
+
+
+def run_sweep(x):
+    model = SweepCSRModel(14, 24, 8)
+    model.step, model.run = 1 << 10, 1
+    return model.process(len(x))
+
+
+def run_modulate(x):
+    model = ModulateModel()
+    model.amp, model.freq = 4000, 123456789
+    y, phase = model.process(n_samples=len(x))
+    return DemodulateModel().process(y, phase)
+
+
+def run_pid_migen(x):
+    # imported here because migen and misoc are only needed for comparison
+    from migen import run_simulation
+    from gateware.logic.pid import PID
+
+    pid = PID()
+
+    def tb():
+        yield pid.kp.storage.eq(2000)
+        yield pid.ki.storage.eq(1000)
+        yield pid.running.eq(1)
+        for value in x:
+            yield pid.input.eq(int(value))
+            yield
+
+    run_simulation(pid, tb())
+
+
+def benchmark(function, x):
+    start = perf_counter()
+    function(x)
+    return perf_counter() - start
+
+
+def main():
+    x = np.random.randint(-8192, 8192, N_SAMPLES)
+
+    print("simulation of %d clock cycles" % N_SAMPLES)
+    print("%10s %12s %16s" % ("model", "time in s", "cycles per s"))
+    for name, function in [
+        ("pid", run_pid),
+        ("iir", run_iir),
+        ("sweep", run_sweep),
+        ("modulate", run_modulate),
+    ]:
+        duration = benchmark(function, x)
+        print("%10s %12.2f %16.3g" % (name, duration, N_SAMPLES / duration))
+
+    try:
+        duration = benchmark(run_pid_migen, x[:N_SAMPLES_MIGEN])
+    except ImportError:
+        print("misoc is not installed, skipping migen simulation")
+    else:
+        print(
+            "%10s %12.2f %16.3g" % ("pid migen", duration, N_SAMPLES_MIGEN / duration)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -346,7 +346,10 @@ class LinienModule(Module, AutoCSR):
 
         self.comb += [
             self.scopegen.gpio_trigger.eq(self.gpio_p.i[0]),
-            self.scopegen.sweep_trigger.eq(self.logic.sweep.sweep.trigger),
+            # the rising edge of the sweep direction marks the beginning of
+            # the rising part of the sweep (like `trigger`), its falling edge
+            # the beginning of the falling part
+            self.scopegen.sweep_trigger.eq(self.logic.sweep.sweep.direction),
             self.logic.limit_fast1.x.eq(fast_outs[0]),
             self.logic.limit_fast2.x.eq(fast_outs[1]),
             self.analog.dac_a.eq(self.logic.limit_fast1.y),
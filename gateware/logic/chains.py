@@ -139,9 +139,17 @@ def cross_connect(gpio, chains):
             setattr(c, clr.name, clr)
             setattr(c, max.name, max)
             setattr(c, min.name, min)
-            c.comb += sig.status.eq(s)
-            c.sync += If(clr.re | (max.status < s), max.status.eq(s))
-            c.sync += If(clr.re | (min.status > s), min.status.eq(s))
+            # the status registers are unsigned, therefore the peak values
+            # are kept in signed signals for the comparisons
+            max_value = Signal.like(s)
+            min_value = Signal.like(s)
+            c.comb += [
+                sig.status.eq(s),
+                max.status.eq(max_value),
+                min.status.eq(min_value),
+            ]
+            c.sync += If(clr.re | (max_value < s), max_value.eq(s))
+            c.sync += If(clr.re | (min_value > s), min_value.eq(s))
 
     states = Cat(states)
     state = Signal(len(states))
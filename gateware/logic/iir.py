@@ -71,7 +71,9 @@ class Iir(Filter):
         y = Signal.like(self.y)
         railed = Signal()
         self.comb += [
-            railed.eq(~((y_over == y_pat) | (y_over == ~y_pat))),
+            # `~y_pat` would be equivalent to 0 in hardware, but migen's
+            # simulator evaluates it as a negative python int
+            railed.eq(~((y_over == y_pat) | (y_over == 0))),
             If(railed, y_lim.eq(self.y)).Else(y_lim.eq(y_next[shift:])),
         ]
         self.sync += [
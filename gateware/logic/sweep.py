@@ -30,6 +30,9 @@ class Sweep(Module):
         self.hold = Signal()
         self.y = Signal((width, True))
         self.trigger = Signal()
+        # 1 during the rising part of the sweep and 0 during the falling part.
+        # Its rising edge coincides with `trigger`
+        self.direction = Signal()
 
         ###
 
@@ -43,6 +46,7 @@ class Sweep(Module):
                 If(self.turn & ~turning, self.up.eq(~dir)).Else(self.up.eq(dir)),
             ).Else(self.up.eq(1))
         ]
+        self.comb += self.direction.eq(dir)
         self.sync += [
             self.trigger.eq(self.turn & self.up),
             turning.eq(self.turn),
@@ -0,0 +1,83 @@
+from math import atan, log, pi, sqrt
+
+import numpy as np
+
+from .fixed_point import register, wrap
+
+
+class CordicModel:
+    """Model of the four-quadrant `Cordic` in circular rotate mode with
+    `eval_mode="pipelined"`, which is what `Modulate` and `Demodulate` use.
+
+    Every stage is calculated vectorized for all samples, followed by the
+    register that separates it from the next stage."""
+
+    def __init__(self, width=16, widthz=None, stages=None, guard=0):
+        if guard is None:
+            guard = int(log(width) / log(2))
+        if widthz is None:
+            widthz = width
+        if stages is None:
+            stages = width + min(1, guard)
+
+        self.width = width
+        self.widthz = widthz
+        self.guard = guard
+
+        self.shifts, self.angles, self.gain = self._constants(stages, widthz + guard)
+        self.latency = stages
+
+        # the registers after every stage
+        self._registers = [(0, 0, 0)] * stages
+
+    @staticmethod
+    def _constants(stages, bits):
+        shifts = list(range(stages))
+        angles = [atan(2 ** -i) for i in shifts]
+        gain = 1.0
+        for i in shifts:
+            gain *= sqrt(1 + 2 ** (-2 * i))
+        cast = int
+        if log(bits) / log(2) % 1:
+            cast = round
+        angles = [cast(a * 2 ** (bits - 1) / pi) for a in angles]
+        return shifts, angles, gain
+
+    def process(self, xi, yi, zi):
+        """Rotates the vectors `(xi, yi)` by the angles `zi` (one value per
+        clock cycle) and returns `(xo, yo, zo)`."""
+        width, widthz, guard = self.width, self.widthz, self.guard
+        xi, yi, zi = wrap(xi, width), wrap(yi, width), wrap(zi, widthz)
+
+        # quadrant mapping
+        z_bits = wrap(zi, widthz, signed=False)
+        q = ((z_bits >> (widthz - 2)) ^ (z_bits >> (widthz - 1))) & 1 == 1
+        xi = np.where(q, wrap(-xi, width), xi)
+        yi = np.where(q, wrap(-yi, width), yi)
+        zi = np.where(q, wrap(zi + (1 << (widthz - 1)), widthz), zi)
+
+        x = wrap(xi << guard, width + guard)
+        y = wrap(yi << guard, width + guard)
+        z = wrap(zi << guard, widthz + guard)
+
+        for idx, (shift, angle) in enumerate(zip(self.shifts, self.angles)):
+            direction = z < 0
+            dx = y >> shift
+            dy = x >> shift
+            x, y, z = (
+                wrap(x + np.where(direction, dx, -dx), width + guard),
+                wrap(y + np.where(direction, -dy, dy), width + guard),
+                wrap(z + np.where(direction, angle, -angle), widthz + guard),
+            )
+
+            state_x, state_y, state_z = self._registers[idx]
+            x, state_x = register(x, state_x)
+            y, state_y = register(y, state_y)
+            z, state_z = register(z, state_z)
+            self._registers[idx] = (state_x, state_y, state_z)
+
+        return (
+            wrap(x >> guard, width),
+            wrap(y >> guard, width),
+            wrap(z >> guard, widthz),
+        )
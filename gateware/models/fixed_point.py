@@ -0,0 +1,77 @@
+"""Fixed-point helpers for the NumPy models of the gateware.
+
+All models work on int64 arrays and follow the semantics of migen's
+simulator: expressions are evaluated with unlimited precision and are only
+truncated when they are assigned to a signal. `wrap` does this truncation.
+"""
+import numpy as np
+
+
+def wrap(value, width, signed=True):
+    """Truncates `value` to `width` bits like an assignment to a signal of this
+    width does."""
+    value = np.asarray(value, dtype=np.int64)
+    if width >= 64:
+        # int64 values always fit
+        return value
+    if signed:
+        offset = 1 << (width - 1)
+        return ((value + offset) & ((1 << width) - 1)) - offset
+    return value & ((1 << width) - 1)
+
+
+def register(values, state):
+    """Models a register that is fed by `values` (one per clock cycle).
+
+    Returns the output of the register in the same cycles and the new state,
+    i.e. `values` delayed by one cycle and with `state` as first item."""
+    values = np.asarray(values, dtype=np.int64)
+    if len(values) == 0:
+        return values, state
+    return np.concatenate(([state], values[:-1])), int(values[-1])
+
+
+# number of increments that `saturating_cumsum` processes at once
+SATURATING_CUMSUM_WINDOW = 4096
+
+
+def saturating_cumsum(increments, start, minimum, maximum):
+    """Returns the values of an accumulator that starts at `start` and is
+    incremented by `increments` (one per clock cycle), saturating at `minimum`
+    and `maximum`. This is what the integrator of the PID does.
+
+    The cumulative sum is calculated vectorized until the first saturation,
+    the accumulator is clamped and the calculation is restarted there.
+    Increments that keep it in saturation are skipped at once."""
+    increments = np.asarray(increments, dtype=np.int64)
+    result = np.empty(len(increments), dtype=np.int64)
+    value = int(start)
+
+    idx = 0
+    while idx < len(increments):
+        stop = min(idx + SATURATING_CUMSUM_WINDOW, len(increments))
+        sums = value + np.cumsum(increments[idx:stop])
+        violations = np.flatnonzero((sums > maximum) | (sums < minimum))
+
+        if len(violations) == 0:
+            result[idx:stop] = sums
+            value = int(sums[-1])
+            idx = stop
+            continue
+
+        first = violations[0]
+        result[idx : idx + first] = sums[:first]
+        value = maximum if sums[first] > maximum else minimum
+        idx += first
+        result[idx] = value
+        idx += 1
+
+        # the accumulator stays saturated as long as the increments don't
+        # point away from the limit
+        remaining = increments[idx:]
+        leaving = remaining < 0 if value == maximum else remaining > 0
+        n_saturated = np.argmax(leaving) if leaving.any() else len(remaining)
+        result[idx : idx + n_saturated] = value
+        idx += n_saturated
+
+    return result
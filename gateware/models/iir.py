@@ -0,0 +1,123 @@
+import numpy as np
+
+from .fixed_point import register, wrap
+
+
+class IirModel:
+    """Model of the pipelined `Iir`.
+
+    `coefficients` maps the names of the coefficient CSRs (`"b0"`, `"a1"`, ...)
+    to their signed values, `z0` is the signed offset CSR. Like in the
+    gateware, coefficients and offset are registered. `hold` and `clear` are
+    not modeled, they are always 0 in the gateware.
+
+    The feedforward part is calculated vectorized, the feedback part requires
+    iterating over the samples in Python."""
+
+    def __init__(
+        self,
+        order=1,
+        width=25,
+        coeff_width=18,
+        shift=16,
+        intermediate_width=None,
+    ):
+        if intermediate_width is None:
+            intermediate_width = width + coeff_width
+
+        self.order = order
+        self.width = width
+        self.coeff_width = coeff_width
+        self.shift = shift
+        self.intermediate_width = intermediate_width
+
+        self.z0 = 0
+        self.coefficients = {
+            "%s%i" % (i, j): 0
+            for i in "ab"
+            for j in range(order + 1)
+            if (i, j) != ("a", 0)
+        }
+
+        # the stages of the pipeline in the order of the gateware, i.e. the
+        # coefficient of stage `k` is applied `len(stages) - 1 - k` cycles
+        # before the result is available
+        self._stages = ["b%i" % i for i in reversed(range(order + 1))]
+        self._stages += ["a%i" % i for i in reversed(range(1, order + 1))]
+
+        # registers of the gateware
+        self._coefficient_regs = {name: 0 for name in self.coefficients}
+        self._z0_reg = 0
+        self._zr = [0] * len(self._stages)
+        self._y = 0
+        self._y_state = 0
+        self._error = 0
+
+    def process(self, x):
+        """Returns output and error signal for the input `x` (one value per
+        clock cycle)."""
+        x = wrap(x, self.width)
+        n = len(x)
+        W = self.intermediate_width
+
+        coefficients = {}
+        for name, value in self.coefficients.items():
+            coefficients[name], self._coefficient_regs[name] = register(
+                np.full(n, wrap(value, self.coeff_width)),
+                self._coefficient_regs[name],
+            )
+
+        # feedforward part
+        z, self._z0_reg = register(
+            np.full(n, wrap(self.z0 << self.shift, W)), self._z0_reg
+        )
+        for k, name in enumerate(self._stages[: self.order + 1]):
+            zr, self._zr[k] = register(z, self._zr[k])
+            z = wrap(zr + x * coefficients[name], W)
+
+        # feedback part
+        feedback_stages = range(self.order + 1, len(self._stages))
+        feedback_coefficients = [
+            coefficients[self._stages[k]].tolist() for k in feedback_stages
+        ]
+        zr = [self._zr[k] for k in feedback_stages]
+
+        skip = self.shift + self.width - 1
+        over_mask = (1 << (W - skip)) - 1
+        mask = (1 << W) - 1
+        half_range = 1 << (W - 1)
+        y_mask = (1 << self.width) - 1
+        y_half_range = 1 << (self.width - 1)
+
+        y_state, y_out, error = self._y_state, self._y, self._error
+        ys = np.empty(n, dtype=np.int64)
+        errors = np.empty(n, dtype=np.int64)
+
+        for idx, z_ff in enumerate(z.tolist()):
+            ys[idx] = y_out
+            errors[idx] = error
+
+            previous = z_ff
+            for stage_idx in range(len(zr)):
+                current = (
+                    zr[stage_idx] + y_state * feedback_coefficients[stage_idx][idx]
+                )
+                current = ((current + half_range) & mask) - half_range
+                zr[stage_idx] = previous
+                previous = current
+            y_next = previous
+
+            over = ((y_next & mask) >> skip) & over_mask
+            railed = over != 0 and over != over_mask
+            if not railed:
+                y_out = (
+                    ((y_next >> self.shift) + y_half_range) & y_mask
+                ) - y_half_range
+            y_state = y_out
+            error = int(railed)
+
+        for stage_idx, k in enumerate(feedback_stages):
+            self._zr[k] = zr[stage_idx]
+        self._y_state, self._y, self._error = y_state, y_out, error
+
+        return ys, errors
@@ -0,0 +1,50 @@
+import numpy as np
+
+from .fixed_point import register, wrap
+
+
+def limit(x, minimum, maximum):
+    """Model of `Limit`. Returns the limited signal and whether it railed."""
+    x = np.asarray(x, dtype=np.int64)
+    railed_max = x >= maximum
+    railed_min = ~railed_max & (x <= minimum)
+    y = np.where(railed_max, maximum, np.where(railed_min, minimum, x))
+    return y, railed_max | railed_min
+
+
+class LimitCSRModel:
+    """Model of `LimitCSR`.
+
+    `min` and `max` are the signed values of the CSRs. Like in the gateware,
+    they are registered, i.e. changes take effect one cycle later."""
+
+    def __init__(self, width, guard=0):
+        self.width = width
+        self.guard = guard
+
+        self.min = -(1 << (width - 1))
+        self.max = (1 << (width - 1)) - 1
+
+        # registers of the gateware (`limit.min`, `limit.max`, `y` and `error`)
+        self._min_reg = 0
+        self._max_reg = 0
+        self._y = 0
+        self._error = 0
+
+    def process(self, x):
+        """Returns output and error signal for the input `x` (one value per
+        clock cycle)."""
+        x = wrap(x, self.width + self.guard)
+        n = len(x)
+
+        minimum, self._min_reg = register(
+            np.full(n, wrap(self.min, self.width)), self._min_reg
+        )
+        maximum, self._max_reg = register(
+            np.full(n, wrap(self.max, self.width)), self._max_reg
+        )
+        y, railed = limit(x, minimum, maximum)
+
+        y, self._y = register(wrap(y, self.width), self._y)
+        error, self._error = register(railed, self._error)
+        return y, error
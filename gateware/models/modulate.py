@@ -0,0 +1,82 @@
+import numpy as np
+
+from .cordic import CordicModel
+from .fixed_point import register, wrap
+
+
+class DemodulateModel:
+    """Model of `Demodulate`. `delay` and `multiplier` are the values of the
+    CSRs of the same name."""
+
+    def __init__(self, freq_width=32, width=14):
+        self.freq_width = freq_width
+        self.width = width
+
+        self.delay = 0
+        self.multiplier = 1
+
+        self.cordic = CordicModel(width=width + 1, stages=width + 1, guard=2)
+
+    def process(self, x, phase):
+        """Returns in-phase and quadrature signal for the input `x` and the
+        phase of the modulation `phase` (one value per clock cycle)."""
+        phase = wrap(phase, self.width, signed=False)
+        delay = int(wrap(self.delay, self.freq_width, signed=False))
+        multiplier = int(wrap(self.multiplier, 4, signed=False))
+
+        xo, yo, _ = self.cordic.process(
+            x, np.zeros(len(phase), dtype=np.int64), (phase * multiplier + delay) << 1
+        )
+        return wrap(xo >> 1, self.width), wrap(yo >> 1, self.width)
+
+
+class ModulateModel:
+    """Model of `Modulate`. `amp` and `freq` are the values of the CSRs of the
+    same name."""
+
+    def __init__(self, freq_width=32, width=14):
+        self.freq_width = freq_width
+        self.width = width
+
+        self.amp = 0
+        self.freq = 0
+
+        self.cordic = CordicModel(width=width + 1, stages=width + 1, guard=2)
+
+        # registers of the gateware
+        self._stop = 0
+        self._z = 0
+
+    def process(self, x=None, sync_phase=None, n_samples=None):
+        """Returns the modulation signal and its phase for `n_samples` clock
+        cycles. `x` is added to the amplitude, `sync_phase` resets the phase.
+        Both are optional arrays with one value per clock cycle."""
+        if n_samples is None:
+            n_samples = len(x if x is not None else sync_phase)
+        if x is None:
+            x = np.zeros(n_samples, dtype=np.int64)
+        if sync_phase is None:
+            sync_phase = np.zeros(n_samples, dtype=np.int64)
+
+        freq = int(wrap(self.freq, self.freq_width, signed=False))
+        stop, self._stop = register(np.full(n_samples, int(freq == 0)), self._stop)
+
+        # the phase accumulator `z` is incremented by `freq` every cycle and
+        # reset in cycles where `stop` or `sync_phase` are set
+        reset = (stop != 0) | (np.asarray(sync_phase) != 0)
+        idx = np.arange(n_samples, dtype=np.int64)
+        last_reset = np.maximum.accumulate(np.where(reset, idx, -1))
+        z_next = np.where(
+            last_reset >= 0,
+            (idx - last_reset) * freq,
+            self._z + (idx + 1) * freq,
+        )
+        z_next = wrap(z_next, self.freq_width, signed=False)
+        z, self._z = register(z_next, self._z)
+
+        phase = z >> (self.freq_width - self.width)
+        amp = int(wrap(self.amp, self.width, signed=False))
+        xo, _, _ = self.cordic.process(
+            amp + wrap(x, self.width), np.zeros(n_samples, dtype=np.int64), phase << 1
+        )
+        return wrap(xo >> 1, self.width), phase
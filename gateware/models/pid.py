@@ -0,0 +1,87 @@
+import numpy as np
+
+from .fixed_point import register, saturating_cumsum, wrap
+
+
+class PIDModel:
+    """Model of `PID`.
+
+    `kp`, `ki` and `kd` are the signed values of the CSRs, `setpoint` is used
+    as unsigned value like in the gateware. `running` and `reset` correspond
+    to the signals of the same name. All of them may be changed between calls
+    of `process`."""
+
+    def __init__(self, width=14, coeff_width=14):
+        self.width = width
+        self.coeff_width = coeff_width
+
+        self.max_pos = (1 << (width - 1)) - 1
+        self.max_neg = (-1 * self.max_pos) - 1
+
+        self.setpoint = 0
+        self.kp = 0
+        self.ki = 0
+        self.kd = 0
+        self.reset = 0
+        self.running = 0
+
+        self.int_reg_width = width + coeff_width + 4
+        self.extra_width = self.int_reg_width - width
+        self.max_pos_extra = self.max_pos << self.extra_width
+        self.max_neg_extra = (-1 * self.max_pos_extra) - 1
+
+        self.d_shift = 6
+        mult_width = coeff_width + width + 2
+        self.d_mult_width = mult_width
+        self.d_out_width = mult_width - coeff_width + self.d_shift + 1
+        self.sum_width = 2 * width + self.d_out_width
+
+        # registers of the gateware
+        self._int_reg = 0
+        self._kd_reg = 0
+        self._kd_reg_r = 0
+        self._output_d = 0
+        self._pid_sum = 0
+
+    def process(self, x):
+        """Returns `pid_out` for the input `x` (one value per clock cycle)."""
+        x = wrap(x, self.width)
+        width, coeff_width = self.width, self.coeff_width
+        kp, ki, kd = (wrap(k, coeff_width) for k in (self.kp, self.ki, self.kd))
+        setpoint = int(wrap(self.setpoint, width, signed=False))
+
+        if self.running:
+            error = wrap(x - setpoint, width + 1)
+        else:
+            error = np.zeros(len(x), dtype=np.int64)
+
+        output_p = wrap(
+            wrap(error * kp, width + coeff_width) >> (coeff_width - 2), width
+        )
+
+        # `int_reg` is set to the saturated sum of its current value and
+        # `ki_mult`, i.e. its next values are a saturating cumulative sum
+        ki_mult = wrap((error * ki) >> 4, 1 + width + coeff_width)
+        if self.reset:
+            int_next = np.zeros(len(x), dtype=np.int64)
+        else:
+            int_next = saturating_cumsum(
+                ki_mult, self._int_reg, self.max_neg_extra, self.max_pos_extra
+            )
+        int_reg, self._int_reg = register(int_next, self._int_reg)
+        int_out = wrap(int_reg >> self.extra_width, width)
+
+        kd_mult = wrap(error * kd, self.d_mult_width)
+        kd_reg, self._kd_reg = register(
+            wrap(kd_mult >> (coeff_width - self.d_shift), self.d_out_width),
+            self._kd_reg,
+        )
+        kd_reg_r, self._kd_reg_r = register(kd_reg, self._kd_reg_r)
+        output_d, self._output_d = register(
+            wrap(kd_reg - kd_reg_r, self.d_out_width), self._output_d
+        )
+
+        pid_sum, self._pid_sum = register(
+            wrap(output_p + int_out + output_d, self.sum_width), self._pid_sum
+        )
+        return np.clip(pid_sum, self.max_neg, self.max_pos)
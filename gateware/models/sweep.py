@@ -0,0 +1,169 @@
+import numpy as np
+
+from .fixed_point import wrap
+from .limit import limit
+
+# number of cycles of a ramp that are calculated at once. The first look ahead
+# is short and grows until a turning point is found
+RAMP_CHUNK_MIN_LENGTH = 1 << 8
+RAMP_CHUNK_MAX_LENGTH = 1 << 16
+
+
+class SweepCSRModel:
+    """Model of `SweepCSR`.
+
+    `step`, `min`, `max` and `run` are the (signed) values of the CSRs,
+    `clear` and `hold` correspond to the signals of the same name.
+
+    The state machine is iterated cycle by cycle around the turning points.
+    In between, the ramps are calculated vectorized."""
+
+    def __init__(self, width, step_width=None, step_shift=0):
+        if step_width is None:
+            step_width = width
+
+        self.width = width
+        self.step_width = step_width
+        self.step_shift = step_shift
+        # width of the accumulator of `Sweep`
+        self.sweep_width = width + step_shift + 1
+
+        self.step = 0
+        self.min = -(1 << (width - 1))
+        self.max = (1 << (width - 1)) - 1
+        self.run = 0
+        self.clear = 0
+        self.hold = 0
+
+        # registers of the gateware
+        self._state = dict(
+            sweep_y=0,
+            direction=0,
+            turning=0,
+            trigger=0,
+            turn=0,
+            limit_min=0,
+            limit_max=0,
+            y=0,
+        )
+
+    def process(self, n_samples):
+        """Returns output and trigger signal for `n_samples` clock cycles."""
+        y = np.empty(n_samples, dtype=np.int64)
+        trigger = np.empty(n_samples, dtype=np.int64)
+
+        config = dict(
+            run=int(bool(self.run) and not self.clear),
+            hold=int(bool(self.hold)),
+            step=int(wrap(self.step, self.sweep_width - 1, signed=False)),
+            min=int(wrap(self.min, self.width)),
+            max=int(wrap(self.max, self.width)),
+        )
+
+        idx = 0
+        while idx < n_samples:
+            n_ramp = self._skip_ramp(config, n_samples - idx, y[idx:], trigger[idx:])
+            if n_ramp:
+                idx += n_ramp
+                continue
+
+            y[idx] = self._state["y"]
+            trigger[idx] = self._state["trigger"]
+            previous = dict(self._state)
+            self._cycle(config)
+            idx += 1
+
+            if self._state == previous:
+                # nothing changes anymore
+                y[idx:] = self._state["y"]
+                trigger[idx:] = self._state["trigger"]
+                break
+
+        return y, trigger
+
+    def _limit_x(self, sweep_y):
+        return wrap(sweep_y >> self.step_shift, self.width + 1)
+
+    def _cycle(self, config):
+        s = self._state
+        limit_y, railed = limit(
+            self._limit_x(s["sweep_y"]), s["limit_min"], s["limit_max"]
+        )
+
+        if config["run"]:
+            if s["turn"] and not s["turning"]:
+                up = 1 - s["direction"]
+            else:
+                up = s["direction"]
+        else:
+            up = 1
+
+        if not config["run"]:
+            sweep_y = 0
+        elif config["hold"]:
+            sweep_y = s["sweep_y"]
+        else:
+            sweep_y = int(
+                wrap(
+                    s["sweep_y"] + (config["step"] if up else -config["step"]),
+                    self.sweep_width,
+                )
+            )
+
+        self._state = dict(
+            sweep_y=sweep_y,
+            direction=up,
+            turning=s["turn"],
+            trigger=s["turn"] & up,
+            turn=int(railed),
+            limit_min=config["min"],
+            limit_max=config["max"],
+            y=int(wrap(limit_y, self.width)),
+        )
+
+    def _skip_ramp(self, config, n_max, y, trigger):
+        """If the sweep is just ramping, fills `y` and `trigger` for at most
+        `n_max` cycles until it reaches a limit and advances the state
+        accordingly. Returns the number of cycles that were skipped."""
+        s = self._state
+        if (
+            not config["run"]
+            or config["hold"]
+            or s["turn"]
+            or s["turning"]
+            or s["limit_min"] != config["min"]
+            or s["limit_max"] != config["max"]
+        ):
+            return 0
+
+        step = config["step"] if s["direction"] else -config["step"]
+        n = min(n_max, RAMP_CHUNK_MIN_LENGTH)
+        while True:
+            # one more sample than skipped for the state after the ramp
+            sweep_y = wrap(
+                s["sweep_y"] + step * np.arange(n + 1, dtype=np.int64),
+                self.sweep_width,
+            )
+            limit_x = self._limit_x(sweep_y)
+            _, railed = limit(limit_x[:n], config["min"], config["max"])
+            if railed.any():
+                n = int(np.argmax(railed))
+                break
+            if n == n_max or n >= RAMP_CHUNK_MAX_LENGTH:
+                break
+            n = min(n_max, 4 * n)
+
+        if n < 2:
+            return 0
+
+        y[0] = s["y"]
+        y[1:n] = wrap(limit_x[: n - 1], self.width)
+        trigger[0] = s["trigger"]
+        trigger[1:n] = 0
+
+        s.update(
+            sweep_y=int(sweep_y[n]),
+            trigger=0,
+            y=int(wrap(limit_x[n - 1], self.width)),
+        )
+        return n
@@ -13,6 +13,9 @@ COLORS = {
 }
 # don't plot more often than once per `DEFAULT_PLOT_RATE_LIMIT` seconds
 DEFAULT_PLOT_RATE_LIMIT = 0.1
+# the server sends frames to the GUI at most at this rate (in Hz). It's higher
+# than the plot rate such that frames arriving slightly early don't cause gaps
+MAX_FRAME_RATE = 2 / DEFAULT_PLOT_RATE_LIMIT
 
 
 def get_data_folder():
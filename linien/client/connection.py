@@ -1,7 +1,8 @@
 import random
 import string
+from queue import Queue
 from socket import gaierror
-from time import sleep
+from time import monotonic, sleep
 from traceback import print_exc
 from typing import Callable
 
@@ -31,7 +32,12 @@ class RPYCClientWithAuthentication(rpyc.Service):
     """An rpyc client that authenticates using a hash.
 
     This class is run on the client side and exposes the client's unique id
-    to the server."""
+    to the server. The server pushes changed parameters to `notify`, they are
+    collected in `notifications` until `RemoteParameters.call_listeners` is
+    called. `on_notification` may be set to a function that is called whenever
+    a batch of changes arrives or the connection is closed, e.g. for scheduling
+    `call_listeners` in an event loop. Note that it is called from rpyc's
+    background thread."""
 
     def __init__(self, uuid, user, password):
         super().__init__()
@@ -39,6 +45,23 @@ class RPYCClientWithAuthentication(rpyc.Service):
         self.exposed_uuid = uuid
         self.auth_hash = hash_username_and_password(user, password).encode()
 
+        # (time of arrival, listener queue) tuples, `None` marks the end of the
+        # connection. See `BaseParameters.get_listener_queue`
+        self.notifications = Queue()
+        self.on_notification = None
+
+    def exposed_notify(self, queue):
+        self.notifications.put((monotonic(), queue))
+        self._call_on_notification()
+
+    def on_disconnect(self, conn):
+        self.notifications.put(None)
+        self._call_on_notification()
+
+    def _call_on_notification(self):
+        if self.on_notification is not None:
+            self.on_notification()
+
     def _connect(self, channel, config):
         # send auth hash before rpyc takes over
         channel.stream.sock.send(self.auth_hash)
@@ -46,6 +69,20 @@ class RPYCClientWithAuthentication(rpyc.Service):
         return super()._connect(channel, config)
 
 
+class PushServingThread(rpyc.BgServingThread):
+    """Serves the changes the server pushes to us. Waiting in `serve` instead of
+    sleeping between the calls means that they're handled immediately. When the
+    connection is closed, the thread ends silently.
+
+    rpyc 4.1.5 reads the intervals from these class attributes only."""
+
+    SERVE_INTERVAL = 1
+    SLEEP_INTERVAL = 0
+
+    def __init__(self, conn):
+        super().__init__(conn, callback=lambda: None)
+
+
 class RawRPYCClient:
     """This class implements the basic functionality for connecting to a Linien
     server using rpyc. See `LinienClient` for higher-level functionality.
@@ -103,12 +140,26 @@ class RawRPYCClient:
     ):
         """Connect to the server using rpyc and instanciate `RemoteParameters`."""
         self.connection = rpyc.connect(server, port, service=self.client_service)
+        self._serving_thread = PushServingThread(self.connection)
 
         cls = RemoteParameters
         if call_on_error:
             cls = self._catch_network_errors(cls, call_on_error)
 
-        self.parameters = cls(self.connection.root, self.uuid, use_parameter_cache)
+        self.parameters = cls(
+            self.connection.root,
+            self.uuid,
+            use_parameter_cache,
+            self.client_service.notifications,
+        )
+
+    def subscribe_channels(self, channels):
+        """Requests the acquisition of `channels` (see `linien.server.channels`)
+        until the client disconnects. This is only required for reading data
+        parameters without listening to them: the error signals are always
+        acquired, but e.g. the quadratures (`"quadratures"`) and the output of
+        the slow PID (`"slow"`) are only acquired if somebody needs them."""
+        self.connection.root.exposed_subscribe_channels(self.uuid, tuple(channels))
 
     def _catch_network_errors(self, cls, call_on_error):
         """This method can be used for patching RemoteParameters such
@@ -243,8 +294,10 @@ class LinienClient(RawRPYCClient):
             self.prepare_parameter_restoring()
 
     def disconnect(self):
-        self.connection.close()
         self.connected = False
+        self.client_service.on_notification = None
+        # this also ends the background thread that serves the connection
+        self.connection.close()
 
     def prepare_parameter_restoring(self):
         """Listens for changes of some parameters and permanently saves their
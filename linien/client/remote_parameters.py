@@ -1,6 +1,10 @@
+from queue import Empty, Queue
+from time import monotonic
 from typing import Callable
-from rpyc import async_
-from linien.common import unpack, pack
+from linien.common import unpack, pack, FrameTracer
+
+# how often the offset between the server's clock and ours is measured (in s)
+CLOCK_SYNC_INTERVAL = 60
 
 
 class RemoteParameters:
@@ -26,14 +30,14 @@ class RemoteParameters:
         # parameter changes
         def on_change(value):
             # this function is called whenever `my_param` changes on the server.
-            # note that this only works if `call_listeners` is called from
-            # time to time as this function is responsible for checking for
-            # changed parameters.
+            # note that this only works if `call_listeners` is called as this
+            # function is responsible for calling the listeners of changed
+            # parameters.
             print('parameter arrived!', value)
         r.my_param.on_change(on_change)
         while True:
-            r.call_listeners()
-            sleep(.1)
+            # waits for changes and calls the listeners
+            r.call_listeners(timeout=None)
 
     The arguments for __init__ are:
 
@@ -49,17 +53,36 @@ class RemoteParameters:
                      `r.my_param.value`, each parameter value is only transmitted
                      once (after it was changed).
                      Note that calling `call_listeners` is required for this.
+        `notifications`: The queue the changes that the server pushes are put
+                     in, see `RPYCClientWithAuthentication`.
+
+    The server pushes changed parameters as soon as they change. Listeners are
+    only called by `call_listeners`, i.e. in the thread that calls it.
+
+    Frames of `to_plot` carry a trace with the timestamps of the stages they
+    passed on the server. The client adds the time the frame was queued for it
+    and the time it was fetched. Listeners of `to_plot` that decode a frame
+    call `trace_frame` with its trace once they're done. The per-stage
+    latencies are collected in `frame_tracer`.
     """
 
-    def __init__(self, remote, uuid: str, use_cache: bool):
+    def __init__(self, remote, uuid: str, use_cache: bool, notifications: Queue):
         self.remote = remote
         self.uuid = uuid
-        self._async_listener_queue = None
+        self._notifications = notifications
 
         self._listeners = {}
 
+        # the timestamps of the queue entry whose listeners are currently called
+        self._current_trace = {}
+        self.frame_tracer = FrameTracer()
+        self._clock_offset = 0
+        self._last_clock_sync = None
+
         self._mimic_remote_parameters(use_cache)
 
+        self._sync_clock()
+        self.remote.exposed_push_listener_queue(self.uuid)
         self.call_listeners()
 
     def __iter__(self):
@@ -72,52 +95,89 @@ class RemoteParameters:
         for name, param in self.remote.exposed_get_all_parameters():
             setattr(self, name, RemoteParameter(self, param, name, use_cache))
 
-    def _register_listener(self, param, callback: Callable):
+    def _register_listener(
+        self, param, callback: Callable, max_rate: float = None, decimation: int = 1
+    ):
         """Tells the server to notify our client (identified by `self.uuid`)
         when `param` changes. Registers a function `callback` that will be
-        called in this case."""
-        if param.name not in self._listeners:
-            self.remote.exposed_register_remote_listener(self.uuid, param.name)
+        called in this case. See `RemoteParameter.on_change` for `max_rate` and
+        `decimation`."""
+        if param.name not in self._listeners or max_rate or decimation != 1:
+            self.remote.exposed_register_remote_listener(
+                self.uuid, param.name, max_rate, decimation
+            )
 
         self._listeners.setdefault(param.name, [])
         self._listeners[param.name].append(callback)
 
-    def call_listeners(self):
-        """Ask the server for changed parameters and call the respective
-        callback functions. This call takes place asynchronously, i.e. the first
-        run of `call_listeners` just issues the call but does not wait for it
-        in order not to block the GUI. The following calls check whether a
-        result has arrived (also not blocking GUI).
+    def call_listeners(self, timeout=0):
+        """Calls the callback functions of the parameters that changed on the
+        server. The server pushes the changes in the background, this method
+        processes all changes that have arrived so far. If there are none, it
+        waits for at most `timeout` seconds (forever if `timeout` is `None`).
 
-        In Linien GUI client, this function is called periodically.
+        In Linien GUI client, this function is called whenever changes arrive.
         If you use the python client and want to use callbacks for changed
-        parameters you have to call this method manually from time to time."""
-
-        def _get_listener_queue_async():
-            """Issues an asynchronous call (that does not block the GUI) to the
-            server in order to retrieve a batch of changed parameters."""
-            self._async_listener_queue = async_(self.remote.get_listener_queue)(
-                self.uuid
-            )
+        parameters you have to call this method, e.g. in a loop or after being
+        notified by `RPYCClientWithAuthentication.on_notification`.
 
-        if self._async_listener_queue is None:
-            # this means that the async call was not started yet --> start it
-            # the next call to `call_listeners` will then check whether the
-            # the result is ready.
-            return _get_listener_queue_async()
+        Raises `EOFError` if the connection was closed."""
+        try:
+            notification = self._notifications.get(timeout != 0, timeout)
+        except Empty:
+            return
 
-        if self._async_listener_queue.ready:
-            # we have a result
-            queue = unpack(self._async_listener_queue.value)
+        while True:
+            if notification is None:
+                # keep the marker such that the next call raises, too
+                self._notifications.put(None)
+                raise EOFError("connection closed")
 
-            # now that we have our result, we can start the next call
-            _get_listener_queue_async()
+            received, queue = notification
+            fetched = self._to_server_time(received)
 
             # iterate over all canged parameters and call the respective
             # callback functions
-            for param_name, value in queue:
+            for param_name, value, queued in queue:
+                value = unpack(value)
+                self._current_trace = {
+                    "listener_queued": queued,
+                    "client_fetched": fetched,
+                }
                 for listener in self._listeners[param_name]:
                     listener(value)
+            self._current_trace = {}
+
+            try:
+                notification = self._notifications.get_nowait()
+            except Empty:
+                break
+
+        if monotonic() - self._last_clock_sync > CLOCK_SYNC_INTERVAL:
+            self._sync_clock()
+
+    def trace_frame(self, trace):
+        """Records the latencies of a frame of `to_plot`. `trace` is the
+        trace contained in the frame. This method has to be called from a
+        listener, after the frame was processed (e.g. plotted)."""
+        trace = dict(trace, **self._current_trace)
+        trace["plotted"] = self._to_server_time(monotonic())
+        self.frame_tracer.add(trace)
+
+    def _sync_clock(self, n_samples=3):
+        """Measures the offset between the server's monotonic clock and ours.
+        The measurement with the shortest round trip is the most accurate."""
+        samples = []
+        for _ in range(n_samples):
+            start = monotonic()
+            server_time = self.remote.exposed_get_monotonic_time()
+            stop = monotonic()
+            samples.append((stop - start, server_time - (start + stop) / 2))
+        self._clock_offset = min(samples)[1]
+        self._last_clock_sync = monotonic()
+
+    def _to_server_time(self, timestamp):
+        return timestamp + self._clock_offset
 
     def _get_param(self, param_name):
         return unpack(self.remote.exposed_get_param(param_name))
@@ -156,10 +216,16 @@ class RemoteParameter:
         """Notify the server of the new value"""
         return self.parent._set_param(self.name, value)
 
-    def on_change(self, callback_on_change):
+    def on_change(self, callback_on_change, max_rate=None, decimation=1):
         """Tells the server that `callback_on_change` should be called whenever
-        the parameter changes."""
-        self.parent._register_listener(self, callback_on_change)
+        the parameter changes.
+
+        The server sends changes at most `max_rate` times per second (only the
+        latest value is sent) and decimates array-valued parameters (`to_plot`
+        and `control_signal_history`) by `decimation`. These settings apply to
+        all listeners of the parameter (including the local cache); the latest
+        call that specifies them wins."""
+        self.parent._register_listener(self, callback_on_change, max_rate, decimation)
         # call the callback with the initial value
         callback_on_change(self.value)
 
@@ -9,6 +9,9 @@ MHz = 0x10000000 / 8
 Vpp = ((1 << 14) - 1) / 4
 # conversion of bits to V
 ANALOG_OUT_V = 1.8 / ((2 ** 15) - 1)
+# conversion of the 14 bit values of fast inputs and outputs (and of the
+# signals derived from them, e.g. error and control signal) to V
+FAST_V = 1 / 8192
 
 LOW_PASS_FILTER = 0
 HIGH_PASS_FILTER = 1
@@ -17,15 +20,152 @@ FAST_OUT1 = 0
 FAST_OUT2 = 1
 ANALOG_OUT0 = 2
 
+# default decimation of the scope. The length of the traces may be changed at
+# runtime using the `trace_length` parameter, `N_POINTS` is its default value.
 DECIMATION = 8
 assert DECIMATION % 2 == 0 or DECIMATION == 1
 N_POINTS = int(16384 / DECIMATION)
+# limits of the `trace_length` parameter. The maximum is the length of the
+# scope's buffer.
+MIN_TRACE_LENGTH = 512
+MAX_TRACE_LENGTH = 16384
+
+# modes for the software decimation that is performed for slow sweeps
+DECIMATION_MODE_MEAN = 0
+# keeps minimum and maximum, i.e. narrow lines don't disappear
+DECIMATION_MODE_ENVELOPE = 1
+
+# averaging modes of the power spectral density that is calculated in locked
+# state
+PSD_AVERAGING_EXPONENTIAL = 0
+PSD_AVERAGING_BOXCAR = 1
 
 
 class SpectrumUncorrelatedException(Exception):
     pass
 
 
+class LatencyCounter:
+    """Keeps simple statistics of latencies (in seconds)."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.last = None
+
+    def add(self, latency):
+        self.count += 1
+        self.total += latency
+        self.max = max(self.max, latency)
+        self.last = latency
+
+    def get_stats(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "max": self.max,
+            "last": self.last,
+        }
+
+
+# the stages a frame passes on its way from the FPGA to the plot. A frame's
+# trace maps (some of) them to `time.monotonic()` timestamps of the server's
+# clock, see `FrameTracer`.
+FRAME_TRACE_STAGES = (
+    # the acquisition process noticed the scope trigger (or, in locked state,
+    # started reading the scope)
+    "trigger",
+    # the scope buffer was read and written to the frame ring
+    "buffer_read",
+    # the acquisition process notified the server about the frame
+    "pipe_send",
+    # the server started processing the frame
+    "data_received",
+    # the frame was appended to the listener queues of the clients
+    "listener_queued",
+    # the client received its listener queue
+    "client_fetched",
+    # the client processed the frame, e.g. plotted it
+    "plotted",
+)
+
+
+class LatencyHistogram:
+    """A histogram of latencies (in seconds) with logarithmically spaced bins
+    between 10 us and 10 s (20 per decade)."""
+
+    EDGES = np.logspace(-5, 1, 121)
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # one additional bin each for latencies below and above the edges
+        self.counts = np.zeros(len(self.EDGES) + 1, dtype=np.int64)
+
+    def add(self, latency):
+        self.counts[np.searchsorted(self.EDGES, latency)] += 1
+
+    def get_percentile(self, percentile):
+        """Returns the upper edge of the bin that contains `percentile`."""
+        count = self.counts.sum()
+        if not count:
+            return None
+        idx = np.searchsorted(np.cumsum(self.counts), percentile / 100 * count)
+        return float(self.EDGES[min(idx, len(self.EDGES) - 1)])
+
+    def get_stats(self):
+        return {
+            "count": int(self.counts.sum()),
+            "edges": self.EDGES.tolist(),
+            "counts": self.counts.tolist(),
+            "p50": self.get_percentile(50),
+            "p99": self.get_percentile(99),
+        }
+
+
+class FrameTracer:
+    """Collects per-stage latency histograms of frame traces.
+
+    A trace is a dict that contains the frame's sequence number as "id" and
+    maps the names of `FRAME_TRACE_STAGES` to timestamps. The latency of a
+    stage is the time since the previous stage that is part of the trace,
+    "total" is the time between the first and the last stage."""
+
+    def __init__(self):
+        self.histograms = {
+            stage: LatencyHistogram() for stage in FRAME_TRACE_STAGES[1:] + ("total",)
+        }
+        self.last_trace = None
+
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.reset()
+        self.last_trace = None
+
+    def add(self, trace):
+        timestamps = [
+            (stage, trace[stage]) for stage in FRAME_TRACE_STAGES if stage in trace
+        ]
+        for (_, previous), (stage, timestamp) in zip(timestamps, timestamps[1:]):
+            self.histograms[stage].add(timestamp - previous)
+        if len(timestamps) > 1:
+            self.histograms["total"].add(timestamps[-1][1] - timestamps[0][1])
+        self.last_trace = trace
+
+    def get_histograms(self):
+        """Returns the statistics of all stages that were traced so far."""
+        return {
+            stage: histogram.get_stats()
+            for stage, histogram in self.histograms.items()
+            if histogram.counts.any()
+        }
+
+
 def downsample_history(times, values, max_time_diff, max_N=N_POINTS):
     """The history should not grow too much. When recording for long intervals,
     we want to throw away some datapoints that were recorded with a sampling rate
@@ -104,7 +244,9 @@ def determine_shift_by_correlation(zoom_factor, reference_signal, error_signal):
     reference_signal[np.isnan(reference_signal)] = 0
     error_signal[np.isnan(error_signal)] = 0
 
-    length = len(error_signal)
+    # the reference signal may have a different number of points than the
+    # error signal
+    length = len(reference_signal)
     center_idx = int(length / 2)
 
     # crop the reference signal such that it shows the same region as the new
@@ -133,7 +275,7 @@ def determine_shift_by_correlation(zoom_factor, reference_signal, error_signal):
     return shift, zoomed_ref, downsampled_error_signal
 
 
-def get_lock_point(error_signal, x0, x1, final_zoom_factor=1.5):
+def get_lock_point(error_signal, x0, x1, final_zoom_factor=1.5, trace_length=N_POINTS):
     """Calculates parameters for the autolock based on the initial error signal.
 
     Takes the `error_signal` and two points (`x0` and `x1`) as arguments. The
@@ -143,6 +285,9 @@ def get_lock_point(error_signal, x0, x1, final_zoom_factor=1.5):
     Use `final_zoom_factor` to specify how wide the line should be in the end:
     - 1: in the end, only the line should be visible
     - 5: an area of 5 times the linewidth should be visible
+
+    The target zoom refers to traces of `trace_length` points, i.e. the value
+    of the `trace_length` parameter.
     """
     length = len(error_signal)
 
@@ -174,11 +319,34 @@ def get_lock_point(error_signal, x0, x1, final_zoom_factor=1.5):
         rolled_error_signal = np.hstack((filler, error_signal[:-roll]))
 
     target_slope_rising = max_idx > min_idx
-    target_zoom = N_POINTS / (idxs[1] - idxs[0]) / final_zoom_factor
+    target_zoom = trace_length / (idxs[1] - idxs[0]) / final_zoom_factor
 
     return mean_signal, target_slope_rising, target_zoom, rolled_error_signal
 
 
+def clip_roi(roi, trace_length):
+    """Returns `(start, length)` of a region of interest of a trace that is
+    `trace_length` points long. `roi` is either `None` (the full trace) or a
+    `(start, length)` tuple that is clipped to the trace. Start and length are
+    rounded down to even numbers."""
+    if roi is None:
+        return 0, trace_length
+
+    start, length = (int(v) for v in roi)
+    start = min(max(start, 0), trace_length - 2)
+    length = min(max(length, 2), trace_length - start)
+    return start - start % 2, length - length % 2
+
+
+def expand_roi(signal, roi_start, trace_length):
+    """Places a region of interest of a trace at its position in an array of
+    length `trace_length`. Points outside of the region of interest are nan."""
+    expanded = np.empty(trace_length)
+    expanded[:] = np.nan
+    expanded[roi_start : roi_start + len(signal)] = signal
+    return expanded
+
+
 def convert_channel_mixing_value(value):
     if value <= 0:
         a_value = 128
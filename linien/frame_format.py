@@ -0,0 +1,166 @@
+"""Binary format of the frames that are published in `Parameters.to_plot`.
+
+A frame consists of a fixed header (`HEADER_DTYPE`), the names of its channels
+and the channels themselves as contiguous blocks of little-endian int16 values:
+
+    | header | name 0 | ... | name n-1 | channel 0 | ... | channel n-1 |
+
+Every name occupies `CHANNEL_NAME_LENGTH` bytes (ASCII, zero-padded). All
+channels have the same length, `n_points`. Decoding doesn't copy the data, the
+channels are NumPy views of the encoded bytes.
+
+Increment `FRAME_FORMAT_VERSION` whenever the layout changes.
+"""
+import numpy as np
+
+from linien.common import FRAME_TRACE_STAGES
+
+MAGIC = b"LNFR"
+FRAME_FORMAT_VERSION = 1
+CHANNEL_NAME_LENGTH = 32
+CHANNEL_DTYPE = np.dtype("<i2")
+
+# the stages of a frame's trace that the server passes before encoding it
+ENCODED_TRACE_STAGES = FRAME_TRACE_STAGES[:4]
+
+FLAG_LOCKED = 1 << 0
+FLAG_SWEEP_DOWN = 1 << 1
+FLAG_ROI = 1 << 2
+FLAG_SLOW = 1 << 3
+FLAG_TRACE = 1 << 4
+
+HEADER_DTYPE = np.dtype(
+    [
+        ("magic", "S4"),
+        ("version", "<u2"),
+        ("n_channels", "<u2"),
+        ("n_points", "<u4"),
+        # combination of the `FLAG_*` values
+        ("flags", "<u4"),
+        # the sequence number of the frame, only valid if `FLAG_TRACE` is set
+        ("id", "<u8"),
+        # only valid if `FLAG_ROI` is set
+        ("roi_start", "<u4"),
+        ("trace_length", "<u4"),
+        # only valid if `FLAG_SLOW` is set
+        ("slow_value", "<i4"),
+        ("reserved", "<u4"),
+        # timestamps of `ENCODED_TRACE_STAGES`, NaN if the stage is missing
+        ("timestamps", "<f8", (len(ENCODED_TRACE_STAGES),)),
+    ]
+)
+NAME_DTYPE = np.dtype("S%d" % CHANNEL_NAME_LENGTH)
+
+# keys of the frame dicts that are not channels
+METADATA_KEYS = ("locked", "sweep_down", "roi", "slow", "trace")
+
+
+class InvalidFrameException(Exception):
+    pass
+
+
+def encode_frame(data):
+    """Encodes a frame and returns it as bytes.
+
+    `data` is a dict that maps channel names to arrays of the same length and
+    may contain these optional items:
+
+        `locked`:     whether the frame was recorded in locked state
+        `sweep_down`: whether it was recorded during the falling part of the
+                      sweep
+        `roi`:        (first point, length of the full trace) if only a region
+                      of interest was recorded
+        `slow`:       value of the slow PID
+        `trace`:      trace of the frame, see `linien.common.FrameTracer`
+    """
+    channels = [(k, v) for k, v in data.items() if k not in METADATA_KEYS]
+    n_points = len(channels[0][1]) if channels else 0
+
+    names_offset = HEADER_DTYPE.itemsize
+    data_offset = names_offset + len(channels) * CHANNEL_NAME_LENGTH
+    buffer = np.empty(
+        data_offset + len(channels) * n_points * CHANNEL_DTYPE.itemsize,
+        dtype=np.uint8,
+    )
+
+    header = buffer[:names_offset].view(HEADER_DTYPE)[0]
+    header["magic"] = MAGIC
+    header["version"] = FRAME_FORMAT_VERSION
+    header["n_channels"] = len(channels)
+    header["n_points"] = n_points
+    header["reserved"] = 0
+
+    flags = 0
+    if data.get("locked"):
+        flags |= FLAG_LOCKED
+    if data.get("sweep_down"):
+        flags |= FLAG_SWEEP_DOWN
+
+    header["roi_start"], header["trace_length"] = data.get("roi", (0, 0))
+    if "roi" in data:
+        flags |= FLAG_ROI
+
+    header["slow_value"] = data.get("slow", 0)
+    if "slow" in data:
+        flags |= FLAG_SLOW
+
+    trace = data.get("trace")
+    header["id"] = trace["id"] if trace else 0
+    header["timestamps"] = [
+        trace.get(stage, np.nan) if trace else np.nan for stage in ENCODED_TRACE_STAGES
+    ]
+    if trace:
+        flags |= FLAG_TRACE
+    header["flags"] = flags
+
+    buffer[names_offset:data_offset].view(NAME_DTYPE)[:] = [
+        name.encode("ascii") for name, _ in channels
+    ]
+    channel_data = buffer[data_offset:].view(CHANNEL_DTYPE)
+    for idx, (name, values) in enumerate(channels):
+        assert len(values) == n_points, "channel %s has the wrong length" % name
+        channel_data[idx * n_points : (idx + 1) * n_points] = values
+
+    return buffer.tobytes()
+
+
+def decode_frame(data):
+    """Decodes a frame that was encoded using `encode_frame` and returns a dict
+    with the same items. The channels are read-only views of `data`."""
+    if len(data) < HEADER_DTYPE.itemsize:
+        raise InvalidFrameException("frame is too short")
+    header = np.frombuffer(data, dtype=HEADER_DTYPE, count=1)[0]
+    if header["magic"] != MAGIC:
+        raise InvalidFrameException("invalid magic %r" % header["magic"])
+    if header["version"] != FRAME_FORMAT_VERSION:
+        raise InvalidFrameException(
+            "unsupported version %d of the frame format" % header["version"]
+        )
+
+    n_channels = int(header["n_channels"])
+    n_points = int(header["n_points"])
+    names_offset = HEADER_DTYPE.itemsize
+    data_offset = names_offset + n_channels * CHANNEL_NAME_LENGTH
+    if len(data) != data_offset + n_channels * n_points * CHANNEL_DTYPE.itemsize:
+        raise InvalidFrameException("frame has the wrong length")
+
+    names = np.frombuffer(data, dtype=NAME_DTYPE, count=n_channels, offset=names_offset)
+    channels = np.frombuffer(
+        data, dtype=CHANNEL_DTYPE, count=n_channels * n_points, offset=data_offset
+    ).reshape(n_channels, n_points)
+
+    flags = int(header["flags"])
+    frame = {name.decode("ascii"): channel for name, channel in zip(names, channels)}
+    frame["locked"] = bool(flags & FLAG_LOCKED)
+    frame["sweep_down"] = bool(flags & FLAG_SWEEP_DOWN)
+    if flags & FLAG_ROI:
+        frame["roi"] = (int(header["roi_start"]), int(header["trace_length"]))
+    if flags & FLAG_SLOW:
+        frame["slow"] = int(header["slow_value"])
+    if flags & FLAG_TRACE:
+        frame["trace"] = {"id": int(header["id"])}
+        for stage, timestamp in zip(ENCODED_TRACE_STAGES, header["timestamps"]):
+            if not np.isnan(timestamp):
+                frame["trace"][stage] = float(timestamp)
+
+    return frame
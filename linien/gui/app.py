@@ -25,6 +25,8 @@ from linien.gui.utils_gui import set_window_icon
 
 class QTApp(QtCore.QObject):
     ready = QtCore.pyqtSignal(bool)
+    # emitted by rpyc's background thread when the server pushed changes
+    notification_received = QtCore.pyqtSignal()
 
     def __init__(self):
         self.app = QtWidgets.QApplication(sys.argv)
@@ -41,6 +43,10 @@ class QTApp(QtCore.QObject):
 
         super().__init__()
 
+        # the listeners are called in the GUI thread as the signal is emitted in
+        # a different thread
+        self.notification_received.connect(self.call_listeners)
+
     def connected(self, connection, parameters, control):
         self.device_manager.hide()
         self.main_window.show(connection.host, connection.device["name"])
@@ -48,6 +54,7 @@ class QTApp(QtCore.QObject):
         self.connection = connection
         self.control = control
         self.parameters = parameters
+        connection.client_service.on_notification = self.notification_received.emit
 
         self.ready.connect(self.init)
         self.ready.emit(True)
@@ -76,8 +83,6 @@ class QTApp(QtCore.QObject):
                 print(colors.red | "call_listeners() failed")
                 print_exc()
 
-            QtCore.QTimer.singleShot(50, self.call_listeners)
-
     def get_widget(self, name, window=None):
         """Queries a widget by name."""
         window = window or self.main_window
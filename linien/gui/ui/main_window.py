@@ -1,6 +1,5 @@
 import json
 import linien
-import pickle
 import numpy as np
 from math import log
 from time import time
@@ -8,6 +7,7 @@ from PyQt5 import QtGui, QtWidgets, QtCore
 
 import linien
 from linien.common import check_plot_data
+from linien.frame_format import decode_frame
 from linien.gui.utils_gui import color_to_hex, param2ui
 from linien.config import N_COLORS
 from linien.client.config import COLORS
@@ -250,8 +250,8 @@ class MainWindow(QtGui.QMainWindow, CustomWidget):
 
     def update_std(self, to_plot, max_std_history_length=10):
         if self.parameters.lock.value and to_plot:
-            to_plot = pickle.loads(to_plot)
-            if to_plot and check_plot_data(True, to_plot):
+            to_plot = decode_frame(to_plot)
+            if check_plot_data(True, to_plot):
                 error_signal = to_plot.get("error_signal")
                 control_signal = to_plot.get("control_signal")
 
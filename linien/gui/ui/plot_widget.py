@@ -10,7 +10,8 @@ from pyqtgraph.Qt import QtCore, QtGui
 from PyQt5.QtCore import QThread, pyqtSignal
 
 from linien.config import DEFAULT_COLORS, N_COLORS
-from linien.client.config import COLORS, DEFAULT_PLOT_RATE_LIMIT
+from linien.client.config import COLORS, DEFAULT_PLOT_RATE_LIMIT, MAX_FRAME_RATE
+from linien.frame_format import decode_frame
 from linien.gui.widgets import CustomWidget
 from linien.common import (
     get_signal_strength_from_i_q,
@@ -19,6 +20,7 @@ from linien.common import (
     get_lock_point,
     combine_error_signal,
     check_plot_data,
+    expand_roi,
     N_POINTS,
     SpectrumUncorrelatedException,
 )
@@ -59,6 +61,11 @@ class PlotWidget(pg.PlotWidget, CustomWidget):
         # NOTE: OpenGL has a bug that causes the plot to be way too small.
         # Therefore, self.resize() is called below.
 
+        # the number of points of the traces. It is updated as soon as data
+        # with a different length is received
+        self.n_points = N_POINTS
+        self.x_offset = 0
+
         self.crosshair = pg.InfiniteLine(pos=N_POINTS / 2, pen=pg.mkPen("w", width=1))
         self.addItem(self.crosshair)
 
@@ -155,7 +162,7 @@ class PlotWidget(pg.PlotWidget, CustomWidget):
 
         self.control_signal_history_data = self.parameters.control_signal_history.value
 
-        self.parameters.to_plot.on_change(self.replot)
+        self.parameters.to_plot.on_change(self.replot, max_rate=MAX_FRAME_RATE)
 
         def autolock_selection_changed(value):
             if value:
@@ -239,7 +246,7 @@ class PlotWidget(pg.PlotWidget, CustomWidget):
 
     def _within_boundaries(self, x):
         boundaries = (
-            self.selection_boundaries if self.selection_running else [0, N_POINTS]
+            self.selection_boundaries if self.selection_running else [0, self.n_points]
         )
 
         if x < boundaries[0]:
@@ -297,6 +304,12 @@ class PlotWidget(pg.PlotWidget, CustomWidget):
         self.overlay.setVisible(False)
         self.touch_start = None
 
+    def set_n_points(self, n_points):
+        """Adapts the plot to traces with a different number of points."""
+        self.n_points = n_points
+        self.crosshair.setPos(n_points / 2)
+        self.zero_line.setData([0, n_points - 1], [0, 0])
+
     @property
     def xmax(self):
         return len(self.last_plot_data[0]) - 1
@@ -322,14 +335,22 @@ class PlotWidget(pg.PlotWidget, CustomWidget):
             return
 
         if to_plot is not None and not self.touch_start:
-            to_plot = pickle.loads(to_plot)
-
-            if to_plot is None:
-                return
+            to_plot = decode_frame(to_plot)
 
             if not check_plot_data(self.parameters.lock.value, to_plot):
                 return
 
+            n_points = len(
+                to_plot["error_signal"]
+                if self.parameters.lock.value
+                else to_plot["error_signal_1"]
+            )
+            # if only a region of interest was recorded, it is plotted at its
+            # position in the full trace
+            self.x_offset, n_points = to_plot.get("roi", (0, n_points))
+            if n_points != self.n_points:
+                self.set_n_points(n_points)
+
             # we also call this if the laser is not locked because it resets
             # the history in this case
             history, slow_history = self.update_control_signal_history(to_plot)
@@ -379,7 +400,12 @@ class PlotWidget(pg.PlotWidget, CustomWidget):
                 self.last_plot_data = all_signals
 
                 self.plot_data_unlocked((s1, s2), combined_error_signal)
-                self.plot_autolock_target_line(combined_error_signal)
+                if "roi" in to_plot:
+                    self.plot_autolock_target_line(
+                        expand_roi(combined_error_signal, *to_plot["roi"])
+                    )
+                else:
+                    self.plot_autolock_target_line(combined_error_signal)
 
                 if "error_signal_1_quadrature" in to_plot:
                     self.signal_strength_a.setVisible(True)
@@ -448,6 +474,9 @@ class PlotWidget(pg.PlotWidget, CustomWidget):
 
                 self.update_plot_scaling(all_signals)
 
+            if "trace" in to_plot:
+                self.parameters.trace_frame(to_plot["trace"])
+
         time_end = time()
         time_diff = time_end - time_beginning
         new_rate_limit = 2 * time_diff
@@ -467,7 +496,7 @@ class PlotWidget(pg.PlotWidget, CustomWidget):
 
         r, g, b, *stuff = color
 
-        x = list(range(len(signal_strength)))
+        x = list(range(self.x_offset, self.x_offset + len(signal_strength)))
         signal_strength_scaled = signal_strength / V
         upper = (channel_offset / V) + signal_strength_scaled
         lower = (channel_offset / V) - 1 * signal_strength_scaled
@@ -482,11 +511,10 @@ class PlotWidget(pg.PlotWidget, CustomWidget):
 
     def plot_data_unlocked(self, error_signals, combined_signal):
         error_signal1, error_signal2 = error_signals
-        self.signal1.setData(list(range(len(error_signal1))), error_signal1 / V)
-        self.signal2.setData(list(range(len(error_signal2))), error_signal2 / V)
-        self.combined_signal.setData(
-            list(range(len(combined_signal))), combined_signal / V
-        )
+        x = list(range(self.x_offset, self.x_offset + len(combined_signal)))
+        self.signal1.setData(x[: len(error_signal1)], error_signal1 / V)
+        self.signal2.setData(x[: len(error_signal2)], error_signal2 / V)
+        self.combined_signal.setData(x, combined_signal / V)
 
     def plot_data_locked(self, signals):
         error_signal = signals["error_signal"]
@@ -556,7 +584,7 @@ class PlotWidget(pg.PlotWidget, CustomWidget):
             self.parameters.control_signal_history_length.value,
         )
         if self.parameters.lock.value:
-            x_axis_length = N_POINTS
+            x_axis_length = self.n_points
 
             def scale(arr):
                 timescale = self.parameters.control_signal_history_length.value
@@ -585,8 +613,8 @@ class PlotWidget(pg.PlotWidget, CustomWidget):
 
         # there are some glitches if the width of the overlay is exactly right.
         # Therefore we make it a little wider.
-        extra_width = N_POINTS / 100
-        x_axis_length = N_POINTS
+        extra_width = self.n_points / 100
+        x_axis_length = self.n_points
         boundary_width = (x_axis_length * (1 - selectable_width)) / 2.0
 
         self.selection_boundaries = (boundary_width, x_axis_length - boundary_width)
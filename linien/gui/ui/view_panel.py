@@ -1,10 +1,10 @@
 import json
 from linien.config import N_COLORS
-import pickle
 import numpy as np
 from os import path
 from PyQt5 import QtGui, QtWidgets
 
+from linien.frame_format import decode_frame
 from linien.gui.utils_gui import color_to_hex, param2ui
 from linien.gui.widgets import CustomWidget
 
@@ -130,7 +130,7 @@ class ViewPanel(QtGui.QWidget, CustomWidget):
 
         with open(fn_with_suffix, "w") as f:
             data = dict(self.parameters)
-            data["to_plot"] = pickle.loads(data["to_plot"])
+            data["to_plot"] = decode_frame(data["to_plot"])
 
             # filter out keys that are not json-able
             for k, v in list(data.items()):
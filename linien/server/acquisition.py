@@ -3,13 +3,16 @@ import sys
 sys.path += ["../../"]
 import rpyc
 import atexit
+import pickle
 import threading
 
 from enum import Enum
-from time import sleep
+from time import sleep, monotonic
 from multiprocessing import Process, Pipe
 
 from linien.config import ACQUISITION_PORT
+from linien.common import LatencyCounter
+from linien.server.frame_ring import FrameRing
 from linien.server.utils import stop_nginx, start_nginx, flash_fpga
 
 
@@ -21,25 +24,67 @@ class AcquisitionProcessSignals(Enum):
     SHUTDOWN = 0
     SET_RAMP_SPEED = 2
     SET_LOCK_STATUS = 3
-    SET_CSR = 4
-    SET_IIR_CSR = 5
-    CLEAR_DATA_CACHE = 6
+    SET_CSR_BATCH = 4
     FETCH_QUADRATURES = 7
+    SET_DECIMATION_MODE = 8
+    SET_AVERAGING = 9
+    SET_RECORD_BOTH_DIRECTIONS = 10
+    SET_TRACE_LENGTH = 11
+    SET_ROI = 12
+    SET_CHANNELS = 13
+    SET_STREAM_DECIMATION = 14
 
 
 class AcquisitionMaster:
-    def __init__(self, use_ssh, host):
+    def __init__(self, use_ssh, host, emulate=False):
         self.on_acquisition = None
+        self.emulate = emulate
+
+        # acquired data is not sent through the pipe. Instead, the acquisition
+        # process writes it to this ring buffer in shared memory and just sends
+        # the sequence number of the new frame.
+        self.frame_ring = FrameRing()
+
+        # measures the time between reading a frame from the FPGA and its
+        # arrival in the main thread
+        self.latency = LatencyCounter()
+        self.missed_sweeps_per_second = 0
+
+        def process_frame(frame, pipe_send_time):
+            frame.trace["pipe_send"] = pipe_send_time
+            frame.trace["data_received"] = monotonic()
+            self.latency.add(frame.trace["data_received"] - frame.timestamp)
+            self.missed_sweeps_per_second = frame.missed_sweeps_per_second
+
+            if self.on_acquisition is not None:
+                self.on_acquisition(frame)
 
         def receive_acquired_data(conn):
+            last_sequence = 0
             while True:
-                received_data, data_uuid = conn.recv()
-                if self.on_acquisition is not None:
-                    self.on_acquisition(received_data, data_uuid)
+                sequence, pipe_send_time = conn.recv()
+
+                # only the latest snapshot or sweep is interesting, but chunks
+                # of the stream have to be processed without gaps. Therefore,
+                # stream frames that were skipped are read from the ring as
+                # long as they weren't overwritten
+                for skipped in range(
+                    max(last_sequence + 1, sequence - self.frame_ring.n_slots + 1),
+                    sequence,
+                ):
+                    frame = self.frame_ring.read(skipped)
+                    if frame is not None and frame.streaming:
+                        process_frame(frame, pipe_send_time)
+                last_sequence = sequence
+
+                frame = self.frame_ring.read(sequence)
+                if frame is not None:
+                    process_frame(frame, pipe_send_time)
 
         self.acq_process, child_pipe = Pipe()
         p = Process(
-            target=self.connect_acquisition_process, args=(child_pipe, use_ssh, host)
+            target=self.connect_acquisition_process,
+            args=(child_pipe, self.frame_ring, use_ssh, host, emulate),
         )
         p.daemon = True
         p.start()
@@ -56,65 +101,102 @@ class AcquisitionMaster:
     def run_data_acquisition(self, on_acquisition):
         self.on_acquisition = on_acquisition
 
-    def connect_acquisition_process(self, pipe, use_ssh, host):
+    def connect_acquisition_process(self, pipe, frame_ring, use_ssh, host, emulate):
         if use_ssh:
             # for debugging, acquisition process may be launched manually on the
             # server and rpyc can be used to connect to it
             acquisition_rpyc = rpyc.connect(host, ACQUISITION_PORT)
             acquisition = acquisition_rpyc.root
+        elif emulate:
+            # no FPGA is involved, the acquisition process talks to an emulated
+            # Red Pitaya
+            from linien.server.acquisition_process import DataAcquisitionService
+
+            acquisition = DataAcquisitionService(frame_ring, emulate=True)
         else:
             # this is what happens in production mode
             from linien.server.acquisition_process import DataAcquisitionService
 
             stop_nginx()
             flash_fpga()
-            acquisition = DataAcquisitionService()
+            acquisition = DataAcquisitionService(frame_ring)
+
+        def wait_for_new_frame(last_sequence):
+            if use_ssh:
+                # the remote acquisition process has its own ring buffer and
+                # sends us the data. We copy it to our ring. As we can't wait
+                # for a notification over rpyc, we have to poll here. Note that
+                # only the latest frame is copied, i.e. chunks of the stream
+                # may be lost.
+                new_data_returned, _, new_data = acquisition.exposed_return_data(
+                    last_sequence
+                )
+                if not new_data_returned:
+                    sleep(0.01)
+                    return last_sequence
+                channels, header = pickle.loads(new_data)
+                # timestamps of the remote machine can't be compared to ours
+                header.pop("trigger_timestamp", None)
+                return frame_ring.write(channels, **header)
+
+            # acquisition process writes directly to our ring buffer and wakes
+            # us up as soon as a new frame is ready
+            return acquisition.wait_for_new_frame(last_sequence, timeout=1)
+
+        def forward_frames():
+            """Notifies the main thread about every new frame."""
+            last_sequence = 0
+            while True:
+                sequence = wait_for_new_frame(last_sequence)
+                if sequence != last_sequence:
+                    last_sequence = sequence
+                    pipe.send((sequence, monotonic()))
 
         # tell the main thread that we're ready
         pipe.send(True)
 
-        # run a loop that listens for acquired data and transmits them
-        # to the main thread. Also redirects calls from the main thread
-        # to the acquiry process.
-        last_hash = None
+        # run a thread that listens for acquired data and transmits them
+        # to the main thread.
+        t = threading.Thread(target=forward_frames)
+        t.daemon = True
+        t.start()
+
+        # redirect calls from the main thread to the acquiry process.
         while True:
-            # check whether the main thread sent a command to the acquiry process
-            while pipe.poll():
-                data = pipe.recv()
-                if data[0] == AcquisitionProcessSignals.SHUTDOWN:
-                    raise SystemExit()
-                elif data[0] == AcquisitionProcessSignals.SET_RAMP_SPEED:
-                    speed = data[1]
-                    acquisition.exposed_set_ramp_speed(speed)
-                elif data[0] == AcquisitionProcessSignals.SET_LOCK_STATUS:
-                    acquisition.exposed_set_lock_status(data[1])
-                elif data[0] == AcquisitionProcessSignals.FETCH_QUADRATURES:
-                    acquisition.exposed_set_fetch_quadratures(data[1])
-                elif data[0] == AcquisitionProcessSignals.SET_CSR:
-                    acquisition.exposed_set_csr(*data[1])
-                elif data[0] == AcquisitionProcessSignals.SET_IIR_CSR:
-                    acquisition.exposed_set_iir_csr(*data[1])
-                elif data[0] == AcquisitionProcessSignals.CLEAR_DATA_CACHE:
-                    acquisition.exposed_clear_data_cache(data[1])
-
-            # load acquired data and send it to the main thread
-            (
-                new_data_returned,
-                new_hash,
-                new_data,
-                data_uuid,
-            ) = acquisition.exposed_return_data(last_hash)
-            if new_data_returned:
-                last_hash = new_hash
-                pipe.send((new_data, data_uuid))
-
-            sleep(0.05)
+            data = pipe.recv()
+            if data[0] == AcquisitionProcessSignals.SHUTDOWN:
+                raise SystemExit()
+            elif data[0] == AcquisitionProcessSignals.SET_RAMP_SPEED:
+                speed = data[1]
+                acquisition.exposed_set_ramp_speed(speed)
+            elif data[0] == AcquisitionProcessSignals.SET_LOCK_STATUS:
+                acquisition.exposed_set_lock_status(data[1])
+            elif data[0] == AcquisitionProcessSignals.FETCH_QUADRATURES:
+                acquisition.exposed_set_fetch_quadratures(data[1])
+            elif data[0] == AcquisitionProcessSignals.SET_TRACE_LENGTH:
+                acquisition.exposed_set_trace_length(data[1])
+            elif data[0] == AcquisitionProcessSignals.SET_CHANNELS:
+                acquisition.exposed_set_channels(data[1])
+            elif data[0] == AcquisitionProcessSignals.SET_ROI:
+                acquisition.exposed_set_roi(data[1])
+            elif data[0] == AcquisitionProcessSignals.SET_DECIMATION_MODE:
+                acquisition.exposed_set_decimation_mode(data[1])
+            elif data[0] == AcquisitionProcessSignals.SET_AVERAGING:
+                acquisition.exposed_set_averaging(*data[1])
+            elif data[0] == AcquisitionProcessSignals.SET_RECORD_BOTH_DIRECTIONS:
+                acquisition.exposed_set_record_both_directions(data[1])
+            elif data[0] == AcquisitionProcessSignals.SET_STREAM_DECIMATION:
+                acquisition.exposed_set_stream_decimation(data[1])
+            elif data[0] == AcquisitionProcessSignals.SET_CSR_BATCH:
+                acquisition.exposed_set_csr_batch(*data[1])
 
     def shutdown(self):
         if self.acq_process:
             self.acq_process.send((AcquisitionProcessSignals.SHUTDOWN,))
 
-        start_nginx()
+        self.frame_ring.close()
+        if not self.emulate:
+            start_nginx()
 
     def set_ramp_speed(self, speed):
         self.acq_process.send((AcquisitionProcessSignals.SET_RAMP_SPEED, speed))
@@ -127,11 +209,41 @@ class AcquisitionMaster:
         if self.acq_process:
             self.acq_process.send((AcquisitionProcessSignals.FETCH_QUADRATURES, status))
 
-    def set_csr(self, key, value):
-        self.acq_process.send((AcquisitionProcessSignals.SET_CSR, (key, value)))
+    def trace_length_changed(self, length):
+        if self.acq_process:
+            self.acq_process.send((AcquisitionProcessSignals.SET_TRACE_LENGTH, length))
 
-    def set_iir_csr(self, *args):
-        self.acq_process.send((AcquisitionProcessSignals.SET_IIR_CSR, args))
+    def channels_changed(self, channels):
+        if self.acq_process:
+            self.acq_process.send((AcquisitionProcessSignals.SET_CHANNELS, channels))
 
-    def clear_data_cache(self, uuid):
-        self.acq_process.send((AcquisitionProcessSignals.CLEAR_DATA_CACHE, uuid))
+    def roi_changed(self, roi):
+        if self.acq_process:
+            self.acq_process.send((AcquisitionProcessSignals.SET_ROI, roi))
+
+    def decimation_mode_changed(self, mode):
+        if self.acq_process:
+            self.acq_process.send((AcquisitionProcessSignals.SET_DECIMATION_MODE, mode))
+
+    def averaging_changed(self, n_sweeps, reject_outliers):
+        if self.acq_process:
+            self.acq_process.send(
+                (AcquisitionProcessSignals.SET_AVERAGING, (n_sweeps, reject_outliers))
+            )
+
+    def record_both_sweep_directions_changed(self, status):
+        if self.acq_process:
+            self.acq_process.send(
+                (AcquisitionProcessSignals.SET_RECORD_BOTH_DIRECTIONS, status)
+            )
+
+    def stream_decimation_changed(self, decimation):
+        if self.acq_process:
+            self.acq_process.send(
+                (AcquisitionProcessSignals.SET_STREAM_DECIMATION, decimation)
+            )
+
+    def set_csr_batch(self, generation, csr, pulses):
+        self.acq_process.send(
+            (AcquisitionProcessSignals.SET_CSR_BATCH, (generation, csr, pulses))
+        )
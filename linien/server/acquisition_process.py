@@ -5,19 +5,41 @@ import _thread
 import numpy as np
 import threading
 from rpyc import Service
-from time import sleep
-from random import random
+from time import sleep, monotonic
 from rpyc.utils.server import OneShotServer
-from PyRedPitaya.board import RedPitaya
 
 sys.path += ["../../"]
 from csr import PythonCSR
 from linien.config import ACQUISITION_PORT
-from linien.common import DECIMATION, N_POINTS
+from linien.common import N_POINTS, MAX_TRACE_LENGTH, DECIMATION_MODE_MEAN, clip_roi
+from linien.server.decimation import decimate
+from linien.server.channels import (
+    CHANNEL_SIGNALS,
+    CHANNEL_QUADRATURES,
+    CHANNEL_SLOW,
+    CHANNEL_STREAM,
+)
+from linien.server.averaging import SweepAverager
+from linien.server.csr_queue import CSRQueue
+from linien.server.frame_ring import FrameRing
+from linien.server.scope_reader import ScopeReader
+from linien.server.stream_reader import StreamReader
+from linien.server.telemetry import read_peak_detectors
+from linien.server.trigger_timing import (
+    TriggerTimer,
+    get_both_directions_roi,
+    get_falling_part_offset,
+    get_sweep_period,
+    CLOCK_FREQUENCY,
+)
 
 
 # the maximum decimation supported by the FPGA image
 MAX_FPGA_DECIMATION = 65536
+# in locked state, snapshots of error and control signal are not synchronized
+# to a trigger. In order not to waste CPU time, we record them with this
+# interval (in seconds)
+LOCKED_FRAME_INTERVAL = 0.05
 
 
 def shutdown():
@@ -25,27 +47,42 @@ def shutdown():
     os._exit(0)
 
 
-def decimate(array, factor):
-    if factor == 1:
-        return array
-
-    dtype = array.dtype
-    return np.round(array.reshape(-1, factor).mean(axis=1)).astype(dtype)
+class DataAcquisitionService(Service):
+    def __init__(self, frame_ring=None, emulate=False):
+        if emulate:
+            from linien.server.emulator.virtual_pitaya import VirtualRedPitaya
 
+            self.r = VirtualRedPitaya()
+            self.scope_reader = ScopeReader(self.r.scope.memory_path, base_address=0)
+        else:
+            from PyRedPitaya.board import RedPitaya
 
-class DataAcquisitionService(Service):
-    def __init__(self):
-        self.r = RedPitaya()
+            self.r = RedPitaya()
+            self.scope_reader = ScopeReader()
         self.csr = PythonCSR(self.r)
-        self.csr_queue = []
-        self.csr_iir_queue = []
 
-        self.data = pickle.dumps(None)
-        self.data_hash = None
-        self.skip_next_data = 0
-        self.data_uuid = None
+        # CSR writes that were queued by the server but not yet applied
+        self.csr_queue = CSRQueue()
+
+        # acquired frames are written to a ring buffer in shared memory. If
+        # the acquisition process is started by the server, the server passes
+        # the ring it reads from. Otherwise (if the acquisition process is
+        # launched manually for debugging), we create our own one and transfer
+        # the frames using `exposed_return_data`.
+        self.frame_ring = frame_ring if frame_ring is not None else FrameRing()
+        # notified whenever a new frame was written to `frame_ring`
+        self.new_frame_available = threading.Condition()
         self.additional_decimation = 1
 
+        # every batch of CSR writes has a generation number.
+        # `applied_generation` is the last one that was written to the FPGA and
+        # `armed_generation` the one that was applied when the scope was armed.
+        # Every frame is tagged with `armed_generation`.
+        self.applied_generation = 0
+        self.armed_generation = 0
+        # knows when to expect the next scope trigger
+        self.trigger_timer = TriggerTimer()
+
         super(DataAcquisitionService, self).__init__()
 
         self.exposed_set_ramp_speed(9)
@@ -58,88 +95,335 @@ class DataAcquisitionService(Service):
         self.confirmed_that_in_lock = False
 
         self.fetch_quadratures = True
+        # the channels that are read. If the acquisition process is started by
+        # the server, only the channels somebody subscribed to are read.
+        self.channels = frozenset((CHANNEL_SIGNALS, CHANNEL_QUADRATURES, CHANNEL_SLOW))
+        # number of points per trace. `armed_trace_length` is the value that
+        # was used when the scope was armed
+        self.trace_length = N_POINTS
+        self.armed_trace_length = N_POINTS
+        # region of interest of the trace, see `Parameters.roi`. `armed_roi`
+        # is the `(start, length)` tuple that is used for the current recording
+        self.roi = None
+        self.armed_roi = (0, N_POINTS)
+        self.decimation_mode = DECIMATION_MODE_MEAN
+        # if configured, consecutive sweeps are averaged before they are
+        # published. Rising and falling parts of the sweep are averaged
+        # separately.
+        self.averagers = (SweepAverager(), SweepAverager())
+        # if set, the falling part of the sweep is recorded, too.
+        # `armed_falling_offset` is its offset in the current recording (or
+        # `None` if only the rising part is recorded)
+        self.record_both_directions = False
+        self.armed_falling_offset = None
+        # in locked state, error and control signal may be streamed without
+        # gaps if somebody subscribed to `CHANNEL_STREAM`. `armed_streaming`
+        # is set if the scope is currently configured for streaming.
+        self.stream_reader = StreamReader(self.scope_reader)
+        self.stream_decimation = 1024
+        self.armed_streaming = False
+        self.last_stream_snapshot = 0
 
         self.run()
 
-    def run(self, trigger_delay=16384):
+    def run(self):
         def run_acquiry_loop():
-            while True:
-                while self.csr_queue:
-                    key, value = self.csr_queue.pop(0)
-                    self.csr.set(key, value)
+            self.arm_scope()
 
-                while self.csr_iir_queue:
-                    args = self.csr_iir_queue.pop(0)
-                    self.csr.set_iir(*args)
+            while True:
+                if self.apply_csr_queue():
+                    # data that is recorded right now may have been recorded
+                    # (partially) with the old register values. Therefore, we
+                    # discard it by rearming the scope.
+                    if self.armed_streaming:
+                        # rearming would interrupt the stream. Samples recorded
+                        # from now on are tagged with the new generation.
+                        self.armed_generation = self.applied_generation
+                    else:
+                        self.arm_scope()
 
                 if self.locked and not self.confirmed_that_in_lock:
                     self.confirmed_that_in_lock = self.csr.get("logic_lock_running")
                     if not self.confirmed_that_in_lock:
-                        sleep(0.05)
+                        sleep(self.trigger_timer.poll_interval)
                         continue
-
-                # copied from https://github.com/RedPitaya/RedPitaya/blob/14cca62dd58f29826ee89f4b28901602f5cdb1d8/api/src/oscilloscope.c#L115
-                # check whether scope was triggered
-                if (self.r.scope.read(0x1 << 2) & 0x4) > 0 and not self.locked:
-                    sleep(0.05)
+                    # the peak detectors contain values of the sweep
+                    read_peak_detectors(self.csr)
+
+                if self.armed_streaming != self.should_stream() or (
+                    self.armed_streaming
+                    and self.stream_reader.decimation != self.stream_decimation
+                ):
+                    self.arm_scope()
+
+                if self.armed_streaming:
+                    self.read_stream()
+                    sleep(self.stream_reader.poll_interval)
                     continue
 
-                data = self.read_data()
-
-                slow_out = self.csr.get("logic_slow_value")
-                slow_out = slow_out if slow_out <= 8191 else slow_out - 16384
-                data += [slow_out]
-
-                # trigger_source=6 means external trigger positive edge
-                self.r.scope.rearm(trigger_source=6)
-
                 if not self.locked:
-                    # we use decimation of the FPGA scope for two reasons:
-                    # - we want to record at lower scan rates
-                    # - we want to record less data points than 16384 data points.
-                    #   We could do this by additionally averaging in software, but
-                    #   this turned out to be too slow on the RP. Therefore, we
-                    #   let the FPGA do this.
-                    # With high values of DECIMATION and low scan rates, the required
-                    # decimation value exceeds the maximum value supported by the FPGA
-                    # image. Therefore, we perform additional software averaging in
-                    # these cases. As this happens for slow ramps only, the performance
-                    # hit doesn't matter.
-                    target_decimation = 2 ** (
-                        self.ramp_speed + int(np.log2(DECIMATION))
-                    )
-                    if target_decimation > MAX_FPGA_DECIMATION:
-                        self.additional_decimation = int(
-                            target_decimation / MAX_FPGA_DECIMATION
-                        )
-                        target_decimation = MAX_FPGA_DECIMATION
-                    else:
-                        self.additional_decimation = 1
+                    # copied from https://github.com/RedPitaya/RedPitaya/blob/14cca62dd58f29826ee89f4b28901602f5cdb1d8/api/src/oscilloscope.c#L115
+                    # check whether scope was triggered
+                    if (self.r.scope.read(0x1 << 2) & 0x4) > 0:
+                        # sleep until shortly before the recording is expected
+                        # to be finished
+                        sleep(self.trigger_timer.get_sleep_time())
+                        continue
 
-                    self.r.scope.data_decimation = target_decimation
-                    self.r.scope.trigger_delay = (
-                        int(trigger_delay / DECIMATION * self.additional_decimation) - 1
+                    self.trigger_timer.triggered()
+
+                # in locked state, there is no trigger and the frame starts with
+                # reading the scope
+                trigger_timestamp = monotonic()
+                traces = self.read_data()
+
+                slow_out = self.read_slow_value()
+                telemetry = self.read_telemetry()
+
+                generation = self.armed_generation
+                roi_start = self.armed_roi[0]
+                trace_length = self.armed_trace_length
+                self.arm_scope()
+
+                for sweep_down, data in traces:
+                    if sweep_down:
+                        # the falling part of the sweep is recorded backwards
+                        data = [channel[::-1] for channel in data]
+
+                    n_sweeps = 1
+                    averager = self.averagers[sweep_down]
+                    if not self.locked and averager.n_sweeps > 1 and data:
+                        data = averager.add(data, generation)
+                        if data is None:
+                            # average is not complete yet
+                            continue
+                        n_sweeps = averager.n_averaged
+
+                    self.frame_ring.write(
+                        data,
+                        generation=generation,
+                        locked=self.locked,
+                        n_sweeps=n_sweeps,
+                        sweep_down=sweep_down,
+                        roi_start=roi_start,
+                        trace_length=trace_length,
+                        slow_value=slow_out,
+                        missed_sweeps_per_second=(
+                            self.trigger_timer.missed_sweeps_per_second
+                        ),
+                        trigger_timestamp=trigger_timestamp,
+                        **telemetry,
                     )
-                else:
-                    self.r.scope.data_decimation = 1
-                    self.additional_decimation = 1
-                    self.r.scope.trigger_delay = int(trigger_delay / DECIMATION) - 1
+                    with self.new_frame_available:
+                        self.new_frame_available.notify_all()
 
-                if self.skip_next_data:
-                    self.skip_next_data -= 1
-                else:
-                    self.data = pickle.dumps(data)
-                    self.data_hash = random()
+                if self.locked:
+                    sleep(LOCKED_FRAME_INTERVAL)
 
         self.t = threading.Thread(target=run_acquiry_loop, args=())
         self.t.daemon = True
         self.t.start()
 
-    def exposed_return_data(self, hash_):
-        if hash_ == self.data_hash or self.data_hash is None:
-            return False, None, None, None
+    def apply_csr_queue(self):
+        """Writes queued CSR values to the FPGA. Returns `True` if a new
+        generation of register values was applied."""
+        batches, generation = self.csr_queue.pop()
+
+        for csr, pulses in batches:
+            for key, value in csr.items():
+                self.csr.set(key, value)
+
+            for key, value in pulses:
+                # set the register to `value` for a short time and then restore
+                # it
+                previous_value = self.csr.shadow.get(key)
+                self.csr.set(key, value)
+                if previous_value is not None:
+                    self.csr.set(key, previous_value)
+
+        if generation != self.applied_generation:
+            self.applied_generation = generation
+            return True
+
+        return False
+
+    def should_stream(self):
+        return (
+            self.locked
+            and self.confirmed_that_in_lock
+            and CHANNEL_STREAM in self.channels
+        )
+
+    def arm_scope(self, trigger_delay=16384):
+        self.armed_streaming = self.should_stream()
+        if self.armed_streaming:
+            self.arm_scope_for_streaming()
+            return
+
+        # trigger_source=6 means external trigger positive edge, i.e. the
+        # beginning of the rising part of the sweep
+        self.r.scope.rearm(trigger_source=6)
+        self.trigger_timer.armed()
+        self.armed_generation = self.applied_generation
+        self.armed_trace_length = self.trace_length
+        decimation = MAX_TRACE_LENGTH // self.armed_trace_length
+        # the region of interest only makes sense for sweeps
+        self.armed_roi = clip_roi(
+            None if self.locked else self.roi, self.armed_trace_length
+        )
+        self.armed_falling_offset = None
+
+        if not self.locked:
+            # we use decimation of the FPGA scope for two reasons:
+            # - we want to record at lower scan rates
+            # - we want to record less data points than 16384 data points.
+            #   We could do this by additionally averaging in software, but
+            #   this turned out to be too slow on the RP. Therefore, we
+            #   let the FPGA do this.
+            # With high values of decimation and low scan rates, the required
+            # decimation value exceeds the maximum value supported by the FPGA
+            # image. Therefore, we perform additional software averaging in
+            # these cases. As this happens for slow ramps only, the performance
+            # hit doesn't matter.
+            target_decimation = 2 ** (self.ramp_speed + int(np.log2(decimation)))
+            if target_decimation > MAX_FPGA_DECIMATION:
+                self.additional_decimation = int(
+                    target_decimation / MAX_FPGA_DECIMATION
+                )
+                target_decimation = MAX_FPGA_DECIMATION
+            else:
+                self.additional_decimation = 1
+
+            n_samples = int(trigger_delay / decimation * self.additional_decimation)
+
+            if self.record_both_directions:
+                # the falling part of the sweep is read from the same recording
+                # as the rising part: after rearming, the scope wouldn't be
+                # ready in time for the turning point. This is only possible
+                # if both parts fit into the scope's buffer.
+                roi_start, roi_length = get_both_directions_roi(
+                    self.armed_roi, self.armed_trace_length
+                )
+                start = roi_start * self.additional_decimation
+                length = roi_length * self.additional_decimation
+                self.armed_falling_offset = get_falling_part_offset(
+                    self.ramp_speed, target_decimation, start, start + length
+                )
+                if self.armed_falling_offset is not None:
+                    self.armed_roi = (roi_start, roi_length)
+                    n_samples = self.armed_falling_offset + length
+
+            self.r.scope.data_decimation = target_decimation
+            self.r.scope.trigger_delay = n_samples - 1
+            self.trigger_timer.set_sweep(
+                get_sweep_period(self.ramp_speed),
+                n_samples * target_decimation / CLOCK_FREQUENCY,
+            )
         else:
-            return True, self.data_hash, self.data, self.data_uuid
+            self.r.scope.data_decimation = 1
+            self.additional_decimation = 1
+            self.r.scope.trigger_delay = int(trigger_delay / decimation) - 1
+
+    def arm_scope_for_streaming(self):
+        # trigger_source=0 means that the scope is never triggered, i.e. it
+        # keeps writing to its buffer which is thereby used as a ring buffer
+        self.additional_decimation = 1
+        self.armed_falling_offset = None
+        self.r.scope.data_decimation = self.stream_decimation
+        self.r.scope.rearm(trigger_source=0)
+        self.armed_generation = self.applied_generation
+        self.armed_trace_length = self.trace_length
+        self.armed_roi = (0, self.armed_trace_length)
+        self.stream_reader.start(
+            self.r.scope.write_pointer_current, self.stream_decimation
+        )
+
+    def read_stream(self):
+        """Reads the samples that were recorded since the last call and writes
+        them to the frame ring. Additionally, snapshots of the latest samples
+        are published like in non-streaming locked mode."""
+        now = monotonic()
+        write_pointer = self.r.scope.write_pointer_current
+
+        chunk = self.stream_reader.read(write_pointer)
+        if chunk is not None:
+            position, data = chunk
+            self.write_frame(
+                data,
+                streaming=True,
+                stream_position=position,
+                stream_decimation=self.stream_reader.decimation,
+                stream_overruns=self.stream_reader.n_overruns,
+                trigger_timestamp=now,
+            )
+
+        if (
+            CHANNEL_SIGNALS in self.channels
+            and now - self.last_stream_snapshot >= LOCKED_FRAME_INTERVAL
+        ):
+            self.last_stream_snapshot = now
+            data = self.stream_reader.read_latest(
+                write_pointer, self.armed_trace_length
+            )
+            self.write_frame(
+                data,
+                trace_length=self.armed_trace_length,
+                slow_value=self.read_slow_value(),
+                trigger_timestamp=now,
+                **self.read_telemetry(),
+            )
+
+    def read_slow_value(self):
+        if CHANNEL_SLOW not in self.channels:
+            return 0
+        slow_out = self.csr.get("logic_slow_value")
+        return slow_out if slow_out <= 8191 else slow_out - 16384
+
+    def read_telemetry(self):
+        """Reads the peak values of control and error signal since the last
+        call and returns them as frame header fields."""
+        if not self.locked:
+            return {}
+        return dict(telemetry=True, **read_peak_detectors(self.csr))
+
+    def write_frame(self, data, **header_fields):
+        """Writes a frame recorded in locked state and notifies the server."""
+        self.frame_ring.write(
+            data,
+            generation=self.armed_generation,
+            locked=self.locked,
+            n_sweeps=1,
+            **header_fields,
+        )
+        with self.new_frame_available:
+            self.new_frame_available.notify_all()
+
+    def wait_for_new_frame(self, last_sequence, timeout=None):
+        """Blocks until a frame newer than `last_sequence` is available (or
+        `timeout` is reached) and returns the latest sequence number."""
+        with self.new_frame_available:
+            self.new_frame_available.wait_for(
+                lambda: self.frame_ring.last_sequence != last_sequence, timeout
+            )
+        return self.frame_ring.last_sequence
+
+    def exposed_return_data(self, last_sequence):
+        """Returns the latest frame if it is newer than `last_sequence`. This
+        is only used if the acquisition process runs standalone; otherwise the
+        server reads the frames directly from the shared `frame_ring`."""
+        sequence = self.frame_ring.last_sequence
+        if sequence == last_sequence or sequence == 0:
+            return False, None, None
+
+        frame = self.frame_ring.read(sequence)
+        if frame is None:
+            return False, None, None
+
+        data = ([channel.copy() for channel in frame.channels], frame.get_header())
+        if not frame.is_valid():
+            return False, None, None
+
+        return True, sequence, pickle.dumps(data)
 
     def exposed_set_ramp_speed(self, speed):
         self.ramp_speed = speed
@@ -147,75 +431,96 @@ class DataAcquisitionService(Service):
     def exposed_set_lock_status(self, locked):
         self.locked = locked
         self.confirmed_that_in_lock = False
+        # the sweep is restarted after the lock is turned off
+        self.trigger_timer.reset()
+        for averager in self.averagers:
+            averager.reset()
 
     def exposed_set_fetch_quadratures(self, fetch):
         self.fetch_quadratures = fetch
 
-    def exposed_set_csr(self, key, value):
-        self.csr_queue.append((key, value))
+    def exposed_set_channels(self, channels):
+        self.channels = channels
 
-    def exposed_set_iir_csr(self, *args):
-        self.csr_iir_queue.append(args)
+    def exposed_set_trace_length(self, length):
+        # the scope's decimation has to be a power of 2
+        decimation = MAX_TRACE_LENGTH / length
+        self.trace_length = MAX_TRACE_LENGTH // 2 ** max(round(np.log2(decimation)), 0)
 
-    def exposed_clear_data_cache(self, uuid):
-        self.skip_next_data = 2
-        self.data_hash = None
-        self.data = None
-        self.data_uuid = uuid
+    def exposed_set_stream_decimation(self, decimation):
+        # the scope's decimation has to be a power of 2
+        self.stream_decimation = 2 ** max(round(np.log2(decimation)), 0)
 
-    def read_data(self):
-        channel_offsets = [0x10000]
-        if self.fetch_quadratures:
-            channel_offsets.append(0x20000)
+    def exposed_set_roi(self, roi):
+        self.roi = roi
 
-        write_pointer = self.r.scope.write_pointer_trigger
+    def exposed_set_decimation_mode(self, mode):
+        self.decimation_mode = mode
 
-        def get_data(offset, addr, data_length):
-            max_data_length = 16383
-            if data_length + addr > max_data_length:
-                to_read_later = data_length + addr - max_data_length
-                data_length -= to_read_later
-            else:
-                to_read_later = 0
-
-            # raw data contains two signals:
-            #   2'h0,adc_b_rd,2'h0,adc_a_rd
-            #   i.e.: 2 zero bits, channel b (14 bit), 2 zero bits, channel a (14 bit)
-            # .copy() is required, because np.frombuffer returns a readonly array
-            raw_data = self.r.scope.reads(offset + (4 * addr), data_length).copy()
-
-            # raw_data is an array of 32-bit ints
-            # we cast it to 16 bit --> each original int is split into two ints
-            raw_data.dtype = np.int16
+    def exposed_set_averaging(self, n_sweeps, reject_outliers):
+        for averager in self.averagers:
+            averager.configure(n_sweeps, reject_outliers)
 
-            # sign bit is at position 14, but we have 16 bit ints
-            raw_data[raw_data >= 2 ** 13] -= 2 ** 14
-
-            # order is such that we have first the signal a then signal b
-            signals = tuple(raw_data[signal_idx::2] for signal_idx in (0, 1))
-
-            if to_read_later > 0:
-                additional_raw_data = get_data(offset, 0, to_read_later)
-                signals = tuple(
-                    np.append(signals[signal_idx], additional_raw_data[signal_idx])
-                    for signal_idx in range(2)
-                )
+    def exposed_set_record_both_directions(self, record_both_directions):
+        self.record_both_directions = record_both_directions
 
-            return signals
+    def exposed_set_csr_batch(self, generation, csr, pulses):
+        """Queues a batch of CSR writes. Frames that are recorded after the
+        batch was written are tagged with `generation`.
 
-        rv = []
+        `csr` is a dict mapping register names to values and `pulses` a list of
+        `(register, value)` tuples: these registers are set to `value` for a
+        short time before they are restored to their previous value."""
+        self.csr_queue.put(generation, csr, pulses)
 
-        for channel_offset in channel_offsets:
-            channel_data = get_data(
-                channel_offset, write_pointer, N_POINTS * self.additional_decimation
-            )
+    def read_data(self):
+        """Reads the region of interest of the recorded traces. Returns a list of
+        `(sweep_down, data)` tuples: one for the rising part of the sweep and,
+        if it was recorded, one for the falling part."""
+        buffer_idxs = []
+        if CHANNEL_SIGNALS in self.channels:
+            buffer_idxs.append(0)
+            # quadratures are zero in locked state
+            if (
+                CHANNEL_QUADRATURES in self.channels
+                and self.fetch_quadratures
+                and not self.locked
+            ):
+                buffer_idxs.append(1)
+
+        # only the region of interest is read. `offsets` are the positions of
+        # the parts of the sweep relative to the trigger
+        roi_start, roi_length = self.armed_roi
+        length = roi_length * self.additional_decimation
+        offsets = [roi_start * self.additional_decimation]
+        if self.armed_falling_offset is not None:
+            # the falling part is time-reversed later
+            offsets.append(self.armed_falling_offset)
+
+        # both parts are read at once: `ScopeReader.read` returns views that
+        # are only valid until the next call
+        start = self.r.scope.write_pointer_trigger + offsets[0]
+        total_length = offsets[-1] - offsets[0] + length
+
+        parts = [[] for offset in offsets]
+
+        for buffer_idx in buffer_idxs:
+            channel_data = self.scope_reader.read(buffer_idx, start, total_length)
 
             for sub_channel_idx in range(2):
-                rv.append(
-                    decimate(channel_data[sub_channel_idx], self.additional_decimation)
-                )
+                for part, offset in zip(parts, offsets):
+                    part_start = offset - offsets[0]
+                    part.append(
+                        decimate(
+                            channel_data[sub_channel_idx][
+                                part_start : part_start + length
+                            ],
+                            self.additional_decimation,
+                            self.decimation_mode,
+                        )
+                    )
 
-        return rv
+        return list(zip((False, True), parts))
 
 
 if __name__ == "__main__":
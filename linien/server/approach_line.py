@@ -110,6 +110,19 @@ class Approacher:
         self.last_shifts_at_this_zoom = self.last_shifts_at_this_zoom or []
         self.last_shifts_at_this_zoom.append(shift)
 
+    def get_roi(self):
+        """Returns the region of interest around the target line at the current
+        zoom or `None` if the full trace is needed (see `Parameters.roi`)."""
+        trace_length = self.parameters.trace_length.value
+        # the target line spans at most this number of points of the trace
+        line_width = trace_length * self.zoom_factor / self.target_zoom
+        # when zooming in, the line is centered up to an eighth of the trace
+        # (see `is_close_to_target`). The margin allows for drift.
+        length = int(trace_length / 2 + 2 * line_width)
+        if length >= trace_length:
+            return None
+        return (trace_length - length) // 2, length
+
     def _decrease_scan_range(self):
         self.N_at_this_zoom = 0
         self.last_shifts_at_this_zoom = None
@@ -119,6 +132,11 @@ class Approacher:
 
         self.control.pause_acquisition()
 
+        # only the region around the line is read, starting with the first
+        # sweep of the new scan range
+        roi = self.get_roi()
+        if roi != self.parameters.roi.value:
+            self.parameters.roi.value = roi
         self.parameters.ramp_amplitude.value /= ZOOM_STEP
         if self.allow_ramp_speed_change:
             new_ramp_speed = (
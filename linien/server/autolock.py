@@ -1,14 +1,16 @@
-import pickle
 import traceback
 import numpy as np
 from linien.common import (
     get_lock_point,
     combine_error_signal,
     check_plot_data,
+    expand_roi,
     ANALOG_OUT0,
     SpectrumUncorrelatedException,
 )
+from linien.frame_format import decode_frame
 from linien.server.approach_line import Approacher
+from linien.server.channels import CHANNEL_SIGNALS, CHANNEL_SLOW
 
 
 class Autolock:
@@ -25,6 +27,7 @@ class Autolock:
         self.should_watch_lock = False
         self.approacher = None
         self._data_listener_added = False
+        self._telemetry_listener_added = False
 
         self.reset_properties()
 
@@ -56,6 +59,10 @@ class Autolock:
         """
         self.parameters.autolock_running.value = True
         self.parameters.fetch_quadratures.value = False
+        # the slow value is needed for checking whether the lock was successful
+        self.parameters.channel_subscriptions.subscribe(
+            self, (CHANNEL_SIGNALS, CHANNEL_SLOW)
+        )
         self.x0, self.x1 = int(x0), int(x1)
         self.should_watch_lock = should_watch_lock
         self.auto_offset = auto_offset
@@ -102,9 +109,7 @@ class Autolock:
         if plot_data is None or not self.parameters.autolock_running.value:
             return
 
-        plot_data = pickle.loads(plot_data)
-        if plot_data is None:
-            return
+        plot_data = decode_frame(plot_data)
 
         is_locked = self.parameters.lock.value
 
@@ -123,6 +128,12 @@ class Autolock:
                 self.parameters.channel_mixing.value,
                 self.parameters.combined_offset.value,
             )
+            if "roi" in plot_data:
+                # points outside of the region of interest are nan and are
+                # ignored by the approacher
+                combined_error_signal = expand_roi(
+                    combined_error_signal, *plot_data["roi"]
+                )
 
         try:
             if self.parameters.autolock_approaching.value:
@@ -177,7 +188,12 @@ class Autolock:
             target_slope_rising,
             target_zoom,
             rolled_error_signal,
-        ) = get_lock_point(error_signal, self.x0, self.x1)
+        ) = get_lock_point(
+            error_signal,
+            self.x0,
+            self.x1,
+            trace_length=self.parameters.trace_length.value,
+        )
 
         self.central_y = mean_signal
 
@@ -208,7 +224,7 @@ class Autolock:
             slow_pid = self.parameters.pid_on_slow_enabled.value
 
             if not slow_ramp and not slow_pid:
-                mean = np.mean(control_signal) / 8192
+                mean, _ = self.get_control_signal_level(control_signal)
                 return (center - ampl) <= mean <= (center + ampl)
             else:
                 if slow_pid and not slow_ramp:
@@ -226,8 +242,15 @@ class Autolock:
         if self.parameters.autolock_locked.value and self.should_watch_lock:
             # we start watching the lock status from now on.
             # this is done in `react_to_new_spectrum()` which is called regularly.
-            self.watcher_last_value = np.mean(control_signal) / 8192
+            self.watcher_last_value, _ = self.get_control_signal_level(control_signal)
             self.parameters.autolock_watching.value = True
+
+            if self.parameters.autolock_use_telemetry.value:
+                # watching the lock only requires the telemetry, i.e. traces
+                # don't have to be fetched anymore
+                self.remove_data_listener()
+                self.parameters.channel_subscriptions.unsubscribe(self)
+                self.add_telemetry_listener()
         else:
             self.remove_data_listener()
 
@@ -240,14 +263,53 @@ class Autolock:
 
             self.parameters.autolock_running.value = False
 
+    def get_control_signal_level(self, control_signal):
+        """Returns the mean of the control signal and its maximum absolute
+        value (both in V).
+
+        If `autolock_use_telemetry` is set, they are determined from the peak
+        values in `lock_telemetry`. In this case, short excursions are taken
+        into account that are likely to be missed by the traces."""
+        telemetry = self.parameters.lock_telemetry.value
+        if self.parameters.autolock_use_telemetry.value and telemetry is not None:
+            minimum, maximum = telemetry["control_signal"]
+            return (minimum + maximum) / 2, max(abs(minimum), abs(maximum))
+
+        mean = np.mean(control_signal) / 8192
+        return mean, np.abs(mean)
+
+    def add_telemetry_listener(self):
+        if not self._telemetry_listener_added:
+            self._telemetry_listener_added = True
+            self.parameters.lock_telemetry.on_change(self.react_to_new_telemetry)
+
+    def remove_telemetry_listener(self):
+        self._telemetry_listener_added = False
+        self.parameters.lock_telemetry.remove_listener(self.react_to_new_telemetry)
+
+    def react_to_new_telemetry(self, telemetry):
+        """Watches the lock using the telemetry only, see
+        `autolock_use_telemetry`."""
+        if (
+            self.parameters.pause_acquisition.value
+            or not self.parameters.autolock_watching.value
+        ):
+            return
+
+        try:
+            self.watch_lock(None, None)
+        except Exception:
+            traceback.print_exc()
+            self.exposed_stop()
+
     def watch_lock(self, error_signal, control_signal):
         """Check whether the laser is still in lock and init a relock if not."""
-        mean = np.mean(control_signal) / 8192
+        mean, peak = self.get_control_signal_level(control_signal)
 
         diff = np.abs(mean - self.watcher_last_value)
         lock_lost = diff > self.parameters.watch_lock_threshold.value
 
-        too_close_to_edge = np.abs(mean) > 0.95
+        too_close_to_edge = peak > 0.95
 
         if too_close_to_edge or lock_lost:
             self.relock()
@@ -274,6 +336,10 @@ class Autolock:
 
         # add a listener that listens for new spectrum data and consequently
         # tries to relock.
+        self.remove_telemetry_listener()
+        self.parameters.channel_subscriptions.subscribe(
+            self, (CHANNEL_SIGNALS, CHANNEL_SLOW)
+        )
         self.add_data_listener()
 
     def exposed_stop(self):
@@ -283,7 +349,9 @@ class Autolock:
         self.parameters.autolock_approaching.value = False
         self.parameters.autolock_watching.value = False
         self.parameters.fetch_quadratures.value = True
+        self.parameters.channel_subscriptions.unsubscribe(self)
         self.remove_data_listener()
+        self.remove_telemetry_listener()
 
         self._reset_scan()
         self.parameters.task.value = None
@@ -295,6 +363,7 @@ class Autolock:
         # therefore, we can reset it here
         self.parameters.ramp_speed.value = self.initial_ramp_speed
         self.parameters.autolock_approaching.value = False
+        self._reset_roi()
 
         if self.auto_offset:
             # note: we only set the offset directly before turning on the lock
@@ -305,9 +374,15 @@ class Autolock:
 
         self.control.continue_acquisition()
 
+    def _reset_roi(self):
+        # the approacher reads only the region around the line
+        if self.parameters.roi.value is not None:
+            self.parameters.roi.value = None
+
     def _reset_scan(self):
         self.control.pause_acquisition()
 
+        self._reset_roi()
         self.parameters.center.value = self.initial_ramp_center
         self.parameters.ramp_amplitude.value = (
             self.parameters.autolock_initial_ramp_amplitude.value
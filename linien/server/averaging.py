@@ -0,0 +1,105 @@
+import threading
+
+import numpy as np
+
+# if outlier rejection is enabled, a sweep is rejected if its mean absolute
+# deviation from the median sweep is larger than this factor times the median
+# of the deviations of all sweeps
+OUTLIER_THRESHOLD = 3
+# maximum number of sweeps per average. With outlier rejection, all of them are
+# kept in memory and finding the outliers temporarily needs about 50 MB for 4
+# channels of 16384 points
+MAX_AVERAGING_SWEEPS = 64
+
+
+class SweepAverager:
+    """Averages consecutive sweeps recorded by the acquisition process.
+
+    Sweeps are summed up in an int32 accumulator. After `n_sweeps` sweeps were
+    added, `add` returns the averaged channels and a new average is started.
+
+    If `reject_outliers` is set, the sweeps are kept until the average is
+    complete. Then, glitched sweeps that deviate strongly from the median are
+    left out.
+
+    `configure` and `reset` may be called from another thread than `add`."""
+
+    def __init__(self, n_sweeps=1, reject_outliers=False):
+        self.n_sweeps = n_sweeps
+        self.reject_outliers = reject_outliers
+        # how many sweeps were used for the last complete average
+        self.n_averaged = 0
+        self._lock = threading.Lock()
+        self._reset()
+
+    def reset(self):
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        self.generation = None
+        self.count = 0
+        self.n_rejected = 0
+        self._accumulator = None
+        self._sweeps = []
+
+    def configure(self, n_sweeps, reject_outliers):
+        with self._lock:
+            if n_sweeps != self.n_sweeps or reject_outliers != self.reject_outliers:
+                self.n_sweeps = n_sweeps
+                self.reject_outliers = reject_outliers
+                self._reset()
+
+    def add(self, channels, generation=None):
+        """Adds a sweep. `channels` is a list of integer arrays of equal length.
+        Sweeps recorded with different register values (`generation`) are not
+        mixed.
+
+        Returns a list containing the averaged channels as int32 arrays if the
+        average is complete or `None` otherwise."""
+        with self._lock:
+            return self._add(channels, generation)
+
+    def _add(self, channels, generation):
+        shape = (len(channels), len(channels[0]))
+        if (
+            generation != self.generation
+            or self._accumulator is None
+            or self._accumulator.shape != shape
+        ):
+            self._reset()
+            self.generation = generation
+            self._accumulator = np.zeros(shape, dtype=np.int32)
+
+        if self.reject_outliers:
+            self._sweeps.append(np.array(channels, dtype=np.int16))
+        else:
+            for channel_idx, channel in enumerate(channels):
+                self._accumulator[channel_idx] += channel
+        self.count += 1
+
+        if self.count < self.n_sweeps:
+            return None
+
+        if self.reject_outliers:
+            self._accumulate_without_outliers()
+
+        self.n_averaged = self.count - self.n_rejected
+        averaged = self._accumulator
+        averaged += self.n_averaged // 2
+        averaged //= self.n_averaged
+
+        self._reset()
+        return list(averaged)
+
+    def _accumulate_without_outliers(self):
+        sweeps = np.array(self._sweeps)
+        median = np.median(sweeps, axis=0)
+        deviations = np.abs(sweeps - median).mean(axis=(1, 2))
+        threshold = OUTLIER_THRESHOLD * np.median(deviations)
+
+        for sweep, deviation in zip(sweeps, deviations):
+            if deviation > threshold:
+                self.n_rejected += 1
+            else:
+                self._accumulator += sweep
@@ -0,0 +1,68 @@
+# channels that may be fetched by the acquisition process:
+# the demodulated error signals (or error and control signal if locked)
+CHANNEL_SIGNALS = "signals"
+# the quadratures of the demodulated error signals
+CHANNEL_QUADRATURES = "quadratures"
+# the output of the slow PID
+CHANNEL_SLOW = "slow"
+# gapless stream of error and control signal (only in locked state)
+CHANNEL_STREAM = "stream"
+
+# channels that are always fetched, such that `to_plot` is up to date even for
+# clients that read it without listening to it (e.g. scripts)
+DEFAULT_CHANNELS = (CHANNEL_SIGNALS,)
+
+# channels that are required by remote listeners of these parameters
+PARAMETER_CHANNELS = {
+    "to_plot": (CHANNEL_SIGNALS, CHANNEL_QUADRATURES),
+    "control_signal_history": (CHANNEL_SIGNALS, CHANNEL_SLOW),
+    "stream_data": (CHANNEL_STREAM,),
+}
+
+
+class ChannelSubscriptions:
+    """Keeps track of which channels are needed by whom.
+
+    Every subscriber (e.g. a client connection, the autolock or the
+    optimization) declares the channels it needs. The union of all channels is
+    written to `parameter` such that the acquisition process only fetches
+    channels that are actually used. `default_channels` are always fetched."""
+
+    def __init__(self, parameter, default_channels=DEFAULT_CHANNELS):
+        self.parameter = parameter
+        self.default_channels = frozenset(default_channels)
+        self._subscriptions = {}
+        self._update()
+
+    def subscribe(self, subscriber, channels):
+        """Adds `channels` to the channels needed by `subscriber`."""
+        self._subscriptions.setdefault(subscriber, set()).update(channels)
+        self._update()
+
+    def set_channels(self, subscriber, channels):
+        """Replaces the channels needed by `subscriber` with `channels`."""
+        self._subscriptions[subscriber] = set(channels)
+        self._update()
+
+    def subscribe_to_parameter(self, subscriber, param_name):
+        """Subscribes the channels that are required for listening to the
+        parameter `param_name`."""
+        channels = PARAMETER_CHANNELS.get(param_name)
+        if channels:
+            self.subscribe(subscriber, channels)
+
+    def unsubscribe(self, subscriber):
+        """Removes all subscriptions of `subscriber`."""
+        self._subscriptions.pop(subscriber, None)
+        self._update()
+
+    def get_channels(self):
+        channels = set(self.default_channels)
+        for subscribed in self._subscriptions.values():
+            channels |= subscribed
+        return frozenset(channels)
+
+    def _update(self):
+        channels = self.get_channels()
+        if channels != self.parameter.value:
+            self.parameter.value = channels
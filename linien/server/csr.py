@@ -16,15 +16,35 @@
 # along with redpid.  If not, see <http://www.gnu.org/licenses/>.
 
 
+from functools import lru_cache
+
 import csrmap
 from iir_coeffs import get_params, make_filter
 
 
+@lru_cache(maxsize=256)
+def compile_filter(filter_type, f, shift, width, interval=1):
+    """Designs a filter using `make_filter` and quantizes its coefficients.
+
+    Designing a filter involves a stability check that is rather slow. As the
+    same filters are requested over and over again, the result is cached.
+    Returns the order of the filter and a tuple of `(coefficient, value)`
+    pairs."""
+    b, a = make_filter(filter_type, f=f, k=1)
+    b, a, params = get_params(b, a, shift, width, interval)
+    return len(b), tuple(sorted(params.items()))
+
+
 class PitayaCSR:
     map = csrmap.csr
     constants = csrmap.csr_constants
     offset = 0x40300000
 
+    def __init__(self):
+        # shadow copy of the values written to the writable CSRs. It is used
+        # for only writing the bytes that actually changed.
+        self.shadow = {}
+
     def set(self, name, value):
         map, addr, width, wr = self.map[name]
         assert wr, name
@@ -37,11 +57,24 @@ class PitayaCSR:
             (value, val, ma),
         )
 
+        old_val = self.shadow.get(name)
+
         b = (width + 8 - 1) // 8
         for i in range(b):
-            v = (val >> (8 * (b - i - 1))) & 0xFF
+            shift = 8 * (b - i - 1)
+            v = (val >> shift) & 0xFF
+            if old_val is not None and (old_val >> shift) & 0xFF == v:
+                continue
             self.set_one(self.offset + (map << 11) + ((addr + i) << 2), v)
 
+        self.shadow[name] = val
+
+    def strobe(self, name):
+        """Writes to a CSR without storage (e.g. `<signal>_clr`). Every write
+        triggers it, therefore the shadow copy is bypassed."""
+        self.shadow.pop(name, None)
+        self.set(name, 1)
+
     def get(self, name):
         if name in self.constants:
             return self.constants[name]
@@ -55,20 +88,36 @@ class PitayaCSR:
             )
         return v
 
-    def set_iir(self, prefix, b, a, z=0):
+    def get_iir_format(self, prefix):
         shift = self.get(prefix + "_shift") or 16
         width = self.get(prefix + "_width") or 18
         interval = self.get(prefix + "_interval") or 1
+        return shift, width, interval
+
+    def set_iir(self, prefix, b, a, z=0):
+        shift, width, interval = self.get_iir_format(prefix)
         b, a, params = get_params(b, a, shift, width, interval)
 
-        for k in sorted(params):
-            self.set(prefix + "_" + k, params[k])
-        self.set(prefix + "_z0", z)
-        for i in range(len(b), 3):
+        registers = self._iir_registers(prefix, len(b), sorted(params.items()), z)
+        for k, v in registers.items():
+            self.set(k, v)
+
+    def get_iir_registers(self, prefix, filter_type, f=0.0, z=0):
+        """Returns a dict containing the register values for the IIR filter
+        `prefix` (see `make_filter` for `filter_type` and `f`). In contrast to
+        `set_iir`, nothing is written and the coefficients are cached."""
+        order, params = compile_filter(filter_type, f, *self.get_iir_format(prefix))
+        return self._iir_registers(prefix, order, params, z)
+
+    def _iir_registers(self, prefix, order, params, z):
+        registers = {prefix + "_" + k: v for k, v in params}
+        registers[prefix + "_z0"] = z
+        for i in range(order, 3):
             n = prefix + "_b%i" % i
             if n in self.map:
-                self.set(n, 0)
-                self.set(prefix + "_a%i" % i, 0)
+                registers[n] = 0
+                registers[prefix + "_a%i" % i] = 0
+        return registers
 
     def signal(self, name):
         return csrmap.signals.index(name)
@@ -79,6 +128,7 @@ class PitayaCSR:
 
 class PythonCSR(PitayaCSR):
     def __init__(self, rp):
+        super().__init__()
         self.rp = rp
 
     def set_one(self, addr, value):
@@ -0,0 +1,38 @@
+import threading
+
+
+class CSRQueue:
+    """Collects the batches of CSR writes that the server sends to the
+    acquisition process until they are applied.
+
+    Every batch consists of register values and pulses (registers that are set
+    to a value for a short time and restored afterwards). Within a batch, the
+    values are written before the pulses. Writes to the same register are
+    merged such that only the last value is written, as long as no pulse has to
+    be written in between: a batch that follows a batch with pulses is kept
+    separate such that its values are written after these pulses."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # list of (csr, pulses) tuples in the order they have to be written
+        self._batches = []
+        self.generation = 0
+
+    def put(self, generation, csr, pulses):
+        """Queues a batch with the register values `csr` (a dict) and `pulses`
+        (a list of `(register, value)` tuples)."""
+        with self._lock:
+            if self._batches and not self._batches[-1][1]:
+                last_csr, last_pulses = self._batches[-1]
+                last_csr.update(csr)
+                last_pulses.extend(pulses)
+            else:
+                self._batches.append((dict(csr), list(pulses)))
+            self.generation = generation
+
+    def pop(self):
+        """Removes all queued batches and returns them together with the
+        generation of the last one."""
+        with self._lock:
+            batches, self._batches = self._batches, []
+            return batches, self.generation
@@ -0,0 +1,92 @@
+import numpy as np
+
+from linien.common import DECIMATION_MODE_MEAN, DECIMATION_MODE_ENVELOPE
+from linien.frame_format import METADATA_KEYS, decode_frame, encode_frame
+
+# for small decimation factors, summing blocks of a reshaped array is slow
+# because numpy's reduction along a short axis has a large overhead. Up to this
+# factor, differences of the cumulative sum are used instead.
+MAX_CUMSUM_FACTOR = 8
+
+
+def decimate_mean(array, factor):
+    """Averages blocks of `factor` samples of an integer array.
+
+    The block sums are calculated in int32 (no promotion to float). Rounding is
+    done to the nearest integer (halves are rounded up)."""
+    if factor <= MAX_CUMSUM_FACTOR:
+        cumsum = np.empty(len(array) + 1, dtype=np.int32)
+        cumsum[0] = 0
+        np.cumsum(array, dtype=np.int32, out=cumsum[1:])
+        block_sums = cumsum[factor::factor] - cumsum[:-factor:factor]
+    else:
+        block_sums = array.reshape(-1, factor).sum(axis=1, dtype=np.int32)
+
+    block_sums += factor // 2
+    block_sums //= factor
+    return block_sums
+
+
+def decimate_envelope(array, factor):
+    """Decimates an integer array by `factor` while preserving peaks.
+
+    Every pair of output points contains the minimum and the maximum of
+    `2 * factor` consecutive samples, in the order they occur. Therefore, the
+    result has the same length as the one of `decimate_mean`, but narrow
+    features don't disappear."""
+    blocks = array.reshape(-1, 2 * factor)
+    min_idxs = blocks.argmin(axis=1)
+    max_idxs = blocks.argmax(axis=1)
+    rows = np.arange(len(blocks))
+
+    # the earlier one of min and max comes first
+    first_idxs = np.minimum(min_idxs, max_idxs)
+    second_idxs = np.maximum(min_idxs, max_idxs)
+
+    out = np.empty(2 * len(blocks), dtype=np.int32)
+    out[0::2] = blocks[rows, first_idxs]
+    out[1::2] = blocks[rows, second_idxs]
+    return out
+
+
+def decimate(array, factor, mode=DECIMATION_MODE_MEAN):
+    """Reduces the length of `array` by `factor` using one of the decimation
+    modes defined in `linien.common`."""
+    if factor == 1:
+        return array
+
+    if mode == DECIMATION_MODE_MEAN:
+        return decimate_mean(array, factor)
+    elif mode == DECIMATION_MODE_ENVELOPE:
+        return decimate_envelope(array, factor)
+
+    raise Exception("unknown decimation mode %s" % mode)
+
+
+def decimate_frame(frame, factor):
+    """Decimates the channels of an encoded frame (see `linien.frame_format`)
+    by averaging blocks of `factor` points. Excess points at the end are
+    dropped. A region of interest is converted to the decimated points."""
+    if frame is None:
+        return frame
+
+    data = decode_frame(frame)
+    for key, channel in data.items():
+        if key not in METADATA_KEYS:
+            data[key] = decimate_mean(
+                channel[: len(channel) - len(channel) % factor], factor
+            )
+    if "roi" in data:
+        data["roi"] = tuple(v // factor for v in data["roi"])
+
+    return encode_frame(data)
+
+
+def decimate_history(history, factor):
+    """Keeps every `factor`-th point of the lists of a control signal history
+    (see `linien.common.update_control_signal_history`), always including the
+    most recent one."""
+    return {
+        key: values[(len(values) - 1) % factor :: factor]
+        for key, values in history.items()
+    }
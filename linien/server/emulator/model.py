@@ -0,0 +1,344 @@
+import numpy as np
+from scipy.signal import lfilter
+
+from linien.server.trigger_timing import CLOCK_FREQUENCY, SWEEP_STEP_SHIFT
+
+# all emulated signals are given in units of the 14 bit fast in- and outputs,
+# i.e. 8192 correspond to 1 V
+MAX_VALUE = 8191
+# fixed point scaling of the PID (see gateware/logic/pid.py): the proportional
+# term is `error * kp >> 12`. Every clock cycle, the integrator is incremented
+# by `error * ki >> 4` and its output is shifted by another 18 bits.
+PID_P_SHIFT = 12
+PID_I_SHIFT = 22
+# the channel factors of the dual channel mode are 8 bit fixed point values
+CHANNEL_FACTOR_SHIFT = 8
+
+
+class Line:
+    """A Lorentzian absorption line. `position` and `width` are given in V of
+    the output that tunes the laser, `depth` is the relative absorption."""
+
+    def __init__(self, position, width, depth):
+        self.position = position
+        self.width = width
+        self.depth = depth
+
+
+DEFAULT_LINES = (
+    Line(-0.45, 0.03, 0.5),
+    Line(-0.12, 0.008, 1.0),
+    Line(0.05, 0.012, 0.4),
+    Line(0.32, 0.02, 0.8),
+)
+
+
+class LaserModel:
+    """A synthetic spectroscopy setup.
+
+    The laser frequency is tuned by the output voltage (in units of 14 bit
+    values). Additionally, it has white frequency noise and drifts like a
+    random walk (`drift` is given per square root of a second). The light is
+    sent through a cell containing absorption `lines` and is detected by both
+    input channels with different `gains` and phase shifts of the modulation
+    (`phases`, in degrees).
+
+    Modulating the laser frequency with an amplitude `m` and demodulating the
+    detected signal results in the difference of the absorption at `x + m` and
+    `x - m`, i.e. in a dispersive error signal. The modulation output is
+    scaled by `modulation_gain` because it typically tunes the laser much more
+    weakly than the control output."""
+
+    def __init__(
+        self,
+        lines=DEFAULT_LINES,
+        gains=(6000, 4000),
+        phases=(0, 40),
+        modulation_gain=0.02,
+        detection_noise=15,
+        frequency_noise=0.5,
+        drift=5,
+        seed=None,
+    ):
+        self.lines = lines
+        self.gains = gains
+        self.phases = phases
+        self.modulation_gain = modulation_gain
+        self.detection_noise = detection_noise
+        self.frequency_noise = frequency_noise
+        self.drift = drift
+        self.rng = np.random.default_rng(seed)
+        self._drift_value = 0
+
+    def absorption(self, x):
+        volts = np.asarray(x, dtype=np.float64) / (MAX_VALUE + 1)
+        absorption = np.zeros_like(volts)
+        for line in self.lines:
+            absorption += line.depth / (1 + ((volts - line.position) / line.width) ** 2)
+        return absorption
+
+    def demodulate(self, x, modulation_amplitude, demodulation_phase, channel):
+        """Returns in-phase and quadrature signal of `channel` for the laser
+        frequencies `x` (without noise)."""
+        modulation_amplitude = modulation_amplitude * self.modulation_gain
+        signal = (
+            self.gains[channel]
+            * (
+                self.absorption(x + modulation_amplitude)
+                - self.absorption(x - modulation_amplitude)
+            )
+            / 2
+        )
+        phase = np.deg2rad(demodulation_phase - self.phases[channel])
+        return signal * np.cos(phase), signal * np.sin(phase)
+
+    def get_detection_noise(self, n_samples):
+        return self.rng.normal(0, self.detection_noise, n_samples)
+
+    def get_frequency_fluctuations(self, n_samples, sample_time, gap=0):
+        """Returns the deviations of the free-running laser frequency for
+        `n_samples` consecutive samples. `gap` is the time (in seconds) since
+        the last sample that was requested."""
+        steps = self.rng.normal(0, self.drift * np.sqrt(sample_time), n_samples)
+        steps[0] = self.rng.normal(0, self.drift * np.sqrt(sample_time + gap))
+        walk = self._drift_value + np.cumsum(steps)
+        self._drift_value = walk[-1]
+        return walk + self.rng.normal(0, self.frequency_noise, n_samples)
+
+
+class GatewareModel:
+    """Vectorized model of the signal processing of the gateware.
+
+    It reads its configuration from a `RegisterFile` and models the sweep, the
+    modulation and demodulation, the combination of both channels, the PID and
+    the saturation of the outputs. The laser is tuned by the sum of all
+    outputs, regardless of the channels they are configured for. Filters and
+    the slow PID are not modeled.
+
+    In locked state, the PID's integrator is linearized around the point where
+    it comes to rest. This allows to calculate long recordings using `lfilter`
+    instead of iterating over the samples."""
+
+    def __init__(self, registers, laser):
+        self.registers = registers
+        self.laser = laser
+
+        self.lock_running = False
+        # minimum and maximum of the signals that have peak detectors
+        self.peaks = {}
+
+        self._output = 0
+        self._lock_point = None
+        self._lock_config = None
+
+    def read_config(self):
+        get = self.registers.get
+        return {
+            "sweep_min": get("logic_sweep_min", signed=True),
+            "sweep_max": get("logic_sweep_max", signed=True),
+            "sweep_step": get("logic_sweep_step"),
+            "sweep_run": get("logic_sweep_run"),
+            "center": get("logic_out_offset", signed=True),
+            "modulation_amplitude": get("logic_mod_amp"),
+            "demodulation_phase_a": get("fast_a_demod_delay") / (1 << 14) * 360,
+            "demodulation_phase_b": get("fast_b_demod_delay") / (1 << 14) * 360,
+            "invert_a": get("fast_a_invert"),
+            "invert_b": get("fast_b_invert"),
+            "offset_a": get("logic_chain_a_offset", signed=True),
+            "offset_b": get("logic_chain_b_offset", signed=True),
+            "dual_channel": get("logic_dual_channel"),
+            "factor_a": get("logic_chain_a_factor", signed=True),
+            "factor_b": get("logic_chain_b_factor", signed=True),
+            "combined_offset": get("logic_combined_offset", signed=True),
+            "kp": get("logic_pid_kp", signed=True),
+            "ki": get("logic_pid_ki", signed=True),
+            "pid_reset": get("logic_pid_reset"),
+            "request_lock": get("logic_request_lock"),
+        }
+
+    def update_lock(self, config):
+        """Starts or stops the lock according to `request_lock`."""
+        running = bool(config["request_lock"])
+        if running and not self.lock_running:
+            # the gateware starts the lock at the zero crossing of the sweep
+            self._output = config["center"]
+            self._lock_point = None
+        self.lock_running = running
+
+    def get_sweep_period(self, config):
+        """Returns the duration of a full sweep period in seconds or `None` if
+        the sweep isn't running."""
+        if self.lock_running or not config["sweep_run"] or not config["sweep_step"]:
+            return None
+        half_period_cycles = (
+            (config["sweep_max"] - config["sweep_min"])
+            * (1 << SWEEP_STEP_SHIFT)
+            / config["sweep_step"]
+        )
+        return 2 * half_period_cycles / CLOCK_FREQUENCY
+
+    def get_signals(self, x, config, noise=True):
+        """Returns the demodulated signals of both channels and the combined
+        error signal for the laser frequencies `x`."""
+        signals = {}
+        for channel, name in enumerate(("a", "b")):
+            i, q = self.laser.demodulate(
+                x,
+                config["modulation_amplitude"],
+                config["demodulation_phase_" + name],
+                channel,
+            )
+            if noise:
+                i += self.laser.get_detection_noise(len(i))
+                q += self.laser.get_detection_noise(len(q))
+            sign = -1 if config["invert_" + name] else 1
+            offset = config["offset_" + name]
+            signals["fast_%s_out_i" % name] = clip(sign * (i + offset))
+            signals["fast_%s_out_q" % name] = clip(sign * (q + offset))
+
+        if config["dual_channel"]:
+            combined = (
+                config["factor_a"] * signals["fast_a_out_i"]
+                + config["factor_b"] * signals["fast_b_out_i"]
+            ) / (1 << CHANNEL_FACTOR_SHIFT) + config["combined_offset"]
+        else:
+            combined = signals["fast_a_out_i"]
+        signals["logic_combined_error_signal"] = clip(combined)
+
+        return signals
+
+    def record(self, n_samples, decimation, sweep_time=0, gap=0):
+        """Returns the signals of `n_samples` consecutive samples recorded
+        with `decimation`. Unless locked, the recording starts at `sweep_time`
+        (in seconds) after the beginning of the rising part of the sweep. `gap`
+        is the time since the end of the previous recording."""
+        config = self.read_config()
+        self.update_lock(config)
+
+        if self.lock_running:
+            signals = self._record_locked(n_samples, decimation, gap, config)
+        else:
+            signals = self._record_sweep(n_samples, decimation, sweep_time, gap, config)
+
+        for name in ("logic_control_signal", "logic_combined_error_signal"):
+            signal = signals[name]
+            minimum, maximum = self.peaks.get(name, (MAX_VALUE, -MAX_VALUE))
+            self.peaks[name] = (
+                min(minimum, int(signal.min())),
+                max(maximum, int(signal.max())),
+            )
+
+        return signals
+
+    def clear_peaks(self, name):
+        self.peaks.pop(name, None)
+
+    def _record_sweep(self, n_samples, decimation, sweep_time, gap, config):
+        sample_time = decimation / CLOCK_FREQUENCY
+        t = sweep_time + np.arange(n_samples) * sample_time
+        period = self.get_sweep_period(config)
+
+        if period is None:
+            sweep = np.zeros(n_samples)
+        else:
+            # triangle between `sweep_min` and `sweep_max`
+            phase = (2 * t / period) % 2
+            span = config["sweep_max"] - config["sweep_min"]
+            sweep = config["sweep_min"] + span * np.where(phase < 1, phase, 2 - phase)
+
+        output = clip(config["center"] + sweep)
+        x = output + self.laser.get_frequency_fluctuations(n_samples, sample_time, gap)
+        self._output = output[-1]
+
+        signals = self.get_signals(x, config)
+        signals["logic_control_signal"] = np.zeros(n_samples)
+        return signals
+
+    def _find_lock_point(self, start, disturbance, config):
+        """Returns the output value where the integrator comes to rest if it
+        starts at `start` and the slope of the error signal there.
+
+        The integrator moves the output in the direction of `ki * error` until
+        the error signal changes its sign or the output saturates."""
+        outputs = np.arange(-MAX_VALUE, MAX_VALUE + 1)
+        error = self.get_signals(outputs + disturbance, config, noise=False)[
+            "logic_combined_error_signal"
+        ]
+        slopes = np.gradient(error)
+
+        start_idx = int(round(start)) + MAX_VALUE
+        direction = int(np.sign(config["ki"] * error[start_idx]))
+        if direction == 0 or config["pid_reset"]:
+            return outputs[start_idx], 0
+
+        if direction > 0:
+            remaining = error[start_idx:]
+        else:
+            remaining = error[: start_idx + 1][::-1]
+        sign_changes = np.nonzero(np.sign(remaining) != np.sign(remaining[0]))[0]
+
+        if len(sign_changes) == 0:
+            # the output saturates
+            idx = len(outputs) - 1 if direction > 0 else 0
+            return outputs[idx], 0
+
+        # the zero crossing lies between two values of `outputs`
+        idx = start_idx + direction * sign_changes[0]
+        return outputs[idx] - error[idx] / slopes[idx], slopes[idx]
+
+    def _record_locked(self, n_samples, decimation, gap, config):
+        sample_time = decimation / CLOCK_FREQUENCY
+        fluctuations = self.laser.get_frequency_fluctuations(
+            n_samples, sample_time, gap
+        )
+
+        if self._lock_point is None or config != self._lock_config:
+            self._lock_point, self._slope = self._find_lock_point(
+                self._output, fluctuations[0], config
+            )
+            self._lock_config = config
+            self._lock_disturbance = fluctuations[0]
+            # if the output saturates, the integrator quickly runs into the
+            # limit
+            self._deviation = self._output - self._lock_point if self._slope else 0
+
+        # linearized integrator: the deviation `v` of the output from the lock
+        # point follows v[k] = v[k - 1] + a * (v[k - 1] + d[k]) with the
+        # disturbance d. For `a <= -1`, the loop is faster than the sample rate.
+        a = np.clip(config["ki"] * decimation / (1 << PID_I_SHIFT) * self._slope, -1, 0)
+        disturbance = fluctuations - self._lock_disturbance
+
+        # the integrator kept on compensating the disturbance during the gap
+        # since the last recording
+        target = -disturbance[0]
+        self._deviation = target + (self._deviation - target) * (1 + a) ** (
+            gap / sample_time
+        )
+        if a == 0:
+            deviation = np.full(n_samples, float(self._deviation))
+        else:
+            deviation, _ = lfilter(
+                [a], [1, -(1 + a)], disturbance, zi=[(1 + a) * self._deviation]
+            )
+        previous_deviation = np.concatenate(([self._deviation], deviation[:-1]))
+        output = clip(self._lock_point + previous_deviation)
+
+        signals = self.get_signals(output + fluctuations, config)
+        error = signals["logic_combined_error_signal"]
+        control = clip(
+            output - config["center"] + config["kp"] * error / (1 << PID_P_SHIFT)
+        )
+        signals["logic_control_signal"] = control
+
+        self._deviation = deviation[-1]
+        self._output = output[-1]
+        if abs(self._lock_point + self._deviation) > MAX_VALUE:
+            # the output saturated, i.e. the lock is lost. The integrator runs
+            # away to another zero crossing (or the limit of the output).
+            self._lock_point = None
+
+        return signals
+
+
+def clip(signal):
+    return np.clip(signal, -MAX_VALUE, MAX_VALUE)
@@ -0,0 +1,61 @@
+from linien.server.csrmap import csr as CSR_MAP
+from linien.server.telemetry import to_signed
+
+# physical address of the CSRs, see `PitayaCSR`
+CSR_BASE_ADDRESS = 0x40300000
+
+
+class RegisterFile:
+    """In-memory emulation of the FPGA's CSRs.
+
+    The registers are laid out according to `csrmap.csr`, i.e. every register
+    is split into bytes that are stored at consecutive 32 bit words (most
+    significant byte first), exactly like `PitayaCSR` expects them.
+
+    `on_strobe` is called with the name of the register whenever a single-bit
+    register without storage (e.g. `<signal>_clr`) is written."""
+
+    def __init__(self, on_strobe=None):
+        self.on_strobe = on_strobe
+        self._memory = {}
+        self._strobe_addresses = {
+            self.get_address(name): name for name in CSR_MAP if name.endswith("_clr")
+        }
+
+    @staticmethod
+    def get_address(name, byte_idx=0):
+        map_, addr, width, writable = CSR_MAP[name]
+        return CSR_BASE_ADDRESS + (map_ << 11) + ((addr + byte_idx) << 2)
+
+    @staticmethod
+    def get_n_bytes(name):
+        return (CSR_MAP[name][2] + 8 - 1) // 8
+
+    def read(self, address):
+        return self._memory.get(address, 0)
+
+    def write(self, address, value):
+        self._memory[address] = value & 0xFF
+
+        name = self._strobe_addresses.get(address)
+        if name is not None and self.on_strobe is not None:
+            self.on_strobe(name)
+
+    def get(self, name, signed=False):
+        width = CSR_MAP[name][2]
+        n_bytes = self.get_n_bytes(name)
+        value = 0
+        for byte_idx in range(n_bytes):
+            value |= self.read(self.get_address(name, byte_idx)) << 8 * (
+                n_bytes - byte_idx - 1
+            )
+        return to_signed(value, width) if signed else value
+
+    def set(self, name, value):
+        """Sets a register without triggering strobes. This is used for the
+        status registers that are written by the emulated gateware."""
+        value &= (1 << CSR_MAP[name][2]) - 1
+        n_bytes = self.get_n_bytes(name)
+        for byte_idx in range(n_bytes):
+            shift = 8 * (n_bytes - byte_idx - 1)
+            self._memory[self.get_address(name, byte_idx)] = (value >> shift) & 0xFF
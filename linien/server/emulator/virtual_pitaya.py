@@ -0,0 +1,221 @@
+import os
+import tempfile
+from math import ceil
+from time import monotonic
+
+import numpy as np
+
+from linien.server.csrmap import signals as SIGNALS
+from linien.server.emulator.model import GatewareModel, LaserModel
+from linien.server.emulator.register_file import RegisterFile
+from linien.server.scope_reader import SCOPE_BUFFER_LENGTH, SCOPE_BUFFER_OFFSETS
+from linien.server.telemetry import SIGNAL_SHIFT, TELEMETRY_SIGNALS
+from linien.server.trigger_timing import CLOCK_FREQUENCY
+
+# trigger sources of the scope (see `rearm`). 0 means that the scope is never
+# triggered, i.e. it keeps writing to its buffers.
+TRIGGER_SOURCE_NONE = 0
+TRIGGER_SOURCE_RISING = 6
+TRIGGER_SOURCE_FALLING = 7
+# address of the trigger source register of the scope
+TRIGGER_SOURCE_ADDRESS = 0x1 << 2
+# registers of the scope that select the recorded signals. The first buffer
+# contains the in-phase signals, the second one the quadratures.
+SCOPE_SELECT_REGISTERS = (
+    ("scopegen_adc_a_sel", "scopegen_adc_b_sel"),
+    ("scopegen_adc_a_q_sel", "scopegen_adc_b_q_sel"),
+)
+
+
+class VirtualScope:
+    """Emulates the scope of PyRedPitaya.
+
+    The scope buffers are stored in a file that has the same layout as the
+    scope's address space, i.e. it can be read by `ScopeReader` (with
+    `base_address=0`). Recordings are calculated lazily: a triggered recording
+    is generated as soon as the trigger source is polled after the recording
+    would have been finished on the FPGA. In continuous mode, the samples that
+    were recorded in the meantime are generated whenever
+    `write_pointer_current` is read."""
+
+    def __init__(self, red_pitaya, memory_path=None):
+        self.red_pitaya = red_pitaya
+
+        if memory_path is None:
+            fd, memory_path = tempfile.mkstemp(prefix="linien_scope_")
+            os.close(fd)
+        self.memory_path = memory_path
+        with open(memory_path, "wb") as f:
+            f.truncate(SCOPE_BUFFER_OFFSETS[-1] + 4 * SCOPE_BUFFER_LENGTH)
+        self._memory = np.memmap(memory_path, dtype=np.uint32, mode="r+")
+        self._buffers = [
+            self._memory[offset // 4 : offset // 4 + SCOPE_BUFFER_LENGTH]
+            for offset in SCOPE_BUFFER_OFFSETS
+        ]
+
+        self.data_decimation = 1
+        self.trigger_delay = SCOPE_BUFFER_LENGTH - 1
+
+        self._trigger_source = TRIGGER_SOURCE_NONE
+        self._continuous = False
+        self._armed_at = 0
+        self._last_update = 0
+        # position where the next sample is written
+        self._write_pointer = 0
+        self._write_pointer_trigger = 0
+
+    def rearm(self, trigger_source=TRIGGER_SOURCE_RISING):
+        now = self.red_pitaya.clock()
+        self._trigger_source = trigger_source
+        self._continuous = trigger_source == TRIGGER_SOURCE_NONE
+        self._armed_at = now
+        self._last_update = now
+
+    def read(self, address):
+        if address == TRIGGER_SOURCE_ADDRESS:
+            self._check_trigger()
+            return self._trigger_source
+        return 0
+
+    @property
+    def write_pointer_trigger(self):
+        self.red_pitaya.update_status()
+        if (
+            self.red_pitaya.model.lock_running
+            and self._trigger_source != TRIGGER_SOURCE_NONE
+        ):
+            # in locked state, the sweep doesn't trigger the scope, i.e. its
+            # buffers contain the latest data
+            self._write_pointer_trigger = self._write_pointer
+            self._record(self.trigger_delay + 1, self.red_pitaya.clock())
+        return self._write_pointer_trigger
+
+    @property
+    def write_pointer_current(self):
+        if self._continuous:
+            now = self.red_pitaya.clock()
+            sample_time = self.data_decimation / CLOCK_FREQUENCY
+            n_samples = int((now - self._last_update) / sample_time)
+            if n_samples > 0:
+                # only the latest samples survive in the buffer
+                n_skipped = max(n_samples - SCOPE_BUFFER_LENGTH, 0)
+                self._write_pointer += n_skipped
+                self._record(
+                    n_samples - n_skipped,
+                    self._last_update + n_skipped * sample_time,
+                )
+                self._last_update += n_samples * sample_time
+        return (self._write_pointer - 1) % SCOPE_BUFFER_LENGTH
+
+    def _check_trigger(self):
+        if self._trigger_source not in (TRIGGER_SOURCE_RISING, TRIGGER_SOURCE_FALLING):
+            return
+
+        rp = self.red_pitaya
+        rp.update_status()
+        period = rp.model.get_sweep_period(rp.model.read_config())
+        if period is None:
+            # the sweep doesn't trigger the scope
+            return
+
+        start = rp.sweep_start
+        if self._trigger_source == TRIGGER_SOURCE_FALLING:
+            start += period / 2
+        trigger_time = start + max(ceil((self._armed_at - start) / period), 0) * period
+        n_samples = min(self.trigger_delay + 1, SCOPE_BUFFER_LENGTH)
+        duration = n_samples * self.data_decimation / CLOCK_FREQUENCY
+        if rp.clock() < trigger_time + duration:
+            return
+
+        self._write_pointer_trigger = self._write_pointer % SCOPE_BUFFER_LENGTH
+        self._record(n_samples, trigger_time, trigger_time - start)
+        self._trigger_source = TRIGGER_SOURCE_NONE
+
+    def _record(self, n_samples, start_time, sweep_time=0):
+        n_samples = min(n_samples, SCOPE_BUFFER_LENGTH)
+        signals = self.red_pitaya.record(
+            n_samples, self.data_decimation, start_time, sweep_time
+        )
+
+        zero = np.zeros(n_samples)
+        positions = (self._write_pointer + np.arange(n_samples)) % SCOPE_BUFFER_LENGTH
+        for buffer, (register_a, register_b) in zip(
+            self._buffers, SCOPE_SELECT_REGISTERS
+        ):
+            a, b = [
+                signals.get(SIGNALS[self.red_pitaya.registers.get(register)], zero)
+                for register in (register_a, register_b)
+            ]
+            a = np.round(a).astype(np.int64) & 0x3FFF
+            b = np.round(b).astype(np.int64) & 0x3FFF
+            buffer[positions] = (b << 16) | a
+
+        self._write_pointer = (self._write_pointer + n_samples) % SCOPE_BUFFER_LENGTH
+
+    def close(self):
+        del self._buffers
+        del self._memory
+        os.remove(self.memory_path)
+
+
+class VirtualRedPitaya:
+    """Emulates the `RedPitaya` object of PyRedPitaya without any hardware.
+
+    Register accesses go to a `RegisterFile`. The signals recorded by the
+    scope are calculated by a `GatewareModel` of the FPGA connected to a
+    `LaserModel`, i.e. sweeping, locking and streaming work like on a real
+    Red Pitaya. `clock` may be replaced for testing."""
+
+    def __init__(self, laser=None, clock=monotonic, memory_path=None):
+        self.clock = clock
+        self.registers = RegisterFile(on_strobe=self._strobe)
+        self.model = GatewareModel(self.registers, laser or LaserModel())
+        self.scope = VirtualScope(self, memory_path)
+
+        self.sweep_start = clock()
+        self._sweep_run_address = self.registers.get_address("logic_sweep_run")
+        self._status_outdated = True
+        self._last_recording_end = None
+
+    def read(self, address):
+        if self._status_outdated:
+            self.update_status()
+        return self.registers.read(address)
+
+    def write(self, address, value):
+        self.registers.write(address, value)
+        self._status_outdated = True
+
+        if address == self._sweep_run_address and not value:
+            # `Registers` restarts the sweep by pulsing `sweep_run`
+            self.sweep_start = self.clock()
+
+    def record(self, n_samples, decimation, start_time, sweep_time=0):
+        """Calculates the signals of a recording with `n_samples` samples that
+        starts at `start_time`."""
+        if self._last_recording_end is None:
+            gap = 0
+        else:
+            gap = max(start_time - self._last_recording_end, 0)
+        self._last_recording_end = start_time + n_samples * decimation / CLOCK_FREQUENCY
+
+        signals = self.model.record(n_samples, decimation, sweep_time, gap)
+        self.update_status()
+        return signals
+
+    def update_status(self):
+        """Updates the lock state and the status registers."""
+        self.model.update_lock(self.model.read_config())
+        self.registers.set("logic_lock_running", int(self.model.lock_running))
+
+        for prefix in TELEMETRY_SIGNALS.values():
+            minimum, maximum = self.model.peaks.get(prefix, (0, 0))
+            self.registers.set(prefix + "_min", int(minimum) << SIGNAL_SHIFT)
+            self.registers.set(prefix + "_max", int(maximum) << SIGNAL_SHIFT)
+
+        self._status_outdated = False
+
+    def _strobe(self, name):
+        if name.endswith("_clr"):
+            self.model.clear_peaks(name[: -len("_clr")])
+            self._status_outdated = True
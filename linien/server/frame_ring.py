@@ -0,0 +1,201 @@
+import numpy as np
+from time import monotonic
+from multiprocessing import shared_memory
+
+from linien.common import MAX_TRACE_LENGTH
+
+# the acquisition process records at most 4 channels per frame: the in-phase
+# and quadrature signals of channel a and b (or error and control signal when
+# locked)
+MAX_CHANNELS = 4
+# how many frames are kept in the ring. A slot is only overwritten after
+# `N_SLOTS - 1` newer frames were written, i.e. a consumer has plenty of time
+# to process a frame before its data becomes invalid.
+N_SLOTS = 8
+
+HEADER_DTYPE = np.dtype(
+    [
+        # monotonically increasing number of the frame. 0 means that the slot
+        # doesn't contain valid data (or is currently being written)
+        ("sequence", np.uint64),
+        # `time.monotonic()` at the time the frame was written. The monotonic
+        # clock is system-wide, i.e. it may be compared between processes.
+        ("timestamp", np.float64),
+        # `time.monotonic()` when the acquisition process noticed the trigger
+        # of the recording (in locked state: started reading the scope)
+        ("trigger_timestamp", np.float64),
+        # the generation of CSR writes that was applied before the scope was
+        # armed for this frame
+        ("generation", np.uint64),
+        ("locked", np.bool_),
+        ("n_channels", np.uint8),
+        # the number of points of every channel
+        ("n_points", np.uint16),
+        ("slow_value", np.int16),
+        # the number of sweeps that were averaged for this frame
+        ("n_sweeps", np.uint16),
+        # if only a region of interest of the trace was read, its first point
+        # and the length of the full trace
+        ("roi_start", np.uint16),
+        ("trace_length", np.uint16),
+        # whether the frame was recorded during the falling part of the sweep.
+        # In this case, it was already time-reversed.
+        ("sweep_down", np.bool_),
+        # how many sweeps per second were not recorded by the acquisition
+        # process because it didn't manage to rearm the scope in time
+        ("missed_sweeps_per_second", np.float32),
+        # whether the frame is a chunk of the gapless stream (see
+        # `StreamReader`). In this case, `stream_position` is the index of its
+        # first sample since the stream was started, the sample rate is the
+        # clock frequency divided by `stream_decimation` and `stream_overruns`
+        # counts how often samples were lost
+        ("streaming", np.bool_),
+        ("stream_position", np.uint64),
+        ("stream_decimation", np.uint32),
+        ("stream_overruns", np.uint32),
+        # in locked state, the minima and maxima of control and error signal
+        # since the previous frame, as recorded by the hardware peak detectors
+        # (see `linien.server.telemetry`). Only valid if `telemetry` is set.
+        ("telemetry", np.bool_),
+        ("control_signal_min", np.int32),
+        ("control_signal_max", np.int32),
+        ("error_signal_min", np.int32),
+        ("error_signal_max", np.int32),
+    ]
+)
+# these header fields are set by `FrameRing.write` itself
+AUTOMATIC_HEADER_FIELDS = ("sequence", "timestamp", "n_channels", "n_points")
+
+
+class Frame:
+    """A single frame stored in a `FrameRing`.
+
+    `channels` contains zero-copy views of the shared memory. They stay valid
+    until the slot is overwritten by a newer frame. Use `is_valid()` after
+    processing the data to check that this didn't happen in the meantime.
+
+    All fields of `HEADER_DTYPE` are available as attributes."""
+
+    def __init__(self, ring, slot):
+        self._ring = ring
+        self._slot = slot
+
+        header = ring.headers[slot]
+        for name in HEADER_DTYPE.names:
+            setattr(self, name, header[name].item())
+
+        self.channels = tuple(ring.data[slot, : self.n_channels, : self.n_points])
+
+        # timestamps of the stages the frame passed so far, see
+        # `linien.common.FrameTracer`
+        self.trace = {"id": self.sequence, "buffer_read": self.timestamp}
+        if self.trigger_timestamp:
+            self.trace["trigger"] = self.trigger_timestamp
+
+    def is_valid(self):
+        return int(self._ring.headers[self._slot]["sequence"]) == self.sequence
+
+    def get_header(self):
+        """Returns the header fields that have to be passed to
+        `FrameRing.write` in order to copy this frame to another ring."""
+        return {
+            name: getattr(self, name)
+            for name in HEADER_DTYPE.names
+            if name not in AUTOMATIC_HEADER_FIELDS
+        }
+
+
+class FrameRing:
+    """A ring of int16 frame slots in shared memory.
+
+    It is used for transferring acquired traces from the acquisition process to
+    the server without pickling and copying them. The acquisition process is
+    the only writer, the server reads the frames. Every slot has room for
+    `n_points` points per channel, frames may be shorter.
+
+    Pass `name` in order to attach to an existing ring instead of creating a
+    new one."""
+
+    def __init__(self, name=None, n_slots=N_SLOTS, n_points=MAX_TRACE_LENGTH):
+        self.n_slots = n_slots
+        self.n_points = n_points
+
+        headers_size = HEADER_DTYPE.itemsize * n_slots
+        data_size = 2 * n_slots * MAX_CHANNELS * n_points
+
+        self._owner = name is None
+        if self._owner:
+            self.shm = shared_memory.SharedMemory(
+                create=True, size=headers_size + data_size
+            )
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+        self.name = self.shm.name
+        self.headers = np.ndarray(
+            (n_slots,), dtype=HEADER_DTYPE, buffer=self.shm.buf, offset=0
+        )
+        self.data = np.ndarray(
+            (n_slots, MAX_CHANNELS, n_points),
+            dtype=np.int16,
+            buffer=self.shm.buf,
+            offset=headers_size,
+        )
+
+        if self._owner:
+            self.headers[:] = 0
+
+        self.last_sequence = 0
+
+    def write(self, channels, **header_fields):
+        """Writes a new frame and returns its sequence number. The keyword
+        arguments are fields of `HEADER_DTYPE`, fields that are not given are
+        set to 0."""
+        assert len(channels) <= MAX_CHANNELS
+        n_points = len(channels[0]) if channels else 0
+        assert n_points <= self.n_points
+
+        sequence = self.last_sequence + 1
+        slot = sequence % self.n_slots
+        header = self.headers[slot]
+
+        # mark the slot as invalid while it is written
+        header["sequence"] = 0
+
+        for channel_idx, channel in enumerate(channels):
+            assert len(channel) == n_points
+            self.data[slot, channel_idx, :n_points] = channel
+
+        for name in HEADER_DTYPE.names:
+            if name not in AUTOMATIC_HEADER_FIELDS:
+                header[name] = header_fields.pop(name, 0)
+        assert not header_fields, "unknown header fields %s" % list(header_fields)
+
+        header["timestamp"] = monotonic()
+        header["n_channels"] = len(channels)
+        header["n_points"] = n_points
+        header["sequence"] = sequence
+
+        self.last_sequence = sequence
+        return sequence
+
+    def read(self, sequence):
+        """Returns the `Frame` with the given sequence number or `None` if it
+        was already overwritten."""
+        slot = sequence % self.n_slots
+        if sequence == 0 or int(self.headers[slot]["sequence"]) != sequence:
+            return None
+        return Frame(self, slot)
+
+    def close(self):
+        # numpy views have to be released before the shared memory is closed
+        del self.headers
+        del self.data
+
+        try:
+            self.shm.close()
+        except BufferError:
+            # frames that are still referenced somewhere keep the memory mapped
+            pass
+        if self._owner:
+            self.shm.unlink()
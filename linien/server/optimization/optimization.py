@@ -5,7 +5,9 @@ import numpy as np
 import traceback
 
 from linien.common import determine_shift_by_correlation, get_lock_point
+from linien.frame_format import decode_frame
 from linien.server.autolock import Approacher
+from linien.server.channels import CHANNEL_SIGNALS, CHANNEL_QUADRATURES
 
 
 class OptimizeSpectroscopy:
@@ -40,6 +42,9 @@ class OptimizeSpectroscopy:
 
         params = self.parameters
         self.engine = OptimizerEngine(self.control, params)
+        params.channel_subscriptions.subscribe(
+            self, (CHANNEL_SIGNALS, CHANNEL_QUADRATURES)
+        )
         params.to_plot.on_change(self.react_to_new_spectrum)
         params.optimization_running.value = True
         params.optimization_improvement.value = 0
@@ -73,9 +78,9 @@ class OptimizeSpectroscopy:
             dual_channel = params.dual_channel.value
             channel = params.optimization_channel.value
             spectrum_idx = 1 if not dual_channel else (1, 2)[channel]
-            unpickled = pickle.loads(spectrum)
-            spectrum = unpickled["error_signal_%d" % spectrum_idx]
-            quadrature = unpickled["error_signal_%d_quadrature" % spectrum_idx]
+            frame = decode_frame(spectrum)
+            spectrum = frame["error_signal_%d" % spectrum_idx]
+            quadrature = frame["error_signal_%d_quadrature" % spectrum_idx]
 
             if self.parameters.optimization_approaching.value:
                 approaching_finished = self.approacher.approach_line(spectrum)
@@ -138,6 +143,7 @@ class OptimizeSpectroscopy:
 
         self.parameters.optimization_running.value = False
         self.parameters.to_plot.remove_listener(self.react_to_new_spectrum)
+        self.parameters.channel_subscriptions.unsubscribe(self)
         self.parameters.task.value = None
 
         self.reset_scan()
@@ -1,6 +1,17 @@
 from linien.server.parameters_base import BaseParameters, Parameter
+from linien.server.averaging import MAX_AVERAGING_SWEEPS
+from linien.server.channels import ChannelSubscriptions
+from linien.server.decimation import decimate_frame, decimate_history
 from linien.config import DEFAULT_COLORS, N_COLORS
-from linien.common import Vpp, MHz
+from linien.common import (
+    Vpp,
+    MHz,
+    DECIMATION_MODE_MEAN,
+    PSD_AVERAGING_EXPONENTIAL,
+    N_POINTS,
+    MIN_TRACE_LENGTH,
+    MAX_TRACE_LENGTH,
+)
 
 
 class Parameters(BaseParameters):
@@ -86,7 +97,7 @@ class Parameters(BaseParameters):
             "plot_fill_opacity",
         )
 
-        self.to_plot = Parameter()
+        self.to_plot = Parameter(decimate=decimate_frame)
 
         #           --------- GENERAL PARAMETERS ---------
         # configures the output of the modulation frequency. A value of 0 means
@@ -138,7 +149,9 @@ class Parameters(BaseParameters):
         # record of control signal should be kept for how long?
         self.control_signal_history_length = Parameter(start=600)
         self.control_signal_history = Parameter(
-            start={"times": [], "values": []}, sync=False
+            start={"times": [], "values": [], "slow_times": [], "slow_values": []},
+            sync=False,
+            decimate=decimate_history,
         )
         # if this boolean is `True`, no new spectroscopy data is sent to the
         # clients. This parameter is used when writing data to FPGA that would
@@ -146,9 +159,100 @@ class Parameters(BaseParameters):
         self.pause_acquisition = Parameter(start=False)
 
         # this parameter is not exposed to GUI. It is used by the autolock or
-        # normal lock to fetch less data if they are not needed.
+        # normal lock to fetch less data if they are not needed. Even if it is
+        # set, quadratures are only fetched if somebody subscribed to them.
         self.fetch_quadratures = Parameter(start=True)
 
+        # the channels that are fetched by the acquisition process (see
+        # `linien.server.channels`). Don't set this parameter directly but use
+        # `channel_subscriptions`: every consumer of the acquired data declares
+        # the channels it needs there. The error signals are always fetched.
+        self.fetched_channels = Parameter(start=frozenset())
+        self.channel_subscriptions = ChannelSubscriptions(self.fetched_channels)
+
+        # number of points of the recorded traces. Has to be a power of 2. Few
+        # points mean less load and lower latency, many points allow for
+        # resolving narrow features. The length of the traces in `to_plot` may
+        # differ from this value for a short time after changing it.
+        self.trace_length = Parameter(
+            start=N_POINTS, min_=MIN_TRACE_LENGTH, max_=MAX_TRACE_LENGTH
+        )
+
+        # region of interest of the traces: either `None` (full trace) or a
+        # tuple `(start, length)` in points of `trace_length`. If set, only this
+        # part of the scope's memory is read and transferred. In this case,
+        # `to_plot` contains `roi`, a tuple of the start and the full length of
+        # the trace. Consumers that need the full trace have to reset this
+        # parameter to `None`. The autolock sets it while approaching the line.
+        self.roi = Parameter(start=None)
+
+        # how the acquisition process decimates the data if the requested
+        # decimation exceeds what the FPGA supports (i.e. for slow sweeps).
+        # Either `DECIMATION_MODE_MEAN` or `DECIMATION_MODE_ENVELOPE`.
+        self.decimation_mode = Parameter(start=DECIMATION_MODE_MEAN)
+
+        # if larger than 1, the acquisition process averages this number of
+        # consecutive sweeps and only publishes the average. This reduces noise
+        # as well as the amount of data that has to be transferred.
+        self.averaging_n_sweeps = Parameter(start=1, min_=1, max_=MAX_AVERAGING_SWEEPS)
+        # if averaging is enabled, sweeps that deviate strongly from the others
+        # (e.g. because of glitches) are not included in the average
+        self.averaging_reject_outliers = Parameter(start=False)
+
+        # if set, the falling part of the sweep is recorded, too. This doubles
+        # the number of spectra per second. The data of the falling part is
+        # time-reversed such that it may be plotted like the rising part.
+        # Spectra of the falling part are marked with `sweep_down` in
+        # `to_plot`. Both parts are read from a single recording that leaves
+        # time for rearming the scope before the next sweep period begins.
+        # Therefore, only the central half of the trace is recorded (see
+        # `roi`). As both parts have to fit into the scope's buffer, this is
+        # possible for trace lengths of up to 8192 points (unless the sweep is
+        # very slow). Otherwise, only the rising part is recorded.
+        self.record_both_sweep_directions = Parameter(start=False)
+
+        # in locked state, error and control signal may be recorded as a gapless
+        # stream instead of single snapshots. Listening to this parameter starts
+        # the stream. Every value is a pickled dict containing a chunk of the
+        # stream: `error_signal`, `control_signal`, `position` (the index of the
+        # chunk's first sample since the stream was started), `sample_rate`
+        # (in Hz) and `overruns`. The latter counts how often samples were lost
+        # because the acquisition process didn't keep up; in this case,
+        # `position` jumps. Chunks are not collapsed in the listener queue, but
+        # they are dropped if a client doesn't keep up (`position` jumps, too).
+        self.stream_data = Parameter(sync=False, collapsed_sync=False)
+        # the stream's sample rate is 125 MHz divided by this value. Has to be a
+        # power of 2. Low values require the acquisition process to poll the
+        # scope very often and lead to overruns.
+        self.stream_decimation = Parameter(start=1024, min_=1, max_=65536)
+
+        # while the lock is running, the power spectral densities of error and
+        # control signal are calculated using Welch's method. The data of the
+        # stream is used if somebody listens to `stream_data`, otherwise the
+        # snapshots of the locked state are used. About once per second, a
+        # pickled dict is published containing `error_signal` and
+        # `control_signal` (one-sided spectra in V^2/Hz), `sample_rate`,
+        # `segment_length` and `n_segments`. The frequencies are given by
+        #       numpy.fft.rfftfreq(segment_length, 1 / sample_rate)
+        self.psd = Parameter(sync=False)
+        # number of samples per segment. It determines the frequency
+        # resolution. Without the stream, it can't be longer than
+        # `trace_length`.
+        self.psd_segment_length = Parameter(start=1024, min_=16, max_=MAX_TRACE_LENGTH)
+        # either `PSD_AVERAGING_EXPONENTIAL` (older segments decay with a time
+        # constant of `psd_n_averages` segments) or `PSD_AVERAGING_BOXCAR` (the
+        # last `psd_n_averages` segments are averaged)
+        self.psd_averaging = Parameter(start=PSD_AVERAGING_EXPONENTIAL)
+        self.psd_n_averages = Parameter(start=16, min_=1)
+
+        # while the lock is running, the hardware peak detectors of control and
+        # error signal are read and cleared with every recorded frame. This is
+        # a dict mapping "control_signal" and "error_signal" to a tuple
+        # `(minimum, maximum)` in V, i.e. the peak excursions since the
+        # previous frame. In contrast to `to_plot`, it covers the whole time
+        # and doesn't require fetching any traces.
+        self.lock_telemetry = Parameter(sync=False)
+
         #           --------- RAMP PARAMETERS ---------
 
         # how big should the ramp amplitude be relative to the full output range
@@ -284,6 +388,10 @@ class Parameters(BaseParameters):
         self.autolock_locked = Parameter(start=False)
         self.autolock_retrying = Parameter(start=False)
         self.autolock_determine_offset = Parameter(start=True)
+        # if set, the autolock checks and watches the lock using
+        # `lock_telemetry` instead of the mean of the control signal trace.
+        # While watching the lock, no traces are fetched for the autolock then.
+        self.autolock_use_telemetry = Parameter(start=False)
         self.autolock_initial_ramp_amplitude = Parameter(start=1)
 
         #           --------- OPTIMIZATION PARAMETERS ---------
@@ -1,8 +1,22 @@
+import threading
+from collections import OrderedDict, deque
+from heapq import merge
+from itertools import count
+from time import monotonic
+
 from linien.common import pack
 
+# maximum number of values of non-collapsible parameters that are kept for a
+# client. If the client doesn't fetch them in time, the oldest ones are dropped
+MAX_LISTENER_QUEUE_LENGTH = 256
+
 
 class Parameter:
-    """Represents a single parameter and is used by `Parameters`."""
+    """Represents a single parameter and is used by `Parameters`.
+
+    `decimate` is an optional function `decimate(value, factor)` that reduces
+    the size of (array-valued) values. Remote listeners may request decimated
+    values, see `BaseParameters.register_remote_listener`."""
 
     def __init__(
         self,
@@ -12,6 +26,7 @@ class Parameter:
         wrap=False,
         sync=True,
         collapsed_sync=True,
+        decimate=None,
     ):
         self.min = min_
         self.max = max_
@@ -20,7 +35,11 @@ class Parameter:
         self._start = start
         self._listeners = set()
         self._collapsed_sync = collapsed_sync
+        self._decimate = decimate
         self.exposed_can_be_cached = sync
+        # the current value and a dict that maps decimation factors to packed
+        # values, see `get_packed_value`
+        self._packed = None
 
     @property
     def value(self):
@@ -35,18 +54,35 @@ class Parameter:
             value = self.max if not self.wrap else self.min
 
         self._value = value
+        self._packed = None
 
         # we copy it because a listener could remove a listener --> this would
         # cause an error in this loop
         for listener in self._listeners.copy():
             listener(value)
 
-    def on_change(self, function):
+    def on_change(self, function, call_immediately=True):
         self._listeners.add(function)
 
-        if self._value is not None:
+        if call_immediately and self._value is not None:
             function(self._value)
 
+    def get_packed_value(self, value, decimation=1):
+        """Returns `value` decimated by `decimation` and packed for sending it
+        to the clients. `value` has to be the current value or a value that a
+        listener was just called with. It is only decimated and packed once per
+        change, i.e. all listener queues share the same bytes."""
+        packed = self._packed
+        if packed is None or packed[0] is not value:
+            packed = (value, {})
+            self._packed = packed
+
+        if decimation not in packed[1]:
+            if decimation != 1:
+                value = self._decimate(value, decimation)
+            packed[1][decimation] = pack(value)
+        return packed[1][decimation]
+
     def remove_listener(self, function):
         if function in self._listeners:
             self._listeners.remove(function)
@@ -58,6 +94,95 @@ class Parameter:
         pass
 
 
+class ListenerQueue:
+    """The changes of the parameters a client listens to.
+
+    For collapsible parameters, only the latest value is kept (at the position
+    of the latest change). Values of other parameters are kept in a FIFO of at
+    most `max_length` values; if it is full, the oldest value is dropped.
+    Collapsible parameters may have a maximum rate (see `set_max_rate`), their
+    values are kept until they are due. The queue is not thread-safe,
+    `BaseParameters` takes care of that."""
+
+    def __init__(self, max_length=MAX_LISTENER_QUEUE_LENGTH):
+        # both contain (sequence number, entry) tuples
+        self._latest = OrderedDict()
+        self._fifo = deque(maxlen=max_length)
+        self._sequence = count()
+        # minimum time between two values of rate limited parameters and the
+        # time their last value was popped
+        self._min_intervals = {}
+        self._last_popped = {}
+
+        # number of values that were replaced by newer ones
+        self.collapsed = 0
+        # number of values that were dropped because the FIFO was full
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._latest) + len(self._fifo)
+
+    def set_max_rate(self, param_name, max_rate):
+        """Limits the rate (in Hz) at which values of the collapsible parameter
+        `param_name` are popped. `None` removes the limit."""
+        if max_rate is None:
+            self._min_intervals.pop(param_name, None)
+        else:
+            self._min_intervals[param_name] = 1 / max_rate
+
+    def get_delay(self):
+        """Returns the time (in s) until the next entry is due, `None` if the
+        queue is empty."""
+        delays = [0] if self._fifo else []
+        now = monotonic()
+        for param_name in self._latest:
+            min_interval = self._min_intervals.get(param_name)
+            if min_interval is None:
+                return 0
+            last_popped = self._last_popped.get(param_name, -min_interval)
+            delays.append(max(last_popped + min_interval - now, 0))
+        return min(delays, default=None)
+
+    def put(self, param_name, value, collapsible):
+        # the time is used for tracing frames, see `FrameTracer`
+        entry = (next(self._sequence), (param_name, value, monotonic()))
+
+        if collapsible:
+            if param_name in self._latest:
+                self._latest.move_to_end(param_name)
+                self.collapsed += 1
+            self._latest[param_name] = entry
+        else:
+            if len(self._fifo) == self._fifo.maxlen:
+                self.dropped += 1
+            self._fifo.append(entry)
+
+    def pop_due(self):
+        """Removes the entries that are due and returns them in the order of
+        their changes. Every entry is a `(param_name, value, time)` tuple."""
+        now = monotonic()
+        due = []
+        for param_name in list(self._latest):
+            min_interval = self._min_intervals.get(param_name)
+            if min_interval is not None:
+                last_popped = self._last_popped.get(param_name, -min_interval)
+                if now - last_popped < min_interval:
+                    continue
+                self._last_popped[param_name] = now
+            due.append(self._latest.pop(param_name))
+
+        entries = [entry for _, entry in merge(due, self._fifo)]
+        self._fifo.clear()
+        return entries
+
+    def get_stats(self):
+        return {
+            "length": len(self),
+            "collapsed": self.collapsed,
+            "dropped": self.dropped,
+        }
+
+
 class BaseParameters:
     """Represents a set of parameters. In an actual program, it should be
     sub-classed like this:
@@ -82,47 +207,100 @@ class BaseParameters:
     def __init__(self):
         self._remote_listener_queue = {}
         self._remote_listener_callbacks = {}
+        # notified whenever a value is put into a listener queue
+        self._remote_listener_condition = threading.Condition()
 
     def get_all_parameters(self):
         for name, element in self.__dict__.items():
             if isinstance(element, Parameter):
                 yield name, element
 
-    def register_remote_listener(self, uuid, param_name):
-        self._remote_listener_queue.setdefault(uuid, [])
-        self._remote_listener_callbacks.setdefault(uuid, [])
+    def register_remote_listener(self, uuid, param_name, max_rate=None, decimation=1):
+        """Queues the changes of `param_name` for the client `uuid`.
+
+        `max_rate` (in Hz) limits how often values are sent to the client, in
+        between only the latest value is kept. If `decimation` is larger than
+        1, values are decimated by this factor before they are sent (see
+        `Parameter`). Registering a listener again only changes these settings."""
+        param = self._get_param(param_name)
+        assert (
+            max_rate is None or param._collapsed_sync
+        ), "only collapsible parameters can be rate limited"
+        assert decimation == 1 or param._decimate is not None, (
+            "%s can't be decimated" % param_name
+        )
+
+        with self._remote_listener_condition:
+            queue = self._remote_listener_queue.setdefault(uuid, ListenerQueue())
+            queue.set_max_rate(param_name, max_rate)
+
+        callbacks = self._remote_listener_callbacks.setdefault(uuid, {})
+        registered = param_name in callbacks
+        if registered:
+            param.remove_listener(callbacks[param_name])
 
         def on_change(value, uuid=uuid, param_name=param_name):
-            if uuid in self._remote_listener_queue:
-                self._remote_listener_queue[uuid].append((param_name, value))
-
-        param = getattr(self, param_name)
-        param.on_change(on_change)
-
-        self._remote_listener_callbacks[uuid].append((param, on_change))
+            packed = param.get_packed_value(value, decimation)
+            with self._remote_listener_condition:
+                if uuid in self._remote_listener_queue:
+                    self._remote_listener_queue[uuid].put(
+                        param_name, packed, param._collapsed_sync
+                    )
+                    self._remote_listener_condition.notify_all()
+
+        callbacks[param_name] = on_change
+        # the client already got the current value when it registered first
+        param.on_change(on_change, call_immediately=not registered)
 
     def unregister_remote_listeners(self, uuid):
-        for param, callback in self._remote_listener_callbacks[uuid]:
-            param.remove_listener(callback)
-
-        del self._remote_listener_queue[uuid]
-        del self._remote_listener_callbacks[uuid]
+        """Removes all listeners of the client `uuid`. Clients that never
+        registered a listener are ignored."""
+        callbacks = self._remote_listener_callbacks.pop(uuid, {})
+        for param_name, callback in callbacks.items():
+            self._get_param(param_name).remove_listener(callback)
+
+        with self._remote_listener_condition:
+            self._remote_listener_queue.pop(uuid, None)
+
+    def wait_for_listener_queue(self, uuid, timeout=None):
+        """Blocks until entries of the listener queue of `uuid` are due or
+        `timeout` (in s) expires. Returns whether entries are due."""
+        stop = monotonic() + timeout if timeout is not None else None
+
+        with self._remote_listener_condition:
+            while True:
+                queue = self._remote_listener_queue.get(uuid)
+                delay = queue.get_delay() if queue is not None else None
+                if delay == 0:
+                    return True
+
+                remaining = stop - monotonic() if stop is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+
+                # wait for a change or until the next entry is due
+                if delay is None or (remaining is not None and remaining < delay):
+                    delay = remaining
+                self._remote_listener_condition.wait(delay)
 
     def get_listener_queue(self, uuid):
-        queue = self._remote_listener_queue.get(uuid, [])
-        self._remote_listener_queue[uuid] = []
-
-        # filter out multiple values for collapsible parameters
-        already_has_value = []
-        for idx in reversed(range(len(queue))):
-            param_name, value = queue[idx]
-            if self._get_param(param_name)._collapsed_sync:
-                if param_name in already_has_value:
-                    del queue[idx]
-                else:
-                    already_has_value.append(param_name)
-
-        return pack(queue)
+        """Returns the changes of the parameters `uuid` listens to as a tuple of
+        `(param_name, packed value, time)` entries. The values are packed once
+        for all clients, the tuple is transferred as is by rpyc. Values of rate
+        limited parameters that are not due yet stay in the queue."""
+        with self._remote_listener_condition:
+            queue = self._remote_listener_queue.get(uuid)
+            entries = queue.pop_due() if queue is not None else []
+
+        return tuple(entries)
+
+    def get_listener_queue_stats(self, uuid):
+        """Returns the statistics of the listener queue of `uuid` (see
+        `ListenerQueue`) or `None` if the client doesn't listen to any
+        parameter."""
+        with self._remote_listener_condition:
+            queue = self._remote_listener_queue.get(uuid)
+            return queue.get_stats() if queue is not None else None
 
     def __iter__(self):
         for name, param in self.get_all_parameters():
@@ -0,0 +1,206 @@
+import pickle
+import numpy as np
+from collections import deque
+from time import monotonic
+from scipy.signal import get_window
+
+from linien.common import FAST_V, PSD_AVERAGING_BOXCAR, PSD_AVERAGING_EXPONENTIAL
+from linien.server.channels import CHANNEL_SIGNALS, CHANNEL_STREAM
+from linien.server.trigger_timing import CLOCK_FREQUENCY
+
+# the averaged spectra are published at most once within this interval (in
+# seconds)
+PUBLISH_INTERVAL = 1
+
+
+class WelchPSD:
+    """Incrementally calculates the power spectral densities of several
+    channels using Welch's method.
+
+    Data is added in blocks. They are split into segments of `segment_length`
+    samples that overlap by 50%. The mean of every segment is subtracted, then
+    it is multiplied by a Hann window and Fourier transformed. The one-sided
+    power spectral densities of the segments are averaged: with
+    `PSD_AVERAGING_BOXCAR`, the last `n_averages` segments are averaged equally,
+    with `PSD_AVERAGING_EXPONENTIAL`, the weight of older segments decays with
+    a time constant of `n_averages` segments.
+
+    If a block is `contiguous` with the previous one, segments may span both
+    blocks. Otherwise, the samples left over from the previous block are
+    discarded."""
+
+    def __init__(
+        self, segment_length=1024, averaging=PSD_AVERAGING_EXPONENTIAL, n_averages=16
+    ):
+        self.segment_length = segment_length
+        self.averaging = averaging
+        self.n_averages = n_averages
+        self.reset()
+
+    def reset(self):
+        self.sample_rate = None
+        # how many segments were added since the last reset
+        self.n_segments = 0
+        self._average = None
+        self._recent = deque()
+        self._remainder = None
+
+        self._window = get_window("hann", self.segment_length)
+        self._scale = 1 / np.sum(self._window ** 2)
+
+    def configure(self, segment_length, averaging, n_averages):
+        if (segment_length, averaging, n_averages) != (
+            self.segment_length,
+            self.averaging,
+            self.n_averages,
+        ):
+            self.segment_length = segment_length
+            self.averaging = averaging
+            self.n_averages = n_averages
+            self.reset()
+
+    @property
+    def frequencies(self):
+        return np.fft.rfftfreq(self.segment_length, 1 / self.sample_rate)
+
+    def add(self, channels, sample_rate, contiguous=False):
+        """Adds a block of data. `channels` is a list of arrays of equal
+        length, sampled with `sample_rate` (in Hz). Returns the number of
+        segments that were completed."""
+        if sample_rate != self.sample_rate or (
+            self._remainder is not None and len(channels) != len(self._remainder)
+        ):
+            self.reset()
+            self.sample_rate = sample_rate
+
+        data = np.array(channels, dtype=np.float64)
+        if contiguous and self._remainder is not None:
+            data = np.hstack((self._remainder, data))
+
+        length = self.segment_length
+        hop = length // 2
+        n_samples = data.shape[1]
+        if n_samples < length:
+            self._remainder = data
+            return 0
+
+        starts = np.arange(0, n_samples - length + 1, hop)
+        self._remainder = data[:, starts[-1] + hop :]
+
+        # shape: (channel, segment, sample)
+        segments = data[:, starts[:, np.newaxis] + np.arange(length)]
+        segments -= segments.mean(axis=2, keepdims=True)
+        spectra = np.abs(np.fft.rfft(segments * self._window, axis=2)) ** 2
+        spectra *= self._scale / sample_rate
+        # one-sided spectrum: the power of negative frequencies is added. DC
+        # and (for even lengths) the Nyquist frequency don't have a counterpart
+        spectra[:, :, 1 : None if length % 2 else -1] *= 2
+
+        for segment_idx in range(len(starts)):
+            self._add_segment(spectra[:, segment_idx])
+
+        return len(starts)
+
+    def _add_segment(self, spectrum):
+        self.n_segments += 1
+
+        if self.averaging == PSD_AVERAGING_BOXCAR:
+            self._recent.append(spectrum)
+            while len(self._recent) > self.n_averages:
+                self._recent.popleft()
+        elif self._average is None:
+            self._average = spectrum.copy()
+        else:
+            # until `n_averages` segments were added, this is the plain mean
+            self._average += (spectrum - self._average) / min(
+                self.n_segments, self.n_averages
+            )
+
+    def get_spectra(self):
+        """Returns the averaged power spectral densities of all channels (in
+        units of the data squared per Hz) or `None` if no segment was
+        completed yet."""
+        if self.averaging == PSD_AVERAGING_BOXCAR:
+            if not self._recent:
+                return None
+            return np.mean(self._recent, axis=0)
+
+        return self._average
+
+
+class LockPSD:
+    """Calculates the power spectral densities of error and control signal
+    while the lock is running and publishes them in `parameters.psd`.
+
+    If somebody listens to the gapless stream, its chunks are used. Otherwise,
+    the snapshots recorded in locked state are used. As they are not
+    contiguous, segments can't be longer than `trace_length` in this case."""
+
+    def __init__(self, parameters, clock=monotonic):
+        self.parameters = parameters
+        self.clock = clock
+        self.welch = WelchPSD()
+        self.reset()
+
+        for param in (
+            parameters.psd_segment_length,
+            parameters.psd_averaging,
+            parameters.psd_n_averages,
+        ):
+            param.on_change(self.configure)
+        parameters.lock.on_change(self.reset)
+        parameters.lock.on_change(self.subscribe)
+
+    def configure(self, *args):
+        self.welch.configure(
+            self.parameters.psd_segment_length.value,
+            self.parameters.psd_averaging.value,
+            self.parameters.psd_n_averages.value,
+        )
+
+    def subscribe(self, locked):
+        # while the lock is running, the snapshots of error and control signal
+        # are needed (unless somebody subscribed to the stream)
+        self.parameters.channel_subscriptions.set_channels(
+            self, (CHANNEL_SIGNALS,) if locked else ()
+        )
+
+    def reset(self, *args):
+        self.welch.reset()
+        self._next_position = None
+        self._last_publish = self.clock()
+
+    def frame_received(self, frame):
+        if not frame.locked or len(frame.channels) != 2:
+            return
+
+        if frame.streaming:
+            contiguous = frame.stream_position == self._next_position
+            self._next_position = frame.stream_position + frame.n_points
+            sample_rate = CLOCK_FREQUENCY / frame.stream_decimation
+        elif CHANNEL_STREAM in self.parameters.fetched_channels.value:
+            # the snapshots overlap with the stream
+            return
+        else:
+            contiguous = False
+            # snapshots are recorded without decimation
+            sample_rate = CLOCK_FREQUENCY
+
+        self.welch.add(frame.channels, sample_rate, contiguous)
+
+        now = self.clock()
+        if self.welch.n_segments and now - self._last_publish >= PUBLISH_INTERVAL:
+            self._last_publish = now
+            self.publish()
+
+    def publish(self):
+        error_psd, control_psd = self.welch.get_spectra() * FAST_V ** 2
+        self.parameters.psd.value = pickle.dumps(
+            {
+                "sample_rate": self.welch.sample_rate,
+                "segment_length": self.welch.segment_length,
+                "n_segments": self.welch.n_segments,
+                "error_signal": error_psd.astype(np.float32),
+                "control_signal": control_psd.astype(np.float32),
+            }
+        )
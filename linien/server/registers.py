@@ -1,6 +1,6 @@
 import numpy as np
 
-from csr import PitayaCSR, make_filter
+from csr import PitayaCSR
 from utils import twos_complement
 from linien.config import DEFAULT_RAMP_SPEED
 from linien.common import (
@@ -20,14 +20,25 @@ class Registers:
     communicate by manipulating `Parameters` / `RemoteParameters`.
     """
 
-    def __init__(self, host=None, user=None, password=None):
+    def __init__(self, host=None, user=None, password=None, emulate=False):
         self.host = host
         self.user = user
         self.password = password
+        self.emulate = emulate
         self.acquisition = None
 
         self._last_sweep_speed = None
 
+        # register writes are collected in a batch that is sent to the
+        # acquisition process at once. Every batch gets a new generation number.
+        # The acquisition process tags every frame with the generation that was
+        # applied before recording it.
+        self.generation = 0
+        self._reset_batch()
+
+        # the coefficients that were last sent for every IIR filter
+        self._written_iir = {}
+
     def connect(self, control, parameters):
         """Starts a process that can be used to control FPGA registers."""
         self.control = control
@@ -47,8 +58,54 @@ class Registers:
 
         self.parameters.fetch_quadratures.on_change(fetch_quadratures_changed)
 
+        def trace_length_changed(v):
+            if self.acquisition is not None:
+                self.acquisition.trace_length_changed(v)
+
+        self.parameters.trace_length.on_change(trace_length_changed)
+
+        def roi_changed(v):
+            if self.acquisition is not None:
+                self.acquisition.roi_changed(v)
+
+        self.parameters.roi.on_change(roi_changed)
+
+        def decimation_mode_changed(v):
+            if self.acquisition is not None:
+                self.acquisition.decimation_mode_changed(v)
+
+        self.parameters.decimation_mode.on_change(decimation_mode_changed)
+
+        def averaging_changed(v):
+            if self.acquisition is not None:
+                self.acquisition.averaging_changed(
+                    self.parameters.averaging_n_sweeps.value,
+                    self.parameters.averaging_reject_outliers.value,
+                )
+
+        self.parameters.averaging_n_sweeps.on_change(averaging_changed)
+        self.parameters.averaging_reject_outliers.on_change(averaging_changed)
+
+        def record_both_sweep_directions_changed(v):
+            if self.acquisition is not None:
+                self.acquisition.record_both_sweep_directions_changed(v)
+
+        self.parameters.record_both_sweep_directions.on_change(
+            record_both_sweep_directions_changed
+        )
+
+        def stream_decimation_changed(v):
+            if self.acquisition is not None:
+                self.acquisition.stream_decimation_changed(v)
+
+        self.parameters.stream_decimation.on_change(stream_decimation_changed)
+
         use_ssh = self.host is not None and self.host not in ("localhost", "127.0.0.1")
-        self.acquisition = AcquisitionMaster(use_ssh, self.host)
+        self.acquisition = AcquisitionMaster(use_ssh, self.host, self.emulate)
+
+        # this listener is registered after starting the acquisition process
+        # because the acquisition process fetches all channels by default
+        self.parameters.fetched_channels.on_change(self.acquisition.channels_changed)
 
     def run_data_acquisition(self, on_change):
         """Starts a background process that continuously reads out error /
@@ -167,6 +224,7 @@ class Registers:
         if sweep_changed:
             self._last_sweep_speed = params["ramp_speed"]
             self.acquisition.set_ramp_speed(params["ramp_speed"])
+            self._ramp_speed_changed = True
 
         for k, v in new.items():
             self.set(k, int(v))
@@ -175,8 +233,7 @@ class Registers:
             # reset sweep for a short time if the scan range was changed
             # this is needed because otherwise it may take too long before
             # the new scan range is reached --> no scope trigger is sent
-            self.set("logic_sweep_run", 0)
-            self.set("logic_sweep_run", 1)
+            self.pulse("logic_sweep_run", 0)
 
         kp = params["p"]
         ki = params["i"]
@@ -245,18 +302,12 @@ class Registers:
                     base_freq = 125e6
 
                     if not filter_enabled:
-                        self.set_iir(iir_name, *make_filter("P", k=1))
+                        self.set_iir(iir_name, "P")
                     else:
                         if filter_type == LOW_PASS_FILTER:
-                            self.set_iir(
-                                iir_name,
-                                *make_filter("LP", f=filter_frequency / base_freq, k=1)
-                            )
+                            self.set_iir(iir_name, "LP", f=filter_frequency / base_freq)
                         elif filter_type == HIGH_PASS_FILTER:
-                            self.set_iir(
-                                iir_name,
-                                *make_filter("HP", f=filter_frequency / base_freq, k=1)
-                            )
+                            self.set_iir(iir_name, "HP", f=filter_frequency / base_freq)
                         else:
                             raise Exception(
                                 "unknown filter %s for %s" % (filter_type, iir_name)
@@ -276,6 +327,23 @@ class Registers:
                 self.set_pid(kp, ki, kd, slope)
                 self.set_slow_pid(slow_strength, slow_slope)
 
+        self.end_batch()
+
+    def end_batch(self):
+        """Sends the register values of this batch to the acquisition process.
+        If there were any changes, a new generation starts."""
+        if self._batch_csr or self._batch_pulses or self._ramp_speed_changed:
+            self.generation += 1
+            self.acquisition.set_csr_batch(
+                self.generation, self._batch_csr, self._batch_pulses
+            )
+        self._reset_batch()
+
+    def _reset_batch(self):
+        self._batch_csr = {}
+        self._batch_pulses = []
+        self._ramp_speed_changed = False
+
     def set_pid(self, p, i, d, slope, reset=None, request_lock=None):
         if request_lock is not None:
             self.set("logic_request_lock", request_lock)
@@ -296,7 +364,20 @@ class Registers:
             self.set("slow_pid_reset", reset)
 
     def set(self, key, value):
-        self.acquisition.set_csr(key, value)
-
-    def set_iir(self, *args):
-        self.acquisition.set_iir_csr(*args)
+        # if a register is set multiple times in one batch, only the last
+        # value is written
+        self._batch_csr[key] = value
+
+    def set_iir(self, name, filter_type, f=0.0):
+        """Sets the coefficients of an IIR filter. Nothing is written if they
+        didn't change since the last call."""
+        registers = self.csr.get_iir_registers(name, filter_type, f=f)
+        if registers != self._written_iir.get(name):
+            for key, value in registers.items():
+                self.set(key, value)
+            self._written_iir[name] = registers
+
+    def pulse(self, key, value):
+        """Sets a register to `value` for a short time. Afterwards, it is
+        restored to the value that was set before."""
+        self._batch_pulses.append((key, value))
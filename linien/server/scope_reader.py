@@ -0,0 +1,79 @@
+import os
+import mmap
+import numpy as np
+
+# physical address of the scope module of the FPGA
+SCOPE_BASE_ADDRESS = 0x40100000
+# every signal recorded by the scope has a buffer of 2 ** 14 samples
+SCOPE_BUFFER_LENGTH = 1 << 14
+# offsets of the scope buffers relative to `SCOPE_BASE_ADDRESS`. Every 32 bit
+# word of a buffer contains two signals:
+#   2'h0,adc_b_rd,2'h0,adc_a_rd
+# i.e.: 2 zero bits, signal b (14 bit), 2 zero bits, signal a (14 bit).
+# The first buffer contains the in-phase signals, the second one the
+# quadratures.
+SCOPE_BUFFER_OFFSETS = (0x10000, 0x20000)
+
+
+class ScopeReader:
+    """Reads the scope buffers using a memory map of the FPGA's address space.
+
+    The memory map is created once, reading a trace then only consists of
+    copying it to a preallocated buffer. By default, `/dev/mem` is mapped. For
+    testing, `path` may point to a regular file with the same layout (and
+    `base_address` should be 0 in this case)."""
+
+    def __init__(self, path="/dev/mem", base_address=SCOPE_BASE_ADDRESS):
+        map_length = SCOPE_BUFFER_OFFSETS[-1] + 4 * SCOPE_BUFFER_LENGTH
+
+        # O_SYNC makes sure that the mapping of /dev/mem is not cached
+        fd = os.open(path, os.O_RDONLY | os.O_SYNC)
+        try:
+            self._mmap = mmap.mmap(
+                fd, map_length, mmap.MAP_SHARED, mmap.PROT_READ, offset=base_address
+            )
+        finally:
+            os.close(fd)
+
+        # one read-only view per buffer. Each 32 bit word is split into two
+        # 16 bit ints, i.e. signals a and b are interleaved
+        self._buffers = [
+            np.frombuffer(
+                self._mmap, dtype=np.int16, count=2 * SCOPE_BUFFER_LENGTH, offset=offset
+            )
+            for offset in SCOPE_BUFFER_OFFSETS
+        ]
+        self._out = np.empty(
+            (len(SCOPE_BUFFER_OFFSETS), 2 * SCOPE_BUFFER_LENGTH), dtype=np.int16
+        )
+
+    def read(self, buffer_idx, start, length):
+        """Reads `length` samples of the buffer with index `buffer_idx`,
+        starting at sample `start` and wrapping around at the end of the buffer.
+
+        Returns a tuple containing signal a and signal b. These arrays are
+        strided views of a preallocated buffer, i.e. they are only valid until
+        the next call of `read` for the same `buffer_idx`."""
+        assert length <= SCOPE_BUFFER_LENGTH
+
+        raw = self._buffers[buffer_idx]
+        out = self._out[buffer_idx, : 2 * length]
+
+        start %= SCOPE_BUFFER_LENGTH
+        first_length = min(length, SCOPE_BUFFER_LENGTH - start)
+        out[: 2 * first_length] = raw[2 * start : 2 * (start + first_length)]
+        if first_length < length:
+            # wraparound
+            out[2 * first_length :] = raw[: 2 * (length - first_length)]
+
+        # sign bit is at position 14, but we have 16 bit ints whose upper two
+        # bits are zero. Shifting left and back (arithmetically) sign-extends
+        np.left_shift(out, 2, out=out)
+        np.right_shift(out, 2, out=out)
+
+        # order is such that we have first the signal a then signal b
+        return out[0::2], out[1::2]
+
+    def close(self):
+        del self._buffers
+        self._mmap.close()
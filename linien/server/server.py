@@ -6,18 +6,34 @@ import rpyc
 import click
 import _thread
 import pickle
+import threading
+import traceback
 import numpy as np
+from time import monotonic
 
 from rpyc.utils.server import ThreadedServer
 from rpyc.utils.authenticators import AuthenticationError
-from random import random
 
 from autolock import Autolock
 from parameters import Parameters
 
 from linien.config import DEFAULT_SERVER_PORT
-from linien.common import update_control_signal_history, N_POINTS, pack, unpack
+from linien.frame_format import encode_frame
+from linien.common import (
+    update_control_signal_history,
+    pack,
+    unpack,
+    FrameTracer,
+)
 from linien.server.optimization.optimization import OptimizeSpectroscopy
+from linien.server.channels import CHANNEL_SIGNALS, CHANNEL_SLOW
+from linien.server.trigger_timing import CLOCK_FREQUENCY
+from linien.server.psd import LockPSD
+from linien.server.telemetry import get_telemetry
+
+# how often the threads that push the listener queues check whether their client
+# is still connected (in s)
+LISTENER_PUSH_TIMEOUT = 1
 
 
 class BaseService(rpyc.Service):
@@ -30,9 +46,20 @@ class BaseService(rpyc.Service):
 
     def on_connect(self, client):
         self._uuid_mapping[client] = client.root.uuid
+        # rpyc compresses every large message it sends. For frames, which hardly
+        # compress, this costs more CPU time than anything else that is done
+        # per client. rpyc has no option for this, `_channel` is internal (see
+        # the rpyc version in `setup_server.py`). If it changes, compression just
+        # stays enabled
+        channel = getattr(client, "_channel", None)
+        if hasattr(channel, "compress"):
+            channel.compress = False
 
     def on_disconnect(self, client):
-        uuid = self._uuid_mapping[client]
+        uuid = self._uuid_mapping.pop(client)
+        # first, such that the acquisition stops fetching the channels even if
+        # removing the listeners fails
+        self.parameters.channel_subscriptions.unsubscribe(uuid)
         self.parameters.unregister_remote_listeners(uuid)
 
     def exposed_get_param(self, param_name):
@@ -44,12 +71,66 @@ class BaseService(rpyc.Service):
     def exposed_get_all_parameters(self):
         return self.parameters.get_all_parameters()
 
-    def exposed_register_remote_listener(self, uuid, param_name):
-        return self.parameters.register_remote_listener(uuid, param_name)
+    def exposed_register_remote_listener(
+        self, uuid, param_name, max_rate=None, decimation=1
+    ):
+        # listening to some parameters requires the acquisition process to
+        # fetch the corresponding channels
+        self.parameters.channel_subscriptions.subscribe_to_parameter(uuid, param_name)
+        return self.parameters.register_remote_listener(
+            uuid, param_name, max_rate, decimation
+        )
+
+    def exposed_subscribe_channels(self, uuid, channels):
+        """Requests the acquisition of `channels` (see `linien.server.channels`)
+        for a client that reads acquired data without registering a listener.
+        The subscription ends when the client disconnects."""
+        self.parameters.channel_subscriptions.subscribe(uuid, channels)
 
     def exposed_get_listener_queue(self, uuid):
         return self.parameters.get_listener_queue(uuid)
 
+    def exposed_get_listener_queue_stats(self, uuid):
+        """Returns how many changes are queued for client `uuid` and how many
+        were collapsed or dropped so far, see `ListenerQueue`."""
+        return pack(self.parameters.get_listener_queue_stats(uuid))
+
+    def exposed_push_listener_queue(self, uuid):
+        """Pushes the listener queue of client `uuid` to the `notify` method
+        of its service as soon as a parameter changes. This replaces polling
+        `get_listener_queue`. While a push is in progress, further changes are
+        collected and sent in the next batch."""
+        (client,) = [c for c, u in self._uuid_mapping.items() if u == uuid]
+
+        t = threading.Thread(target=self._push_listener_queue, args=(client, uuid))
+        t.daemon = True
+        t.start()
+
+    def _push_listener_queue(self, client, uuid):
+        notify = client.root.notify
+
+        while client in self._uuid_mapping:
+            if self.parameters.wait_for_listener_queue(uuid, LISTENER_PUSH_TIMEOUT):
+                try:
+                    notify(self.parameters.get_listener_queue(uuid))
+                except Exception:
+                    # closing a connection while sending raises different
+                    # exceptions, depending on when it happens
+                    if client.closed:
+                        break
+                    # otherwise, the client didn't answer in time or a value
+                    # couldn't be sent. We close the connection such that the
+                    # client notices that it doesn't get updates anymore
+                    print("error while pushing changes to client %s:" % uuid)
+                    traceback.print_exc()
+                    client.close()
+                    break
+
+    def exposed_get_monotonic_time(self):
+        """Used by the clients for converting timestamps of frame traces to
+        their clock."""
+        return monotonic()
+
 
 class RedPitayaControlService(BaseService):
     """Control server that runs on the RP that provides high-level methods."""
@@ -57,6 +138,7 @@ class RedPitayaControlService(BaseService):
     def __init__(self, **kwargs):
         self._cached_data = {}
         self.exposed_is_locked = None
+        self.required_generation = 0
 
         super().__init__()
 
@@ -65,42 +147,93 @@ class RedPitayaControlService(BaseService):
         self.registers = Registers(**kwargs)
         self.registers.connect(self, self.parameters)
 
+        self.lock_psd = LockPSD(self.parameters)
+        # latencies of the frames that are sent to the clients
+        self.frame_tracer = FrameTracer()
+
+        # the control signal history is recorded while the lock is running,
+        # even if nobody listens to it
+        self.parameters.lock.on_change(self._subscribe_history_channels)
+        self.parameters.pid_on_slow_enabled.on_change(self._subscribe_history_channels)
+
+    def _subscribe_history_channels(self, *args):
+        channels = []
+        if self.parameters.lock.value:
+            channels.append(CHANNEL_SIGNALS)
+            if self.parameters.pid_on_slow_enabled.value:
+                channels.append(CHANNEL_SLOW)
+        self.parameters.channel_subscriptions.set_channels(
+            "control_signal_history", channels
+        )
+
     def run_acquiry_loop(self):
         """Starts a background process that keeps polling control and error
         signal. Every received value is pushed to `parameters.to_plot`."""
 
-        def data_received(plot_data, data_uuid):
+        def stream_received(frame):
+            error_signal, control_signal = frame.channels
+            pickled = pickle.dumps(
+                {
+                    "error_signal": error_signal,
+                    "control_signal": control_signal,
+                    "position": frame.stream_position,
+                    "sample_rate": CLOCK_FREQUENCY / frame.stream_decimation,
+                    "overruns": frame.stream_overruns,
+                }
+            )
+            if frame.is_valid():
+                self.parameters.stream_data.value = pickled
+
+        def data_received(frame):
+            if frame.streaming:
+                # the stream is not paused when registers are written
+                # because it should be gapless
+                self.lock_psd.frame_received(frame)
+                stream_received(frame)
+                return
+
             # When a parameter is changed, `pause_acquisition` is set.
             # This means that the we should skip new data until we are sure that
-            # it was recorded with the new settings.
+            # it was recorded with the new settings, i.e. until the frame's
+            # generation is at least `required_generation`.
             if not self.parameters.pause_acquisition.value:
-                if data_uuid != self.data_uuid:
+                if frame.generation < self.required_generation:
                     return
 
-                # TODO: acquisition_process pickles this data, server unpickles it again. Can everything be done in acquisition_process?
-                data_loaded = pickle.loads(plot_data)
                 is_locked = self.parameters.lock.value
 
-                if is_locked:
-                    if len(data_loaded) != 3:
-                        print(
-                            "warning: too much data received for is_locked state, ignoring!"
-                        )
-                        return
+                if is_locked != frame.locked:
+                    print("warning: received data for wrong lock state, ignoring!")
+                    return
+
+                if frame.telemetry:
+                    self.parameters.lock_telemetry.value = get_telemetry(frame)
 
-                    s1, s2, slow_out = data_loaded
+                if not frame.channels:
+                    # nobody subscribed to the signals
+                    return
+
+                # `frame.channels` are views of the shared memory frame ring.
+                # They are only copied once, when encoding them.
+                if is_locked:
+                    self.lock_psd.frame_received(frame)
+                    s1, s2 = frame.channels
                     data = {"error_signal": s1, "control_signal": s2}
-                    if self.parameters.pid_on_slow_enabled.value:
-                        data["slow"] = slow_out
+                    if self.parameters.pid_on_slow_enabled.value and (
+                        CHANNEL_SLOW in self.parameters.fetched_channels.value
+                    ):
+                        data["slow"] = frame.slow_value
                 else:
-                    s1, s2 = data_loaded[0], data_loaded[1]
-                    slow_out = data_loaded[-1]
+                    s1, s2 = frame.channels[0], frame.channels[1]
                     data = {
                         "error_signal_1": s1,
                         "error_signal_2": s2,
+                        "sweep_down": frame.sweep_down,
                     }
-                    if len(data_loaded) == 5:
-                        s1q, s2q = data_loaded[2], data_loaded[3]
+                    if frame.n_points != frame.trace_length:
+                        data["roi"] = (frame.roi_start, frame.trace_length)
+                    if len(frame.channels) == 4:
+                        s1q, s2q = frame.channels[2], frame.channels[3]
                         data.update(
                             {
                                 "error_signal_1_quadrature": s1q,
@@ -108,7 +241,18 @@ class RedPitayaControlService(BaseService):
                             }
                         )
 
-                self.parameters.to_plot.value = pickle.dumps(data)
+                data["locked"] = is_locked
+                # the clients complete the trace (see `RemoteParameters`)
+                data["trace"] = frame.trace
+                encoded = encode_frame(data)
+                if not frame.is_valid():
+                    # the acquisition process was faster than us and has
+                    # already overwritten the frame
+                    return
+
+                self.parameters.to_plot.value = encoded
+                frame.trace["listener_queued"] = monotonic()
+                self.frame_tracer.add(frame.trace)
 
                 self.parameters.control_signal_history.value = (
                     update_control_signal_history(
@@ -186,6 +330,22 @@ class RedPitayaControlService(BaseService):
     def exposed_get_restorable_parameters(self):
         return self.parameters._restorable_parameters
 
+    def exposed_get_acquisition_latency(self):
+        """Returns statistics about the time (in seconds) between reading a
+        frame from the FPGA and its arrival in the server."""
+        return self.registers.acquisition.latency.get_stats()
+
+    def exposed_get_frame_latency_histograms(self):
+        """Returns (pickled) histograms of the time frames spend in the stages
+        between the scope trigger and the listener queues of the clients, see
+        `linien.common.FrameTracer`."""
+        return pack(self.frame_tracer.get_histograms())
+
+    def exposed_get_missed_sweeps_per_second(self):
+        """Returns how many sweeps per second were not recorded because the
+        acquisition process didn't rearm the scope in time."""
+        return self.registers.acquisition.missed_sweeps_per_second
+
     def exposed_pause_acquisition(self):
         self.pause_acquisition()
 
@@ -198,14 +358,12 @@ class RedPitayaControlService(BaseService):
         reach the application. After setting the new parameter values, call
         `continue_acquisition`."""
         self.parameters.pause_acquisition.value = True
-        self.data_uuid = random()
 
     def continue_acquisition(self):
-        """Continue acquisition after a short delay, when we are sure that the
-        new parameters values have been written to the FPGA and that data that
-        is now recorded is recorded with the correct parameters."""
+        """Continue acquisition as soon as data arrives that was recorded
+        after the new parameter values have been written to the FPGA."""
+        self.required_generation = self.registers.generation
         self.parameters.pause_acquisition.value = False
-        self.registers.acquisition.clear_data_cache(self.data_uuid)
 
 
 class FakeRedPitayaControl(BaseService):
@@ -224,8 +382,9 @@ class FakeRedPitayaControl(BaseService):
         def run():
             while True:
                 max_ = randint(0, 8191)
-                gen = lambda: np.array([randint(-max_, max_) for _ in range(N_POINTS)])
-                self.parameters.to_plot.value = pickle.dumps(
+                n_points = self.parameters.trace_length.value
+                gen = lambda: np.array([randint(-max_, max_) for _ in range(n_points)])
+                self.parameters.to_plot.value = encode_frame(
                     {
                         "error_signal_1": gen(),
                         "error_signal_1_quadrature": gen(),
@@ -277,12 +436,21 @@ class FakeRedPitayaControl(BaseService):
     "as follows: "
     "--remote-rp=root:myPassword@rp-f0xxxx.local",
 )
-def run_server(port, fake=False, remote_rp=False):
+@click.option(
+    "--emulate",
+    is_flag=True,
+    help="Runs the server without a RedPitaya. FPGA and laser are emulated, "
+    "see linien/server/emulator",
+)
+def run_server(port, fake=False, remote_rp=False, emulate=False):
     print("start server at port", port)
 
     if fake:
         print("starting fake server")
         control = FakeRedPitayaControl()
+    elif emulate:
+        print("starting server with emulated RedPitaya")
+        control = RedPitayaControlService(emulate=True)
     else:
         if remote_rp is not None:
             assert (
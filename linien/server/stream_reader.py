@@ -0,0 +1,94 @@
+from time import monotonic
+
+from linien.server.scope_reader import SCOPE_BUFFER_LENGTH
+from linien.server.trigger_timing import CLOCK_FREQUENCY, MIN_POLL_INTERVAL
+
+# samples that are older than this many samples before the write pointer are
+# not read because the FPGA may overwrite them while we copy them
+SAFETY_MARGIN = SCOPE_BUFFER_LENGTH // 8
+# we poll the write pointer such that the buffer is at most this fraction full
+POLL_FRACTION = 1 / 4
+
+
+class StreamReader:
+    """Reads a gapless stream of samples from the scope buffer.
+
+    In streaming mode, the scope never triggers and keeps writing to its buffer
+    which is thereby used as a ring buffer. Every call of `read` returns the
+    samples that were written since the previous call, i.e. all samples
+    between two successive write pointers.
+
+    The write pointer wraps around after `SCOPE_BUFFER_LENGTH` samples. If
+    `read` isn't called in time, samples are overwritten before they were read.
+    This is detected by comparing the elapsed time with the sample rate. In this
+    case, the unreliable samples are skipped, `n_overruns` is incremented and
+    `position` jumps forward such that it stays the index of the next sample
+    since the stream was started."""
+
+    def __init__(self, scope_reader, buffer_idx=0, clock=monotonic):
+        self.scope_reader = scope_reader
+        self.buffer_idx = buffer_idx
+        self.clock = clock
+
+        self.decimation = 1
+        self.n_overruns = 0
+        self.n_lost_samples = 0
+        self.start(0)
+
+    @property
+    def sample_rate(self):
+        return CLOCK_FREQUENCY / self.decimation
+
+    @property
+    def poll_interval(self):
+        """How long to sleep between two calls of `read`."""
+        buffer_duration = SCOPE_BUFFER_LENGTH / self.sample_rate
+        return max(POLL_FRACTION * buffer_duration, MIN_POLL_INTERVAL)
+
+    def start(self, write_pointer, decimation=None):
+        """Starts a new stream. Call this directly after the scope was armed
+        with the current `write_pointer` and the scope's `decimation`."""
+        if decimation is not None:
+            self.decimation = decimation
+        self.position = 0
+        self._write_pointer = write_pointer
+        self._last_read = self.clock()
+
+    def read(self, write_pointer):
+        """Returns a tuple `(position, (a, b))` where `position` is the index
+        of the first of the new samples of signals `a` and `b` in the stream.
+
+        The arrays are only valid until the scope reader is used the next time.
+        If no new samples are available or if they were overwritten, `None` is
+        returned."""
+        now = self.clock()
+        elapsed_samples = (now - self._last_read) * self.sample_rate
+        n_new = (write_pointer - self._write_pointer) % SCOPE_BUFFER_LENGTH
+        start = self._write_pointer + 1
+
+        self._last_read = now
+        self._write_pointer = write_pointer
+
+        if elapsed_samples > SCOPE_BUFFER_LENGTH - SAFETY_MARGIN:
+            # the write pointer may have wrapped around several times. The true
+            # number of samples is `n_new` plus a multiple of the buffer length
+            n_wraps = max(round((elapsed_samples - n_new) / SCOPE_BUFFER_LENGTH), 0)
+            n_skipped = n_new + n_wraps * SCOPE_BUFFER_LENGTH
+            self.n_overruns += 1
+            self.n_lost_samples += n_skipped
+            self.position += n_skipped
+            return None
+
+        if n_new == 0:
+            return None
+
+        position = self.position
+        self.position += n_new
+        return position, self.scope_reader.read(self.buffer_idx, start, n_new)
+
+    def read_latest(self, write_pointer, length):
+        """Returns the last `length` samples before `write_pointer` without
+        advancing the stream."""
+        return self.scope_reader.read(
+            self.buffer_idx, write_pointer - length + 1, length
+        )
@@ -0,0 +1,47 @@
+from linien.common import FAST_V
+
+# the signals of the logic module are 25 bit wide. Their upper 14 bits
+# correspond to the values of the fast in- and outputs.
+SIGNAL_WIDTH = 25
+SIGNAL_SHIFT = SIGNAL_WIDTH - 14
+
+# signals whose hardware peak detectors are read. Maps the name used in frame
+# headers and in `Parameters.lock_telemetry` to the prefix of the CSRs (see
+# `cross_connect` in gateware/logic/chains.py).
+TELEMETRY_SIGNALS = {
+    "control_signal": "logic_control_signal",
+    "error_signal": "logic_combined_error_signal",
+}
+
+
+def to_signed(value, width=SIGNAL_WIDTH):
+    if value >= 1 << (width - 1):
+        value -= 1 << width
+    return value
+
+
+def read_peak_detectors(csr):
+    """Reads the minimum and maximum of the telemetry signals since the last
+    call and clears the peak detectors afterwards.
+
+    Returns a dict of frame header fields (`<signal>_min` and `<signal>_max`)
+    containing the raw signed values."""
+    fields = {}
+    for name, prefix in TELEMETRY_SIGNALS.items():
+        fields[name + "_min"] = to_signed(csr.get(prefix + "_min"))
+        fields[name + "_max"] = to_signed(csr.get(prefix + "_max"))
+        csr.strobe(prefix + "_clr")
+    return fields
+
+
+def get_telemetry(frame):
+    """Converts the peak values of a frame to a dict that maps the names of
+    the signals to a tuple `(minimum, maximum)` in V."""
+    scale = FAST_V / (1 << SIGNAL_SHIFT)
+    return {
+        name: (
+            getattr(frame, name + "_min") * scale,
+            getattr(frame, name + "_max") * scale,
+        )
+        for name in TELEMETRY_SIGNALS
+    }
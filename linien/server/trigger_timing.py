@@ -0,0 +1,157 @@
+from math import ceil
+from time import monotonic
+
+from linien.common import clip_roi
+from linien.config import DEFAULT_RAMP_SPEED
+from linien.server.scope_reader import SCOPE_BUFFER_LENGTH
+
+# clock frequency of the FPGA
+CLOCK_FREQUENCY = 125e6
+# number of additional bits of the sweep's accumulator (see `SweepCSR` in
+# gateware/linien.py)
+SWEEP_STEP_SHIFT = 24
+
+# we wake up this fraction of a sweep period before the data is expected to be
+# ready (but not earlier than `MAX_EARLY_WAKEUP` seconds)
+EARLY_WAKEUP = 0.05
+MAX_EARLY_WAKEUP = 0.005
+# limits for the poll interval (in seconds) if we don't know when to expect
+# the trigger or if it's late
+MIN_POLL_INTERVAL = 0.0005
+MAX_POLL_INTERVAL = 0.05
+# if both parts of the sweep are recorded, only this fraction of the trace (in
+# its center) is recorded (see `get_both_directions_roi`)
+BOTH_DIRECTIONS_TRACE_FRACTION = 0.5
+
+
+def get_sweep_period(ramp_speed):
+    """Returns the duration of a full sweep period (up and down) in seconds.
+
+    The sweep step that is written by `Registers` is proportional to the ramp
+    amplitude. Therefore, the period doesn't depend on the amplitude."""
+    step = DEFAULT_RAMP_SPEED / (2 ** ramp_speed)
+    half_period_cycles = 2 * 8191 * (1 << SWEEP_STEP_SHIFT) / step
+    return 2 * half_period_cycles / CLOCK_FREQUENCY
+
+
+def get_both_directions_roi(roi, trace_length):
+    """Returns the region of interest `(start, length)` that is recorded if both
+    parts of the sweep are recorded: the intersection of `roi` (see
+    `clip_roi`) with the central part of the trace.
+
+    Both parts are read from a single recording that is triggered at the
+    beginning of the rising part. If the full trace was recorded, this
+    recording would end shortly before the next sweep period begins, leaving no
+    time for reading the data and rearming the scope."""
+    window_length = int(trace_length * BOTH_DIRECTIONS_TRACE_FRACTION)
+    window_start = (trace_length - window_length) // 2
+    start, length = roi
+    end = min(start + length, window_start + window_length)
+    start = max(start, window_start)
+    if end <= start:
+        # `roi` lies outside the recorded part
+        start, end = window_start, window_start + window_length
+    return clip_roi((start, end - start), trace_length)
+
+
+def get_falling_part_offset(ramp_speed, decimation, start, end):
+    """Returns the position of the falling part of the sweep in a recording
+    that is triggered at the beginning of the rising part.
+
+    `start` and `end` are the positions of the samples of the rising part that
+    are read. The returned position is the one of the samples of the falling
+    part that cover the same range of the sweep (in reversed order). `None` is
+    returned if these samples don't fit into the scope's buffer."""
+    period = round(get_sweep_period(ramp_speed) * CLOCK_FREQUENCY / decimation)
+    # sample `period - i` has the same sweep value as sample `i`
+    if period - start + 1 > SCOPE_BUFFER_LENGTH:
+        return None
+    return period - end + 1
+
+
+class TriggerTimer:
+    """Predicts when the scope has finished recording after it was armed.
+
+    The scope is triggered once per sweep period. Every time a finished
+    recording is seen, the phase of the sweep is estimated. After rearming,
+    `get_sleep_time` then returns how long to sleep until just before the next
+    recording is expected to be finished. If the phase is unknown or if the
+    recording is late, short adaptive poll intervals are returned instead.
+
+    Additionally, the number of sweeps that were missed (because the scope
+    wasn't armed in time) is counted. `missed_sweeps_per_second` is updated
+    about once per second."""
+
+    def __init__(self, clock=monotonic):
+        self.clock = clock
+
+        self.period = None
+        self.record_time = None
+        self.missed_sweeps_per_second = 0
+
+        self.reset()
+
+        self._missed_sweeps = 0
+        self._stats_start = self.clock()
+
+    def reset(self):
+        """Forgets the phase of the sweep. Call this if the sweep may have been
+        restarted."""
+        self._last_trigger = None
+        self._armed_at = None
+
+    def set_sweep(self, period, record_time):
+        """Sets the sweep period and the time the scope needs for recording
+        after it was triggered (both in seconds)."""
+        if period != self.period or record_time != self.record_time:
+            self.period = period
+            self.record_time = record_time
+            self.reset()
+
+    @property
+    def poll_interval(self):
+        """The poll interval that is used if we don't know when to expect the
+        trigger."""
+        if self.period is None:
+            return MAX_POLL_INTERVAL
+        return min(max(self.period / 8, MIN_POLL_INTERVAL), MAX_POLL_INTERVAL)
+
+    def armed(self):
+        """Call this directly after the scope was armed."""
+        self._armed_at = self.clock()
+
+    def triggered(self):
+        """Call this when a finished recording was seen."""
+        now = self.clock()
+        trigger = now - (self.record_time or 0)
+
+        if self._last_trigger is not None and self.period:
+            n_sweeps = round((trigger - self._last_trigger) / self.period)
+            self._missed_sweeps += max(n_sweeps - 1, 0)
+
+        self._last_trigger = trigger
+        self._armed_at = None
+
+        elapsed = now - self._stats_start
+        if elapsed >= 1:
+            self.missed_sweeps_per_second = self._missed_sweeps / elapsed
+            self._missed_sweeps = 0
+            self._stats_start = now
+
+    def get_sleep_time(self):
+        """Returns how long to sleep before checking the trigger again."""
+        if self._last_trigger is None or self._armed_at is None or not self.period:
+            return self.poll_interval
+
+        # the first trigger after arming the scope is the one that is recorded
+        n_periods = max(ceil((self._armed_at - self._last_trigger) / self.period), 1)
+        expected = self._last_trigger + n_periods * self.period + self.record_time
+        wake_up = expected - min(EARLY_WAKEUP * self.period, MAX_EARLY_WAKEUP)
+
+        now = self.clock()
+        if now < wake_up:
+            return wake_up - now
+
+        # the recording is late: poll with an interval that grows the longer
+        # we wait
+        return min(max((now - wake_up) / 4, MIN_POLL_INTERVAL), self.poll_interval)
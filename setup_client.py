@@ -7,6 +7,8 @@ assert linien.__version__ != "dev"
 with open("README.md", "r") as fh:
     long_description = fh.read()
 
+# `PushServingThread` in `linien.client.connection` sets the intervals of rpyc
+# 4.1.5's `BgServingThread`, check it when updating rpyc
 with open("requirements_client", "r") as fh:
     requirements = fh.read().split(" ")
 
@@ -20,6 +20,9 @@ setuptools.setup(
         "Operating System :: OS Independent",
     ],
     install_requires=[
+        # `BaseService.on_connect` disables compression using internals and
+        # `PushServingThread` sets the intervals of rpyc 4.1.5's
+        # `BgServingThread`. Check both when updating rpyc
         "rpyc==4.1.5",
         "myhdl==0.11",
         "click==7.1.2",
@@ -1,6 +1,6 @@
 from ast import Param
-import pickle
-from linien.common import get_lock_point
+from linien.common import N_POINTS, clip_roi, get_lock_point
+from linien.frame_format import encode_frame
 import numpy as np
 from linien.server.autolock import Autolock
 from linien.server.parameters import Parameter, Parameters
@@ -82,8 +82,11 @@ def test_autolock():
                 shift = target_shift * (1 + (0.05 * np.random.randn()))
                 error_signal = _get_signal(shift)[:]
 
-                parameters.to_plot.value = pickle.dumps(
-                    {"error_signal_1": error_signal, "error_signal_2": []}
+                parameters.to_plot.value = encode_frame(
+                    {
+                        "error_signal_1": error_signal,
+                        "error_signal_2": np.zeros_like(error_signal),
+                    }
                 )
 
                 if control.locked:
@@ -93,5 +96,58 @@ def test_autolock():
             assert parameters.ramp_amplitude.value == 0.125
 
 
+def test_autolock_roi():
+    parameters = Parameters()
+    control = FakeControl(parameters)
+    # number of points that were read per sweep
+    n_points_read = []
+
+    def get_spectrum(shift):
+        # spectra with the default trace length
+        signal = get_signal(
+            parameters.ramp_amplitude.value, parameters.center.value, shift
+        )
+        return signal[:: len(signal) // N_POINTS]
+
+    def get_frame(shift):
+        error_signal = get_spectrum(shift)
+        # like the acquisition process, only read the region of interest
+        start, length = clip_roi(parameters.roi.value, N_POINTS)
+        n_points_read.append(length)
+        data = {"error_signal_1": error_signal[start : start + length]}
+        data["error_signal_2"] = np.zeros_like(data["error_signal_1"])
+        if length != N_POINTS:
+            data["roi"] = (start, N_POINTS)
+        return encode_frame(data)
+
+    ref_shift, target_shift = 0.3, -0.3
+    reference_signal = get_spectrum(ref_shift)
+    autolock = Autolock(control, parameters, wait_time_between_current_corrections=0)
+    center_point = int((N_POINTS / 2) - ((ref_shift / 2) * N_POINTS))
+    autolock.run(
+        int(center_point - (0.01 * N_POINTS)),
+        int(center_point + (0.01 * N_POINTS)),
+        reference_signal,
+        should_watch_lock=True,
+        auto_offset=True,
+    )
+
+    for i in range(25):
+        shift = target_shift * (1 + (0.005 * np.random.randn()))
+        parameters.to_plot.value = get_frame(shift)
+        if control.locked:
+            break
+
+    assert control.locked
+    # the full trace is read until the line is centered, then only the region
+    # around it
+    assert n_points_read[0] == N_POINTS
+
+    assert min(n_points_read) < N_POINTS / 2 + N_POINTS / 4
+    # the lock needs the full trace again
+    assert parameters.roi.value is None
+
+
 if __name__ == "__main__":
     test_autolock()
+    test_autolock_roi()
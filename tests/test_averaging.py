@@ -0,0 +1,108 @@
+import sys
+import threading
+
+import numpy as np
+from linien.server.averaging import MAX_AVERAGING_SWEEPS, SweepAverager
+from linien.server.parameters import Parameters
+
+
+def random_sweep(n_points=2048):
+    return [np.random.randint(-8192, 8192, n_points).astype(np.int16)]
+
+
+def test_averaging():
+    averager = SweepAverager(n_sweeps=4)
+    sweeps = [random_sweep() for _ in range(4)]
+
+    for sweep in sweeps[:3]:
+        assert averager.add(sweep, generation=1) is None
+    averaged = averager.add(sweeps[3], generation=1)
+
+    expected = np.floor(np.mean([s[0] for s in sweeps], axis=0) + 0.5)
+    assert np.all(averaged[0] == expected)
+    assert averager.n_averaged == 4
+
+    # the next average starts from scratch
+    assert averager.add(random_sweep(), generation=1) is None
+    assert averager.count == 1
+
+
+def test_averaging_generation_change():
+    averager = SweepAverager(n_sweeps=2)
+    assert averager.add(random_sweep(), generation=1) is None
+    # the register values changed: the old sweep is discarded
+    assert averager.add(random_sweep(), generation=2) is None
+    assert averager.add(random_sweep(), generation=2) is not None
+
+
+def test_outlier_rejection():
+    n_sweeps = 8
+    signal = (1000 * np.sin(np.linspace(0, 10, 2048))).astype(np.int16)
+
+    def noisy_sweep():
+        return [signal + np.random.randint(-10, 10, len(signal)).astype(np.int16)]
+
+    for reject_outliers in (False, True):
+        averager = SweepAverager(n_sweeps=n_sweeps, reject_outliers=reject_outliers)
+        for _ in range(n_sweeps - 1):
+            assert averager.add(noisy_sweep()) is None
+        glitched = noisy_sweep()
+        glitched[0][500:600] = 8000
+        averaged = averager.add(glitched)
+
+        error = np.abs(averaged[0] - signal).max()
+        if reject_outliers:
+            assert averager.n_averaged == n_sweeps - 1
+            assert error < 20
+        else:
+            assert averager.n_averaged == n_sweeps
+            assert error > 500
+
+
+def test_configure_while_adding():
+    # the acquisition process adds sweeps while the server may change the
+    # settings at any time
+    averager = SweepAverager(n_sweeps=2)
+    sweeps = [random_sweep(), random_sweep()]
+    stop = threading.Event()
+    errors = []
+
+    def reconfigure():
+        while not stop.is_set():
+            for reject_outliers in (False, True):
+                averager.configure(3, reject_outliers)
+                averager.reset()
+
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    thread = threading.Thread(target=reconfigure)
+    thread.start()
+    try:
+        for idx in range(20000):
+            try:
+                averager.add(sweeps[idx % 2], generation=1)
+            except Exception as e:
+                errors.append(e)
+                break
+    finally:
+        stop.set()
+        thread.join()
+        sys.setswitchinterval(switch_interval)
+
+    assert not errors
+
+
+def test_n_sweeps_limit():
+    parameters = Parameters()
+    parameters.averaging_n_sweeps.value = 10 ** 5
+    assert parameters.averaging_n_sweeps.value == MAX_AVERAGING_SWEEPS
+    parameters.averaging_n_sweeps.value = 0
+    assert parameters.averaging_n_sweeps.value == 1
+
+
+if __name__ == "__main__":
+    test_averaging()
+    test_averaging_generation_change()
+    test_outlier_rejection()
+    test_configure_while_adding()
+    test_n_sweeps_limit()
@@ -0,0 +1,78 @@
+from linien.server.channels import (
+    CHANNEL_QUADRATURES,
+    CHANNEL_SIGNALS,
+    CHANNEL_SLOW,
+)
+from linien.server.parameters import Parameters
+
+
+def test_channel_subscriptions():
+    parameters = Parameters()
+    subscriptions = parameters.channel_subscriptions
+    # the error signals are always fetched
+    assert parameters.fetched_channels.value == {CHANNEL_SIGNALS}
+
+    changes = []
+    parameters.fetched_channels.on_change(changes.append)
+    changes.clear()
+
+    # a client that listens to `to_plot`
+    subscriptions.subscribe_to_parameter("client", "to_plot")
+    assert parameters.fetched_channels.value == {
+        CHANNEL_SIGNALS,
+        CHANNEL_QUADRATURES,
+    }
+    # listening to other parameters doesn't require any data
+    subscriptions.subscribe_to_parameter("client", "center")
+
+    subscriptions.subscribe("autolock", (CHANNEL_SIGNALS, CHANNEL_SLOW))
+    assert parameters.fetched_channels.value == {
+        CHANNEL_SIGNALS,
+        CHANNEL_QUADRATURES,
+        CHANNEL_SLOW,
+    }
+
+    subscriptions.unsubscribe("client")
+    assert parameters.fetched_channels.value == {CHANNEL_SIGNALS, CHANNEL_SLOW}
+
+    subscriptions.unsubscribe("autolock")
+    assert parameters.fetched_channels.value == {CHANNEL_SIGNALS}
+    # unsubscribing twice doesn't hurt
+    subscriptions.unsubscribe("autolock")
+
+    # listeners are only called if the channels changed
+    assert len(changes) == 4
+
+    # the channels of a subscriber may be replaced
+    subscriptions.set_channels("history", (CHANNEL_SIGNALS, CHANNEL_SLOW))
+    subscriptions.set_channels("history", (CHANNEL_SLOW,))
+    assert parameters.fetched_channels.value == {CHANNEL_SIGNALS, CHANNEL_SLOW}
+    subscriptions.set_channels("history", ())
+    assert parameters.fetched_channels.value == {CHANNEL_SIGNALS}
+
+
+def test_disconnect_without_listeners():
+    # a client that reads telemetry without registering any listener
+    parameters = Parameters()
+    parameters.channel_subscriptions.subscribe("client", (CHANNEL_SLOW,))
+    assert parameters.fetched_channels.value == {CHANNEL_SIGNALS, CHANNEL_SLOW}
+
+    # what `BaseService.on_disconnect` does
+    parameters.channel_subscriptions.unsubscribe("client")
+    parameters.unregister_remote_listeners("client")
+    assert parameters.fetched_channels.value == {CHANNEL_SIGNALS}
+
+    # a client with listeners
+    parameters.channel_subscriptions.subscribe_to_parameter("client", "to_plot")
+    parameters.register_remote_listener("client", "to_plot")
+    parameters.channel_subscriptions.unsubscribe("client")
+    parameters.unregister_remote_listeners("client")
+    assert parameters.fetched_channels.value == {CHANNEL_SIGNALS}
+    assert parameters.get_listener_queue("client") == ()
+    # unregistering twice doesn't hurt
+    parameters.unregister_remote_listeners("client")
+
+
+if __name__ == "__main__":
+    test_channel_subscriptions()
+    test_disconnect_without_listeners()
@@ -0,0 +1,45 @@
+from linien.server.csr_queue import CSRQueue
+
+
+def apply(batches):
+    """Returns the writes in the order the acquisition process does them."""
+    writes = []
+    for csr, pulses in batches:
+        writes += [("set", key, value) for key, value in csr.items()]
+        writes += [("pulse", key, value) for key, value in pulses]
+    return writes
+
+
+def test_merge_values():
+    queue = CSRQueue()
+    queue.put(1, {"a": 1, "b": 1}, [])
+    queue.put(2, {"a": 2}, [("reset", 1)])
+
+    batches, generation = queue.pop()
+    assert generation == 2
+    assert apply(batches) == [("set", "a", 2), ("set", "b", 1), ("pulse", "reset", 1)]
+
+    # the queue is empty now, the generation is kept
+    assert queue.pop() == ([], 2)
+
+
+def test_values_after_pulses():
+    queue = CSRQueue()
+    queue.put(1, {"logic_sweep_run": 1}, [("logic_sweep_run", 0)])
+    queue.put(2, {"logic_sweep_run": 0, "b": 1}, [])
+    queue.put(3, {"b": 2}, [])
+
+    batches, generation = queue.pop()
+    assert generation == 3
+    # the values of later batches are written after the pulse
+    assert apply(batches) == [
+        ("set", "logic_sweep_run", 1),
+        ("pulse", "logic_sweep_run", 0),
+        ("set", "logic_sweep_run", 0),
+        ("set", "b", 2),
+    ]
+
+
+if __name__ == "__main__":
+    test_merge_values()
+    test_values_after_pulses()
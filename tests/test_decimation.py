@@ -0,0 +1,90 @@
+import numpy as np
+from linien.common import DECIMATION_MODE_MEAN, DECIMATION_MODE_ENVELOPE
+from linien.frame_format import decode_frame, encode_frame
+from linien.server.decimation import decimate, decimate_frame, decimate_history
+
+
+def test_decimate_mean():
+    data = np.random.randint(-8192, 8192, 16384).astype(np.int16)
+
+    for factor in (2, 4, 8, 64):
+        decimated = decimate(data, factor, DECIMATION_MODE_MEAN)
+        expected = np.floor(data.reshape(-1, factor).mean(axis=1) + 0.5)
+        assert decimated.dtype == np.int32
+        assert len(decimated) == len(data) // factor
+        assert np.all(decimated == expected)
+
+    assert decimate(data, 1) is data
+
+
+def test_decimate_strided_view():
+    # the scope reader returns strided views of interleaved data
+    interleaved = np.random.randint(-8192, 8192, 2 * 16384).astype(np.int16)
+    a, b = interleaved[0::2], interleaved[1::2]
+    assert np.all(decimate(a, 4) == decimate(a.copy(), 4))
+    assert np.all(decimate(b, 4) == decimate(b.copy(), 4))
+
+
+def test_decimate_envelope():
+    data = np.zeros(16384, dtype=np.int16)
+    # a narrow line that would be averaged away by the mean decimation
+    data[1000] = 8000
+    data[5000] = -8000
+
+    factor = 16
+    envelope = decimate(data, factor, DECIMATION_MODE_ENVELOPE)
+    mean = decimate(data, factor, DECIMATION_MODE_MEAN)
+
+    assert len(envelope) == len(mean) == len(data) // factor
+    assert envelope.max() == 8000
+    assert envelope.min() == -8000
+    assert mean.max() == 500
+
+    # minimum and maximum are stored in the order they occur
+    ramp = np.concatenate([np.arange(64), np.arange(64)[::-1]]).astype(np.int16)
+    envelope = decimate(ramp, 32, DECIMATION_MODE_ENVELOPE)
+    assert list(envelope) == [0, 63, 63, 0]
+
+
+def test_decimate_frame():
+    error_signal = np.arange(1001, dtype=np.int16)
+    frame = encode_frame(
+        {
+            "error_signal": error_signal,
+            "control_signal": -error_signal,
+            "locked": True,
+            "roi": (100, 2000),
+            "trace": {"id": 3, "trigger": 1.5},
+        }
+    )
+    decimated = decode_frame(decimate_frame(frame, 4))
+
+    # the last point is dropped, halves are rounded up
+    assert list(decimated["error_signal"]) == list(range(2, 1000, 4))
+    assert list(decimated["control_signal"]) == list(range(-1, -1000, -4))
+    assert decimated["locked"]
+    assert decimated["roi"] == (25, 500)
+    assert decimated["trace"] == {"id": 3, "trigger": 1.5}
+
+    assert decimate_frame(None, 4) is None
+
+
+def test_decimate_history():
+    history = {
+        "times": list(range(10)),
+        "values": list(range(10)),
+        "slow_times": [],
+        "slow_values": [],
+    }
+    decimated = decimate_history(history, 4)
+    # the most recent point is kept
+    assert decimated["times"] == decimated["values"] == [1, 5, 9]
+    assert decimated["slow_times"] == decimated["slow_values"] == []
+
+
+if __name__ == "__main__":
+    test_decimate_mean()
+    test_decimate_strided_view()
+    test_decimate_envelope()
+    test_decimate_frame()
+    test_decimate_history()
@@ -0,0 +1,134 @@
+import numpy as np
+import pytest
+
+from linien.server.csrmap import signals as SIGNALS
+from linien.server.emulator.model import DEFAULT_LINES, LaserModel
+from linien.server.emulator.virtual_pitaya import VirtualRedPitaya
+from linien.server.scope_reader import SCOPE_BUFFER_LENGTH, ScopeReader
+from linien.server.telemetry import SIGNAL_SHIFT, to_signed
+from linien.server.trigger_timing import SWEEP_STEP_SHIFT
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def set_registers(rp, **values):
+    for name, value in values.items():
+        rp.registers.set(name, value)
+
+
+def create_red_pitaya(clock, **laser_kwargs):
+    rp = VirtualRedPitaya(LaserModel(seed=0, **laser_kwargs), clock=clock)
+    set_registers(
+        rp,
+        logic_sweep_min=-8191,
+        logic_sweep_max=8191,
+        # one half of the sweep takes exactly one buffer length
+        logic_sweep_step=2 * 8191 * (1 << SWEEP_STEP_SHIFT) // SCOPE_BUFFER_LENGTH,
+        logic_sweep_run=1,
+        logic_mod_amp=4096,
+        scopegen_adc_a_sel=SIGNALS.index("logic_combined_error_signal"),
+        scopegen_adc_b_sel=SIGNALS.index("logic_control_signal"),
+    )
+    return rp
+
+
+def test_sweep():
+    clock = FakeClock()
+    rp = create_red_pitaya(clock, detection_noise=0, frequency_noise=0, drift=0)
+    reader = ScopeReader(rp.scope.memory_path, base_address=0)
+    try:
+        rp.scope.rearm(trigger_source=6)
+        rp.scope.data_decimation = 1
+        rp.scope.trigger_delay = SCOPE_BUFFER_LENGTH - 1
+
+        # the recording isn't finished yet
+        assert rp.scope.read(0x1 << 2) == 6
+        clock.now += 1e-3
+        assert rp.scope.read(0x1 << 2) == 0
+
+        error_signal, control_signal = reader.read(
+            0, rp.scope.write_pointer_trigger, SCOPE_BUFFER_LENGTH
+        )
+        assert np.all(control_signal == 0)
+
+        # the rising part of the sweep shows a dispersive signal at the position
+        # of every line
+        positions = np.linspace(-1, 1, SCOPE_BUFFER_LENGTH)
+        for line in DEFAULT_LINES:
+            idx = np.argmin(np.abs(positions - line.position))
+            assert error_signal[idx - 10] > 0 > error_signal[idx + 10]
+        assert np.abs(error_signal).max() > 1000
+    finally:
+        reader.close()
+        rp.scope.close()
+
+
+def test_lock():
+    clock = FakeClock()
+    rp = create_red_pitaya(clock)
+    reader = ScopeReader(rp.scope.memory_path, base_address=0)
+    try:
+        # start slightly next to the line and lock
+        line = DEFAULT_LINES[1]
+        center = int((line.position + 0.005) * 8192)
+        set_registers(
+            rp,
+            logic_out_offset=center,
+            logic_pid_ki=1000,
+            logic_pid_kp=100,
+            logic_request_lock=1,
+        )
+        lock_running_address = rp.registers.get_address("logic_lock_running")
+        assert rp.read(lock_running_address) == 1
+
+        rp.scope.rearm(trigger_source=6)
+        rp.scope.trigger_delay = SCOPE_BUFFER_LENGTH - 1
+        for _ in range(3):
+            clock.now += 0.1
+            error_signal, control_signal = reader.read(
+                0, rp.scope.write_pointer_trigger, SCOPE_BUFFER_LENGTH
+            )
+
+        # the integrator compensated the offset
+        assert abs(np.mean(error_signal)) < 10
+        assert np.mean(control_signal) / 8192 + center / 8192 == pytest.approx(
+            line.position, abs=0.001
+        )
+
+        # the peak detectors track the control signal until they are cleared
+        minimum = to_signed(rp.registers.get("logic_control_signal_min"))
+        maximum = to_signed(rp.registers.get("logic_control_signal_max"))
+        assert minimum >> SIGNAL_SHIFT <= control_signal.min()
+        assert maximum >> SIGNAL_SHIFT >= control_signal.max()
+        rp.write(rp.registers.get_address("logic_control_signal_clr"), 1)
+        assert rp.read(rp.registers.get_address("logic_control_signal_max")) == 0
+
+        # in continuous mode, the write pointer advances with the sample rate
+        rp.scope.data_decimation = 1024
+        rp.scope.rearm(trigger_source=0)
+        start = rp.scope.write_pointer_current
+        clock.now += 0.01
+        n_samples = int(0.01 * 125e6 / 1024)
+        assert (
+            rp.scope.write_pointer_current == (start + n_samples) % SCOPE_BUFFER_LENGTH
+        )
+        error_signal, _ = reader.read(0, start + 1, n_samples)
+        assert abs(np.mean(error_signal)) < 10
+
+        # turning off the lock
+        rp.write(rp.registers.get_address("logic_request_lock"), 0)
+        assert rp.read(lock_running_address) == 0
+    finally:
+        reader.close()
+        rp.scope.close()
+
+
+if __name__ == "__main__":
+    test_sweep()
+    test_lock()
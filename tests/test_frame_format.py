@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from linien.frame_format import (
+    FRAME_FORMAT_VERSION,
+    HEADER_DTYPE,
+    InvalidFrameException,
+    decode_frame,
+    encode_frame,
+)
+
+
+def test_sweep_frame():
+    channels = {
+        "error_signal_1": np.arange(-1000, 1000, dtype=np.int16),
+        "error_signal_2": np.full(2000, -8192, dtype=np.int16),
+        "error_signal_1_quadrature": np.arange(2000, dtype=np.int16),
+        "error_signal_2_quadrature": np.zeros(2000, dtype=np.int16),
+    }
+    encoded = encode_frame(
+        dict(
+            channels,
+            sweep_down=True,
+            roi=(100, 16384),
+            trace={"id": 17, "trigger": 1.5, "buffer_read": 1.75},
+        )
+    )
+    assert isinstance(encoded, bytes)
+    assert len(encoded) == HEADER_DTYPE.itemsize + 4 * 32 + 4 * 2000 * 2
+
+    frame = decode_frame(encoded)
+    for name, values in channels.items():
+        assert frame[name].dtype == np.int16
+        assert np.all(frame[name] == values)
+        # the channels are views of the encoded frame
+        assert not frame[name].flags.writeable
+        assert frame[name].base is not None
+    assert frame["sweep_down"]
+    assert not frame["locked"]
+    assert frame["roi"] == (100, 16384)
+    assert "slow" not in frame
+    assert frame["trace"] == {"id": 17, "trigger": 1.5, "buffer_read": 1.75}
+
+
+def test_locked_frame():
+    error_signal = np.random.randint(-8192, 8192, 512)
+    control_signal = np.random.randint(-8192, 8192, 512)
+    frame = decode_frame(
+        encode_frame(
+            {
+                "error_signal": error_signal,
+                "control_signal": control_signal,
+                "slow": -123,
+                "locked": True,
+            }
+        )
+    )
+    assert list(frame) == [
+        "error_signal",
+        "control_signal",
+        "locked",
+        "sweep_down",
+        "slow",
+    ]
+    assert np.all(frame["error_signal"] == error_signal)
+    assert np.all(frame["control_signal"] == control_signal)
+    assert frame["locked"]
+    assert frame["slow"] == -123
+
+
+def test_invalid_frames():
+    encoded = encode_frame({"error_signal": np.zeros(10)})
+
+    with pytest.raises(InvalidFrameException):
+        decode_frame(encoded[:10])
+    with pytest.raises(InvalidFrameException):
+        decode_frame(encoded[:-2])
+    with pytest.raises(InvalidFrameException):
+        decode_frame(b"XXXX" + encoded[4:])
+
+    header = np.frombuffer(encoded, dtype=HEADER_DTYPE, count=1).copy()
+    header["version"] = FRAME_FORMAT_VERSION + 1
+    with pytest.raises(InvalidFrameException):
+        decode_frame(header.tobytes() + encoded[HEADER_DTYPE.itemsize :])
+
+    with pytest.raises(AssertionError):
+        encode_frame({"a": np.zeros(10), "b": np.zeros(11)})
+
+
+if __name__ == "__main__":
+    test_sweep_frame()
+    test_locked_frame()
+    test_invalid_frames()
@@ -0,0 +1,68 @@
+import numpy as np
+from time import monotonic
+from linien.common import N_POINTS
+from linien.server.frame_ring import FrameRing, N_SLOTS
+
+
+def test_frame_ring():
+    ring = FrameRing()
+    reader = FrameRing(name=ring.name)
+
+    try:
+        assert reader.read(0) is None
+
+        channels = [np.arange(N_POINTS, dtype=np.int16) * (i + 1) for i in range(4)]
+        sequence = ring.write(channels, locked=False, slow_value=-123, generation=5)
+
+        frame = reader.read(sequence)
+        assert frame is not None
+        assert frame.generation == 5
+        assert 0 < frame.timestamp <= monotonic()
+        assert not frame.locked
+        assert frame.slow_value == -123
+        assert len(frame.channels) == 4
+        for channel, expected in zip(frame.channels, channels):
+            assert np.all(channel == expected)
+        assert frame.is_valid()
+        assert frame.get_header() == {
+            "generation": 5,
+            "locked": False,
+            "slow_value": -123,
+            "n_sweeps": 0,
+            "roi_start": 0,
+            "trace_length": 0,
+            "sweep_down": False,
+            "trigger_timestamp": 0,
+            "missed_sweeps_per_second": 0,
+            "streaming": False,
+            "stream_position": 0,
+            "stream_decimation": 0,
+            "stream_overruns": 0,
+            "telemetry": False,
+            "control_signal_min": 0,
+            "control_signal_max": 0,
+            "error_signal_min": 0,
+            "error_signal_max": 0,
+        }
+
+        # a frame with less channels
+        sequence = ring.write(channels[:2], locked=True)
+        frame2 = reader.read(sequence)
+        assert frame2.locked
+        assert len(frame2.channels) == 2
+        assert frame2.generation == 0
+
+        # after the ring wrapped around, the first frame is invalid
+        for i in range(N_SLOTS - 1):
+            ring.write(channels, slow_value=i)
+        assert not frame.is_valid()
+        assert reader.read(frame.sequence) is None
+
+        del frame, frame2
+    finally:
+        reader.close()
+        ring.close()
+
+
+if __name__ == "__main__":
+    test_frame_ring()
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from linien.common import FrameTracer, LatencyHistogram
+from linien.server.frame_ring import FrameRing
+
+
+def test_latency_histogram():
+    histogram = LatencyHistogram()
+    assert histogram.get_percentile(50) is None
+
+    for _ in range(98):
+        histogram.add(1e-3)
+    histogram.add(0.1)
+    histogram.add(100)
+
+    stats = histogram.get_stats()
+    assert stats["count"] == 100
+    assert sum(stats["counts"]) == 100
+    # the percentiles are the upper edges of the bins
+    assert stats["p50"] == pytest.approx(1e-3, rel=0.13)
+    assert stats["p50"] >= 1e-3
+    assert stats["p99"] == pytest.approx(0.1, rel=0.13)
+    # latencies outside of the range end up in the last bin
+    assert stats["counts"][-1] == 1
+
+
+def test_frame_tracer():
+    tracer = FrameTracer()
+    tracer.add({"id": 1, "trigger": 10.0, "buffer_read": 10.002, "pipe_send": 10.003})
+    # stages that are missing are skipped
+    tracer.add({"id": 2, "trigger": 20.0, "pipe_send": 20.5, "plotted": 21.0})
+
+    histograms = tracer.get_histograms()
+    assert set(histograms) == {"buffer_read", "pipe_send", "plotted", "total"}
+    assert histograms["buffer_read"]["count"] == 1
+    assert histograms["buffer_read"]["p50"] == pytest.approx(2e-3, rel=0.13)
+    assert histograms["pipe_send"]["count"] == 2
+    assert histograms["plotted"]["p50"] == pytest.approx(0.5, rel=0.13)
+    assert histograms["total"]["p99"] == pytest.approx(1, rel=0.13)
+    assert tracer.last_trace["id"] == 2
+
+    tracer.reset()
+    assert tracer.get_histograms() == {}
+
+
+def test_frame_ring_trace():
+    ring = FrameRing()
+    try:
+        channels = [np.zeros(16, dtype=np.int16)]
+        sequence = ring.write(channels, trigger_timestamp=12.5)
+        frame = ring.read(sequence)
+        assert frame.trace == {
+            "id": sequence,
+            "trigger": 12.5,
+            "buffer_read": frame.timestamp,
+        }
+
+        # frames without trigger timestamp, e.g. copied from a remote machine
+        frame = ring.read(ring.write(channels))
+        assert "trigger" not in frame.trace
+    finally:
+        ring.close()
+
+
+if __name__ == "__main__":
+    test_latency_histogram()
+    test_frame_tracer()
+    test_frame_ring_trace()
@@ -0,0 +1,192 @@
+import threading
+from time import monotonic, sleep
+
+import pytest
+
+from linien.common import unpack
+from linien.server.parameters import Parameters
+from linien.server.parameters_base import MAX_LISTENER_QUEUE_LENGTH, ListenerQueue
+
+
+def test_wait_for_listener_queue():
+    parameters = Parameters()
+    # no listeners are registered yet
+    assert not parameters.wait_for_listener_queue("client", timeout=0.01)
+
+    parameters.register_remote_listener("client", "ramp_speed")
+    # the initial value is queued
+    assert parameters.wait_for_listener_queue("client", timeout=0)
+    parameters.get_listener_queue("client")
+    assert not parameters.wait_for_listener_queue("client", timeout=0.01)
+
+    def change():
+        sleep(0.1)
+        parameters.ramp_speed.value = 3
+        parameters.ramp_speed.value = 4
+
+    t = threading.Thread(target=change)
+    t.start()
+    assert parameters.wait_for_listener_queue("client", timeout=5)
+    t.join()
+
+    # multiple values of collapsible parameters are sent only once
+    queue = parameters.get_listener_queue("client")
+    assert [(name, unpack(value)) for name, value, _ in queue] == [("ramp_speed", 4)]
+
+    parameters.unregister_remote_listeners("client")
+    parameters.ramp_speed.value = 5
+    assert not parameters.wait_for_listener_queue("client", timeout=0.01)
+    assert parameters.get_listener_queue("client") == ()
+
+
+def test_listener_queue():
+    queue = ListenerQueue(max_length=3)
+    queue.put("a", 1, True)
+    queue.put("stream", 0, False)
+    queue.put("b", 1, True)
+    queue.put("a", 2, True)
+    queue.put("stream", 1, False)
+    assert len(queue) == 4
+
+    # the latest value of a collapsible parameter is placed at its position
+    entries = queue.pop_due()
+    assert [(name, value) for name, value, _ in entries] == [
+        ("stream", 0),
+        ("b", 1),
+        ("a", 2),
+        ("stream", 1),
+    ]
+    assert len(queue) == 0 and queue.pop_due() == []
+
+    # non-collapsible values are dropped when the FIFO is full
+    for value in range(5):
+        queue.put("stream", value, False)
+    assert [value for _, value, _ in queue.pop_due()] == [2, 3, 4]
+    assert queue.get_stats() == {"length": 0, "collapsed": 1, "dropped": 2}
+
+
+def test_listener_queue_stats():
+    parameters = Parameters()
+    assert parameters.get_listener_queue_stats("client") is None
+
+    parameters.register_remote_listener("client", "ramp_speed")
+    for value in range(10):
+        parameters.ramp_speed.value = value
+    assert parameters.get_listener_queue_stats("client") == {
+        "length": 1,
+        "collapsed": 10,
+        "dropped": 0,
+    }
+
+    parameters.register_remote_listener("client", "stream_data")
+    for value in range(1000):
+        parameters.stream_data.value = value
+    stats = parameters.get_listener_queue_stats("client")
+    assert stats["length"] == 1 + MAX_LISTENER_QUEUE_LENGTH
+    assert stats["dropped"] == 1000 - MAX_LISTENER_QUEUE_LENGTH
+
+    queue = parameters.get_listener_queue("client")
+    assert queue[0][0] == "ramp_speed" and unpack(queue[0][1]) == 9
+    assert queue[-1][0] == "stream_data" and unpack(queue[-1][1]) == 999
+
+
+def test_values_are_packed_once():
+    parameters = Parameters()
+    for client in ("client1", "client2"):
+        parameters.register_remote_listener(client, "to_plot")
+        parameters.register_remote_listener(client, "control_signal_history")
+    parameters.get_listener_queue("client1")
+    parameters.get_listener_queue("client2")
+
+    parameters.to_plot.value = b"frame"
+    # a parameter that is changed in place has to be packed again
+    history = parameters.control_signal_history.value
+    history["values"].append(1)
+    parameters.control_signal_history.value = history
+
+    (to_plot_1, history_1), (to_plot_2, history_2) = [
+        [value for _, value, _ in parameters.get_listener_queue(client)]
+        for client in ("client1", "client2")
+    ]
+    # both clients share the same bytes
+    assert to_plot_1 is to_plot_2 and history_1 is history_2
+    assert unpack(to_plot_1) == b"frame"
+    assert unpack(history_1)["values"] == [1]
+
+
+def test_rate_limit():
+    queue = ListenerQueue()
+    queue.set_max_rate("to_plot", 10)
+    assert queue.get_delay() is None
+
+    queue.put("to_plot", 0, True)
+    assert queue.get_delay() == 0
+    assert [value for _, value, _ in queue.pop_due()] == [0]
+
+    # the next value is kept until it is due
+    queue.put("to_plot", 1, True)
+    queue.put("ramp_speed", 1, True)
+    assert [name for name, _, _ in queue.pop_due()] == ["ramp_speed"]
+    assert 0 < queue.get_delay() <= 0.1
+    queue.put("to_plot", 2, True)
+    assert queue.pop_due() == []
+
+    sleep(queue.get_delay())
+    assert queue.get_delay() == 0
+    assert [value for _, value, _ in queue.pop_due()] == [2]
+
+    queue.set_max_rate("to_plot", None)
+    queue.put("to_plot", 3, True)
+    assert queue.get_delay() == 0
+
+
+def test_register_with_max_rate_and_decimation():
+    parameters = Parameters()
+    history = parameters.control_signal_history.value
+    history["values"] = list(range(10))
+
+    parameters.register_remote_listener("client", "ramp_speed", max_rate=5)
+    parameters.register_remote_listener(
+        "logger", "control_signal_history", decimation=3
+    )
+    parameters.register_remote_listener(
+        "dashboard", "control_signal_history", decimation=3
+    )
+    for client in ("client", "logger", "dashboard"):
+        assert parameters.wait_for_listener_queue(client, timeout=0)
+        (value,) = [unpack(v) for _, v, _ in parameters.get_listener_queue(client)]
+        if client != "client":
+            assert value["values"] == [0, 3, 6, 9]
+
+    parameters.control_signal_history.value = history
+    (logger_value,) = [v for _, v, _ in parameters.get_listener_queue("logger")]
+    (dashboard_value,) = [v for _, v, _ in parameters.get_listener_queue("dashboard")]
+    # clients with the same decimation share the same bytes
+    assert logger_value is dashboard_value
+
+    # the value is delivered once it is due
+    parameters.ramp_speed.value = 3
+    start = monotonic()
+    assert parameters.wait_for_listener_queue("client", timeout=5)
+    assert monotonic() - start > 0.1
+    queue = parameters.get_listener_queue("client")
+    assert [(name, unpack(value)) for name, value, _ in queue] == [("ramp_speed", 3)]
+
+    # registering again changes the settings without sending the value again
+    parameters.register_remote_listener("client", "ramp_speed")
+    assert parameters.get_listener_queue("client") == ()
+    parameters.ramp_speed.value = 4
+    assert parameters.wait_for_listener_queue("client", timeout=0)
+
+    # only parameters that support it can be decimated
+    with pytest.raises(AssertionError):
+        parameters.register_remote_listener("client", "ramp_speed", decimation=2)
+
+
+if __name__ == "__main__":
+    test_wait_for_listener_queue()
+    test_listener_queue()
+    test_listener_queue_stats()
+    test_values_are_packed_once()
+    test_rate_limit()
+    test_register_with_max_rate_and_decimation()
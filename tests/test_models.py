@@ -0,0 +1,254 @@
+import numpy as np
+from migen import run_simulation
+
+from gateware.logic.cordic import Cordic
+from gateware.logic.iir import Iir
+from gateware.logic.limit import LimitCSR
+from gateware.logic.modulate import Demodulate, Modulate
+from gateware.logic.pid import PID
+from gateware.logic.sweep import SweepCSR
+from gateware.models.cordic import CordicModel
+from gateware.models.iir import IirModel
+from gateware.models.limit import LimitCSRModel
+from gateware.models.modulate import DemodulateModel, ModulateModel
+from gateware.models.pid import PIDModel
+from gateware.models.sweep import SweepCSRModel
+
+
+def simulate(dut, inputs, outputs, setup=(), n_samples=None):
+    """Runs the migen simulation of `dut`. `inputs` maps signals to arrays with
+    one value per clock cycle, `outputs` maps names to the signals that are
+    recorded. `setup` is a list of (signal, value) pairs that are written in
+    the first cycle.
+
+    Note that during the first cycle, all signals (and CSRs) still have their
+    reset values. The models therefore have to process one sample before their
+    parameters are set."""
+    if n_samples is None:
+        n_samples = len(next(iter(inputs.values())))
+    recorded = {name: [] for name in outputs}
+
+    def tb():
+        for signal, value in setup:
+            yield signal.eq(value)
+        for idx in range(n_samples):
+            for signal, values in inputs.items():
+                yield signal.eq(int(values[idx]))
+            yield
+            for name, signal in outputs.items():
+                recorded[name].append((yield signal))
+
+    run_simulation(dut, tb())
+    return {name: np.array(values) for name, values in recorded.items()}
+
+
+def unsigned(value, width):
+    return value & ((1 << width) - 1)
+
+
+def test_pid():
+    rng = np.random.default_rng(0)
+
+    for width in (14, 25):
+        for kp, ki, kd, setpoint in [
+            (4096, 0, 0, 0),
+            (-3000, 4096, 0, 0),
+            (1234, -8000, 8191, 100),
+        ]:
+            pid = PID(width=width)
+            x = rng.integers(-(1 << (width - 1)), 1 << (width - 1), 2000)
+            # drive the integrator into saturation
+            x[500:1500] = (1 << (width - 1)) - 1
+            out = simulate(
+                pid,
+                {pid.input: x},
+                {"y": pid.pid_out},
+                [
+                    (pid.kp.storage, unsigned(kp, 14)),
+                    (pid.ki.storage, unsigned(ki, 14)),
+                    (pid.kd.storage, unsigned(kd, 14)),
+                    (pid.setpoint.storage, setpoint),
+                    (pid.running, 1),
+                ],
+            )
+
+            model = PIDModel(width=width)
+            model.process([0])
+            model.kp, model.ki, model.kd = kp, ki, kd
+            model.setpoint, model.running = setpoint, 1
+            # processing in chunks has to give the same result
+            y = np.concatenate([model.process(x[:777]), model.process(x[777:])])
+            assert np.array_equal(y, out["y"])
+
+
+def test_limit():
+    rng = np.random.default_rng(1)
+
+    for guard in (0, 3):
+        limit = LimitCSR(width=16, guard=guard)
+        x = rng.integers(-(1 << (15 + guard)), 1 << (15 + guard), 500)
+        out = simulate(
+            limit,
+            {limit.x: x},
+            {"y": limit.y, "error": limit.error},
+            [(limit.min.storage, unsigned(-1000, 16)), (limit.max.storage, 3000)],
+        )
+
+        model = LimitCSRModel(16, guard)
+        model.process([0])
+        model.min, model.max = -1000, 3000
+        y, error = model.process(x)
+        assert np.array_equal(y, out["y"])
+        assert np.array_equal(error, out["error"])
+
+
+def test_iir():
+    rng = np.random.default_rng(2)
+
+    for order in (1, 2):
+        iir = Iir(order=order)
+        coefficients = {name: int(rng.integers(-(1 << 16), 1 << 16)) for name in iir.c}
+        x = rng.integers(-(1 << 24), 1 << 24, 1000)
+        setup = [
+            (getattr(iir, "r_" + name).storage, unsigned(value, 18))
+            for name, value in coefficients.items()
+        ]
+        out = simulate(
+            iir,
+            {iir.x: x},
+            {"y": iir.y, "error": iir.error},
+            setup + [(iir.z0.storage, 100)],
+        )
+        # the random coefficients have to be large enough to rail the output
+        assert out["error"].any()
+
+        model = IirModel(order=order)
+        model.process([0])
+        model.coefficients.update(coefficients)
+        model.z0 = 100
+        y, error = model.process(x)
+        assert np.array_equal(y, out["y"])
+        assert np.array_equal(error, out["error"])
+
+
+def test_cordic():
+    rng = np.random.default_rng(3)
+
+    cordic = Cordic(
+        width=15,
+        stages=15,
+        guard=2,
+        eval_mode="pipelined",
+        cordic_mode="rotate",
+        func_mode="circular",
+    )
+    xi, yi, zi = rng.integers(-(1 << 14), 1 << 14, (3, 500))
+    out = simulate(
+        cordic,
+        {cordic.xi: xi, cordic.yi: yi, cordic.zi: zi},
+        {"xo": cordic.xo, "yo": cordic.yo, "zo": cordic.zo},
+    )
+
+    model = CordicModel(width=15, stages=15, guard=2)
+    model.process([0], [0], [0])
+    for name, result in zip(("xo", "yo", "zo"), model.process(xi, yi, zi)):
+        assert np.array_equal(result, out[name])
+
+
+def test_modulate():
+    rng = np.random.default_rng(4)
+
+    modulate = Modulate(width=14)
+    x = rng.integers(-3000, 3000, 1000)
+    sync_phase = (rng.random(1000) < 0.01).astype(int)
+    out = simulate(
+        modulate,
+        {modulate.x: x, modulate.sync_phase: sync_phase},
+        {"y": modulate.y, "phase": modulate.phase},
+        [(modulate.amp.storage, 4000), (modulate.freq.storage, 123456789)],
+    )
+
+    model = ModulateModel()
+    model.process(n_samples=1)
+    model.amp, model.freq = 4000, 123456789
+    y, phase = model.process(x, sync_phase)
+    assert np.array_equal(y, out["y"])
+    assert np.array_equal(phase, out["phase"])
+
+    demodulate = Demodulate()
+    x = rng.integers(-8000, 8000, 1000)
+    phase = rng.integers(0, 1 << 14, 1000)
+    out = simulate(
+        demodulate,
+        {demodulate.x: x, demodulate.phase: phase},
+        {"i": demodulate.i, "q": demodulate.q},
+        [(demodulate.delay.storage, 777), (demodulate.multiplier.storage, 3)],
+    )
+
+    model = DemodulateModel()
+    model.process([0], [0])
+    model.delay, model.multiplier = 777, 3
+    i, q = model.process(x, phase)
+    assert np.array_equal(i, out["i"])
+    assert np.array_equal(q, out["q"])
+
+
+def test_sweep():
+    for step_shift, step, minimum, maximum in [
+        (0, 37, -500, 800),
+        (4, 300, -8192, 8191),
+        (8, 5, -100, 100),
+    ]:
+        sweep = SweepCSR(width=14, step_width=24, step_shift=step_shift)
+        run = np.ones(3000, dtype=int)
+        run[2000:2100] = 0
+        out = simulate(
+            sweep,
+            {sweep.run.storage: run},
+            {"y": sweep.y, "trigger": sweep.sweep.trigger},
+            [
+                (sweep.step.storage, step),
+                (sweep.min.storage, unsigned(minimum, 14)),
+                (sweep.max.storage, unsigned(maximum, 14)),
+            ],
+        )
+
+        model = SweepCSRModel(14, 24, step_shift)
+        model.process(1)
+        model.step, model.min, model.max = step, minimum, maximum
+        y, trigger = [], []
+        for start, stop, run in [(0, 2000, 1), (2000, 2100, 0), (2100, 3000, 1)]:
+            model.run = run
+            y_chunk, trigger_chunk = model.process(stop - start)
+            y.append(y_chunk)
+            trigger.append(trigger_chunk)
+        assert np.array_equal(np.concatenate(y), out["y"])
+        assert np.array_equal(np.concatenate(trigger), out["trigger"])
+
+
+def test_long_simulation():
+    # 10 ms of a fast sweep, i.e. more than a million clock cycles
+    model = SweepCSRModel(14, 24, 8)
+    model.step, model.run = 1 << 10, 1
+    y, trigger = model.process(1250000)
+    assert y.min() == -8192 and y.max() == 8191
+    assert trigger.sum() > 1
+
+    # the integrator of a PID saturates instead of wrapping around
+    model = PIDModel()
+    model.ki, model.running = 4096, 1
+    x = np.full(1 << 22, 1000)
+    x[1 << 21 :] = -1000
+    y = model.process(x)
+    assert y.max() == 8191 and y.min() == -8192
+    assert np.all(np.diff(y[10 : (1 << 21)]) >= 0)
+
+
+if __name__ == "__main__":
+    test_pid()
+    test_limit()
+    test_iir()
+    test_cordic()
+    test_modulate()
+    test_sweep()
+    test_long_simulation()
@@ -0,0 +1,161 @@
+import pickle
+import numpy as np
+from scipy.signal import welch
+
+from linien.common import FAST_V, PSD_AVERAGING_BOXCAR, PSD_AVERAGING_EXPONENTIAL
+from linien.server.channels import CHANNEL_SIGNALS, ChannelSubscriptions
+from linien.server.frame_ring import FrameRing
+from linien.server.parameters import Parameters
+from linien.server.psd import LockPSD, WelchPSD, PUBLISH_INTERVAL
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def generate_signals(n_samples, sample_rate):
+    t = np.arange(n_samples) / sample_rate
+    return [
+        np.random.normal(0, 100, n_samples) + 1000 * np.sin(2 * np.pi * 1e3 * t),
+        np.random.normal(0, 10, n_samples) + 5,
+    ]
+
+
+def test_welch_psd():
+    sample_rate = 1e5
+    segment_length = 256
+    signals = generate_signals(20000, sample_rate)
+
+    psd = WelchPSD(segment_length, PSD_AVERAGING_BOXCAR, n_averages=1000)
+    assert psd.get_spectra() is None
+
+    # adding contiguous blocks of arbitrary length is equivalent to processing
+    # everything at once
+    boundaries = [0, 100, 3000, 3001, 10000, 17777, 20000]
+    n_segments = 0
+    for start, stop in zip(boundaries, boundaries[1:]):
+        n_segments += psd.add(
+            [signal[start:stop] for signal in signals],
+            sample_rate,
+            contiguous=start > 0,
+        )
+    assert n_segments == psd.n_segments == 20000 // (segment_length // 2) - 1
+
+    frequencies, expected = welch(
+        np.array(signals), sample_rate, nperseg=segment_length, average="mean"
+    )
+    assert np.allclose(psd.frequencies, frequencies)
+    assert np.allclose(psd.get_spectra(), expected)
+
+    # the boxcar only contains the latest segments
+    psd.configure(segment_length, PSD_AVERAGING_BOXCAR, 10)
+    psd.add(signals, sample_rate)
+    hop = segment_length // 2
+    stop = (20000 - segment_length) // hop * hop + segment_length
+    last_samples = [signal[stop - 11 * hop : stop] for signal in signals]
+    _, expected = welch(np.array(last_samples), sample_rate, nperseg=segment_length)
+    assert np.allclose(psd.get_spectra(), expected)
+
+    # without `contiguous`, left-over samples are discarded
+    psd.configure(segment_length, PSD_AVERAGING_EXPONENTIAL, 1000)
+    assert psd.add([signal[:200] for signal in signals], sample_rate) == 0
+    assert psd.add([signal[200:400] for signal in signals], sample_rate) == 0
+    assert psd.add([signal[400:656] for signal in signals], sample_rate) == 1
+
+    # exponential averaging equals the mean until `n_averages` segments were
+    # added. After that, the latest segments dominate.
+    psd.configure(segment_length, PSD_AVERAGING_EXPONENTIAL, 20)
+    psd.add([signal[:2688] for signal in signals], sample_rate)
+    assert psd.n_segments == 20
+    _, expected = welch(
+        np.array([signal[:2688] for signal in signals]),
+        sample_rate,
+        nperseg=segment_length,
+    )
+    assert np.allclose(psd.get_spectra(), expected)
+
+    quiet = [np.zeros(100000), np.zeros(100000)]
+    psd.add(quiet, sample_rate, contiguous=True)
+    assert np.all(psd.get_spectra() < 1e-6 * expected.max())
+
+
+def test_lock_psd():
+    parameters = Parameters()
+    parameters.lock.value = True
+    parameters.psd_segment_length.value = 512
+    clock = FakeClock()
+    lock_psd = LockPSD(parameters, clock=clock)
+
+    published = []
+    parameters.psd.on_change(lambda value: published.append(pickle.loads(value)))
+
+    ring = FrameRing()
+    try:
+        signals = [signal.astype(np.int16) for signal in generate_signals(2048, 1e6)]
+
+        # sweeps are ignored
+        lock_psd.frame_received(ring.read(ring.write(signals, locked=False)))
+        assert lock_psd.welch.n_segments == 0
+
+        # a snapshot
+        lock_psd.frame_received(ring.read(ring.write(signals, locked=True)))
+        assert lock_psd.welch.n_segments == 7
+        assert not published
+
+        # chunks of a stream
+        clock.now += PUBLISH_INTERVAL
+        for position in (0, 2048):
+            frame = ring.read(
+                ring.write(
+                    signals,
+                    locked=True,
+                    streaming=True,
+                    stream_position=position,
+                    stream_decimation=1024,
+                )
+            )
+            lock_psd.frame_received(frame)
+        # the sample rate changed, i.e. the average was restarted. The second
+        # chunk is contiguous with the first one.
+        assert lock_psd.welch.n_segments == 7 + 8
+
+        assert len(published) == 1
+        spectrum = published[0]
+        assert spectrum["segment_length"] == 512
+        assert spectrum["sample_rate"] == 125e6 / 1024
+        assert len(spectrum["error_signal"]) == 257
+        _, expected = welch(np.array(signals), 125e6 / 1024, nperseg=512)
+        assert np.allclose(
+            spectrum["control_signal"], expected[1] * FAST_V ** 2, rtol=1e-5
+        )
+
+        # turning off the lock resets the spectra
+        parameters.lock.value = False
+        assert lock_psd.welch.n_segments == 0
+    finally:
+        ring.close()
+
+
+def test_lock_psd_subscription():
+    parameters = Parameters()
+    # without the default channels, only what `LockPSD` needs is fetched
+    parameters.channel_subscriptions = ChannelSubscriptions(
+        parameters.fetched_channels, default_channels=()
+    )
+    LockPSD(parameters)
+    assert parameters.fetched_channels.value == frozenset()
+
+    parameters.lock.value = True
+    assert parameters.fetched_channels.value == {CHANNEL_SIGNALS}
+    parameters.lock.value = False
+    assert parameters.fetched_channels.value == frozenset()
+
+
+if __name__ == "__main__":
+    test_welch_psd()
+    test_lock_psd()
+    test_lock_psd_subscription()
@@ -0,0 +1,27 @@
+import numpy as np
+from linien.common import clip_roi, expand_roi
+
+
+def test_clip_roi():
+    assert clip_roi(None, 2048) == (0, 2048)
+    assert clip_roi((100, 200), 2048) == (100, 200)
+    # start and length are even
+    assert clip_roi((101, 201), 2048) == (100, 200)
+    # the region of interest is clipped to the trace
+    assert clip_roi((-10, 100), 2048) == (0, 100)
+    assert clip_roi((2000, 100), 2048) == (2000, 48)
+    assert clip_roi((5000, 100), 2048) == (2046, 2)
+
+
+def test_expand_roi():
+    signal = np.arange(10)
+    expanded = expand_roi(signal, 20, 100)
+    assert len(expanded) == 100
+    assert np.all(expanded[20:30] == signal)
+    assert np.all(np.isnan(expanded[:20]))
+    assert np.all(np.isnan(expanded[30:]))
+
+
+if __name__ == "__main__":
+    test_clip_roi()
+    test_expand_roi()
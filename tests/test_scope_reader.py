@@ -0,0 +1,54 @@
+import numpy as np
+from linien.server.scope_reader import (
+    ScopeReader,
+    SCOPE_BUFFER_LENGTH,
+    SCOPE_BUFFER_OFFSETS,
+)
+
+
+def to_14_bit(values):
+    return np.array(values, dtype=np.int32) & ((1 << 14) - 1)
+
+
+def test_scope_reader(tmp_path):
+    # generate a file that mimics the scope's address space
+    signals = [
+        np.arange(SCOPE_BUFFER_LENGTH) % 16384 - 8192,
+        -1 * (np.arange(SCOPE_BUFFER_LENGTH) % 16384) + 8191,
+        np.random.randint(-8192, 8192, SCOPE_BUFFER_LENGTH),
+        np.random.randint(-8192, 8192, SCOPE_BUFFER_LENGTH),
+    ]
+    memory = np.zeros(
+        (SCOPE_BUFFER_OFFSETS[-1] + 4 * SCOPE_BUFFER_LENGTH) // 4, dtype=np.uint32
+    )
+    for buffer_idx, offset in enumerate(SCOPE_BUFFER_OFFSETS):
+        a, b = signals[2 * buffer_idx], signals[2 * buffer_idx + 1]
+        memory[offset // 4 : offset // 4 + SCOPE_BUFFER_LENGTH] = (
+            to_14_bit(b) << 16
+        ) | to_14_bit(a)
+
+    path = tmp_path / "scope_memory"
+    memory.tofile(path)
+
+    reader = ScopeReader(str(path), base_address=0)
+
+    for buffer_idx in range(len(SCOPE_BUFFER_OFFSETS)):
+        expected_a = signals[2 * buffer_idx]
+        expected_b = signals[2 * buffer_idx + 1]
+
+        # without wraparound
+        a, b = reader.read(buffer_idx, 100, 2048)
+        assert np.all(a == expected_a[100 : 100 + 2048])
+        assert np.all(b == expected_b[100 : 100 + 2048])
+
+        # with wraparound
+        start = SCOPE_BUFFER_LENGTH - 1000
+        a, b = reader.read(buffer_idx, start, 2048)
+        assert np.all(a == np.hstack((expected_a[start:], expected_a[:1048])))
+        assert np.all(b == np.hstack((expected_b[start:], expected_b[:1048])))
+
+        # full buffer
+        a, b = reader.read(buffer_idx, 5, SCOPE_BUFFER_LENGTH)
+        assert np.all(a == np.roll(expected_a, -5))
+
+    reader.close()
@@ -0,0 +1,91 @@
+import numpy as np
+from linien.server.scope_reader import SCOPE_BUFFER_LENGTH
+from linien.server.stream_reader import StreamReader
+from linien.server.trigger_timing import CLOCK_FREQUENCY
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeScope:
+    """Mimics the scope writing a continuous signal to its ring buffer and
+    implements `ScopeReader.read` for it."""
+
+    def __init__(self):
+        self.buffer = np.zeros(SCOPE_BUFFER_LENGTH, dtype=np.int64)
+        self.n_written = 0
+
+    @property
+    def write_pointer(self):
+        return (self.n_written - 1) % SCOPE_BUFFER_LENGTH
+
+    def record(self, n_samples):
+        for _ in range(n_samples):
+            self.buffer[self.n_written % SCOPE_BUFFER_LENGTH] = self.n_written
+            self.n_written += 1
+
+    def read(self, buffer_idx, start, length):
+        idxs = (start + np.arange(length)) % SCOPE_BUFFER_LENGTH
+        return self.buffer[idxs], -1 * self.buffer[idxs]
+
+
+def test_stream_reader():
+    clock = FakeClock()
+    scope = FakeScope()
+    decimation = 1024
+    sample_time = decimation / CLOCK_FREQUENCY
+
+    scope.record(10)
+    reader = StreamReader(scope, clock=clock)
+    reader.start(scope.write_pointer, decimation)
+    assert reader.sample_rate == CLOCK_FREQUENCY / decimation
+    assert reader.poll_interval < SCOPE_BUFFER_LENGTH * sample_time
+
+    def record(n_samples):
+        scope.record(n_samples)
+        clock.now += n_samples * sample_time
+
+    # nothing new
+    assert reader.read(scope.write_pointer) is None
+
+    # read the stream in chunks of different sizes, including wraparounds
+    stream = []
+    for n_samples in (100, 5000, 12000, 1, 9000, 7000):
+        record(n_samples)
+        position, (a, b) = reader.read(scope.write_pointer)
+        assert position == len(stream)
+        assert len(a) == n_samples
+        assert np.all(b == -a)
+        stream += list(a)
+
+    # the stream is gapless
+    assert stream == list(range(10, 10 + len(stream)))
+    assert reader.n_overruns == 0
+
+    # the buffer overflows --> data is skipped
+    position_before = reader.position
+    record(3 * SCOPE_BUFFER_LENGTH + 123)
+    assert reader.read(scope.write_pointer) is None
+    assert reader.n_overruns == 1
+    assert reader.n_lost_samples == 3 * SCOPE_BUFFER_LENGTH + 123
+    assert reader.position == position_before + reader.n_lost_samples
+
+    # afterwards, the stream continues
+    record(500)
+    position, (a, b) = reader.read(scope.write_pointer)
+    assert position == scope.n_written - 10 - 500
+    assert a[0] == scope.n_written - 500
+
+    # the latest samples may be read without advancing the stream
+    a, b = reader.read_latest(scope.write_pointer, 2048)
+    assert list(a) == list(range(scope.n_written - 2048, scope.n_written))
+    assert reader.read(scope.write_pointer) is None
+
+
+if __name__ == "__main__":
+    test_stream_reader()
@@ -50,3 +50,37 @@ def test_sweep():
 
     for i in range(400):
         assert trig[69 + i] == 0
+
+
+def test_sweep_direction():
+    def tb(sweep, n):
+        yield sweep.step.storage.eq(1 << 4)
+        yield sweep.max.storage.eq(1 << 10)
+        yield sweep.min.storage.eq(0xFFFF & (-(1 << 10)))
+        yield sweep.run.storage.eq(1)
+        for i in range(n):
+            yield
+            out.append((yield sweep.sweep.y))
+            trig.append((yield sweep.sweep.trigger))
+            direction.append((yield sweep.sweep.direction))
+
+    n = 600
+    out = []
+    trig = []
+    direction = []
+    dut = SweepCSR(width=16)
+    run_simulation(dut, tb(dut, n))
+
+    # direction is 1 while the sweep rises and 0 while it falls
+    for i in range(1, n):
+        if out[i] > out[i - 1]:
+            assert direction[i] == 1
+        elif out[i] < out[i - 1]:
+            assert direction[i] == 0
+
+    # the rising edges of direction coincide with the ones of the trigger
+    rising_edges = [i for i in range(1, n) if direction[i] and not direction[i - 1]]
+    assert rising_edges == [i for i in range(1, n) if trig[i] and not trig[i - 1]]
+    assert len(rising_edges) >= 2
+    # there is a falling edge between two rising edges
+    assert 0 in direction[rising_edges[0] : rising_edges[1]]
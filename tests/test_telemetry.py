@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from linien.common import FAST_V
+from linien.server.autolock import Autolock
+from linien.server.frame_ring import FrameRing
+from linien.server.parameters import Parameters
+from linien.server.telemetry import (
+    SIGNAL_SHIFT,
+    SIGNAL_WIDTH,
+    get_telemetry,
+    read_peak_detectors,
+    to_signed,
+)
+
+
+class FakeCSR:
+    def __init__(self, values):
+        self.values = values
+        self.strobed = []
+
+    def get(self, name):
+        return self.values[name]
+
+    def strobe(self, name):
+        self.strobed.append(name)
+
+
+def test_to_signed():
+    assert to_signed(0) == 0
+    assert to_signed(5) == 5
+    assert to_signed((1 << SIGNAL_WIDTH) - 1) == -1
+    assert to_signed(1 << (SIGNAL_WIDTH - 1)) == -(1 << (SIGNAL_WIDTH - 1))
+
+
+def test_telemetry():
+    # control signal between -0.5 V and 0.25 V, error signal between -1 mV and
+    # 2 mV. The CSRs contain 25 bit two's complement values.
+    def raw(volts):
+        return int(volts / FAST_V) << SIGNAL_SHIFT & ((1 << SIGNAL_WIDTH) - 1)
+
+    csr = FakeCSR(
+        {
+            "logic_control_signal_min": raw(-0.5),
+            "logic_control_signal_max": raw(0.25),
+            "logic_combined_error_signal_min": raw(-0.001),
+            "logic_combined_error_signal_max": raw(0.002),
+        }
+    )
+    fields = read_peak_detectors(csr)
+    assert set(csr.strobed) == {
+        "logic_control_signal_clr",
+        "logic_combined_error_signal_clr",
+    }
+
+    ring = FrameRing()
+    try:
+        frame = ring.read(ring.write([], locked=True, telemetry=True, **fields))
+        assert frame.telemetry
+        telemetry = get_telemetry(frame)
+    finally:
+        ring.close()
+
+    assert telemetry["control_signal"] == (-0.5, 0.25)
+    assert telemetry["error_signal"][0] == pytest.approx(-0.001, abs=FAST_V)
+    assert telemetry["error_signal"][1] == pytest.approx(0.002, abs=FAST_V)
+
+    # the autolock may use the telemetry instead of the traces
+    parameters = Parameters()
+    autolock = Autolock(None, parameters)
+    control_signal = np.ones(2048) * 0.1 * 8192
+
+    assert autolock.get_control_signal_level(control_signal) == pytest.approx(
+        (0.1, 0.1)
+    )
+    parameters.lock_telemetry.value = telemetry
+    assert autolock.get_control_signal_level(control_signal) == pytest.approx(
+        (0.1, 0.1)
+    )
+    parameters.autolock_use_telemetry.value = True
+    assert autolock.get_control_signal_level(None) == pytest.approx((-0.125, 0.5))
+
+
+if __name__ == "__main__":
+    test_to_signed()
+    test_telemetry()
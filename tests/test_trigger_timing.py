@@ -0,0 +1,177 @@
+from math import ceil
+
+import numpy as np
+import pytest
+from linien.common import N_POINTS
+from linien.server.trigger_timing import (
+    TriggerTimer,
+    get_both_directions_roi,
+    get_falling_part_offset,
+    get_sweep_period,
+    CLOCK_FREQUENCY,
+    MIN_POLL_INTERVAL,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_sweep_period():
+    # f_real = 3.8 kHz / (2 ** ramp_speed), see `Parameters.ramp_speed`
+    assert get_sweep_period(0) == pytest.approx(1 / 3.8e3, rel=0.05)
+    assert get_sweep_period(10) == pytest.approx(1024 * get_sweep_period(0))
+
+
+def test_trigger_timer():
+    clock = FakeClock()
+    timer = TriggerTimer(clock=clock)
+
+    period = 0.1
+    record_time = period / 2
+    timer.set_sweep(period, record_time)
+
+    # phase is unknown --> poll
+    timer.armed()
+    assert timer.get_sleep_time() == timer.poll_interval
+
+    # first recording is finished at t=100.05, i.e. trigger was at t=100
+    clock.now = 100.05
+    timer.triggered()
+    clock.now = 100.06
+    timer.armed()
+
+    # next trigger is at 100.1, recording finished at 100.15
+    sleep_time = timer.get_sleep_time()
+    assert 0.08 < sleep_time < 0.09
+
+    # recording is late --> short polling
+    clock.now = 100.16
+    assert MIN_POLL_INTERVAL <= timer.get_sleep_time() <= timer.poll_interval
+
+    # no sweep was missed
+    clock.now = 100.15
+    timer.triggered()
+
+    # now we miss 2 sweeps
+    clock.now = 100.45
+    timer.armed()
+    clock.now = 100.45
+    timer.triggered()
+
+    # statistics are updated once per second
+    assert timer.missed_sweeps_per_second == 0
+    clock.now = 101.15
+    timer.triggered()
+    assert timer.missed_sweeps_per_second == pytest.approx((2 + 6) / 1.15)
+
+    # changing the sweep resets the phase
+    timer.set_sweep(period * 2, record_time)
+    timer.armed()
+    assert timer.get_sleep_time() == timer.poll_interval
+
+
+def test_both_directions_roi():
+    # the central half of the trace is recorded
+    assert get_both_directions_roi((0, 2048), 2048) == (512, 1024)
+    assert get_both_directions_roi((900, 200), 2048) == (900, 200)
+    assert get_both_directions_roi((0, 800), 2048) == (512, 288)
+    # the region of interest lies outside of the recorded part
+    assert get_both_directions_roi((0, 100), 2048) == (512, 1024)
+
+
+def get_sweep_value(sample, period):
+    # triangle that rises during the first half of the period
+    phase = (2 * sample / period) % 2
+    return np.where(phase < 1, phase, 2 - phase)
+
+
+def test_falling_part_offset():
+    start, length = get_both_directions_roi((0, N_POINTS), N_POINTS)
+
+    for ramp_speed in range(10):
+        decimation = 2 ** (ramp_speed + 3)
+        period = get_sweep_period(ramp_speed) * CLOCK_FREQUENCY / decimation
+        offset = get_falling_part_offset(ramp_speed, decimation, start, start + length)
+
+        # the time-reversed falling part covers the same range of the sweep as
+        # the rising part
+        rising = get_sweep_value(np.arange(start, start + length), period)
+        falling = get_sweep_value(np.arange(offset, offset + length), period)
+        assert np.max(np.abs(rising - falling[::-1])) < 2 / period
+
+        # the recording ends well before the next sweep period begins
+        assert period - (offset + length) > 0.2 * period / 2
+
+    # both parts of a full trace don't fit into the scope's buffer
+    assert get_falling_part_offset(0, 1, 0, 16384) is None
+
+
+def count_recordings(period, record_time, n_periods):
+    """Simulates the acquisition loop: the scope is triggered at the beginning
+    of every sweep period after it was armed and rearmed after the recording
+    was read."""
+    clock = FakeClock()
+    timer = TriggerTimer(clock=clock)
+    timer.set_sweep(period, record_time)
+    # reading the data and rearming the scope takes this long
+    processing_time = 0.05 * period
+
+    sweep_start = clock.now
+    n_recordings = 0
+    armed_at = clock.now
+    timer.armed()
+
+    while clock.now < sweep_start + n_periods * period:
+        trigger = sweep_start + ceil((armed_at - sweep_start) / period) * period
+        if clock.now < trigger + record_time:
+            clock.now += timer.get_sleep_time()
+            continue
+
+        timer.triggered()
+        n_recordings += 1
+        clock.now += processing_time
+        armed_at = clock.now
+        timer.armed()
+
+    return n_recordings, timer
+
+
+def test_both_directions_timing():
+    ramp_speed = 6
+    decimation = 2 ** (ramp_speed + 3)
+    period = get_sweep_period(ramp_speed)
+
+    start, length = get_both_directions_roi((0, N_POINTS), N_POINTS)
+    offset = get_falling_part_offset(ramp_speed, decimation, start, start + length)
+    record_time = (offset + length) * decimation / CLOCK_FREQUENCY
+
+    # every sweep period is recorded, i.e. there are two spectra per period.
+    # Only when the phase of the sweep is still unknown, a period may be missed
+    # (the statistics are updated once per second).
+    n_periods = int(3 / period)
+    n_recordings, timer = count_recordings(period, record_time, n_periods)
+    assert n_recordings >= n_periods - 1
+    assert timer.missed_sweeps_per_second == 0
+
+    # if both parts of the full trace were recorded, the recording would end
+    # shortly before the next sweep period begins. Every other period would be
+    # missed.
+    record_time = (
+        get_falling_part_offset(ramp_speed, decimation, 0, N_POINTS) + N_POINTS
+    ) * (decimation / CLOCK_FREQUENCY)
+    n_recordings, timer = count_recordings(period, record_time, n_periods)
+    assert n_recordings <= n_periods / 2 + 1
+    assert timer.missed_sweeps_per_second == pytest.approx(1 / (2 * period), rel=0.1)
+
+
+if __name__ == "__main__":
+    test_sweep_period()
+    test_trigger_timer()
+    test_both_directions_roi()
+    test_falling_part_offset()
+    test_both_directions_timing()